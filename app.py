@@ -2,9 +2,46 @@
 
 import os
 import sqlite3
-from flask import Flask, render_template, request, redirect, url_for, jsonify, session, g, abort
+import threading
+from flask import Flask, Response, make_response, render_template, request, redirect, url_for, jsonify, session, g, abort
+from flask import has_request_context, before_render_template, template_rendered, send_from_directory
 from functools import wraps
+import base64
+import collections
+import concurrent.futures
+import csv
 import datetime
+import gzip
+import hashlib
+import hmac
+import http.cookiejar
+import io
+import json
+import mimetypes
+import random
+import re
+import subprocess
+import tempfile
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import click
+from markupsafe import Markup, escape
+from werkzeug.security import check_password_hash, generate_password_hash
+from lookup_cache import LOOKUP_SOURCES, LookupCache
+import assets_build
+import backups
+from archive import (ARCHIVE_BATCH, ARCHIVE_CANDIDATES_SQL, archive_attached, archive_jobs, attach_archive,
+                     open_archive, restore_jobs)
+from pools import ConnectionPool, PoolRegistry
+from scheduler import Scheduler, process_owner, release_leadership
+from write_queue import WriteQueue, WriteQueueClosed
+
+try:
+    import resource  # jen na Unixu, pro špičkovou paměť v benchmarku
+except ImportError:
+    resource = None
 
 app = Flask(__name__)
 # Pro použití session je potřeba nastavit tajný klíč
@@ -14,16 +51,137 @@ app.secret_key = 'tajny-klic-pro-session'
 PASSWORD = "admin"
 
 # --- Správa databáze ---
-def get_db_connection():
-    """Vytvoří připojení k databázi SQLite."""
-    conn = sqlite3.connect(os.path.join(app.root_path, "zakazky.db"))
+app.config.setdefault("DATABASE", os.environ.get("ZAKAZKY_DB", os.path.join(app.root_path, "zakazky.db")))
+# Zastaralé schéma se při startu jen ohlásí, migraci provede 'flask db-upgrade'
+app.config.setdefault("AUTO_MIGRATE", os.environ.get("ZAKAZKY_AUTO_MIGRATE", "0") == "1")
+# Velikost fondu nečinných připojení na jeden proces
+app.config.setdefault("DB_POOL_SIZE", 8)
+# Nastavení SQLite, která se aplikují jednou při otevření připojení
+app.config.setdefault("DB_PRAGMAS", {
+    "synchronous": "NORMAL",
+    "cache_size": -16000,        # záporná hodnota = velikost v KiB (cca 16 MB)
+    "mmap_size": 268435456,      # 256 MB
+    "busy_timeout": 5000,        # ms
+    "temp_store": "MEMORY",
+    "foreign_keys": "ON",
+})
+# Víc firem (TENANTS_DIR): každý tenant má databázi <TENANTS_DIR>/<tenant>.db, fondy drží modul pools
+app.config.setdefault("TENANTS_DIR", os.environ.get("ZAKAZKY_TENANTS_DIR"))
+app.config.setdefault("TENANT_DOMAIN", os.environ.get("ZAKAZKY_TENANT_DOMAIN"))
+app.config.setdefault("TENANT_POOLS_MAX", int(os.environ.get("ZAKAZKY_TENANT_POOLS_MAX", "64")))
+app.config.setdefault("TENANT_POOL_IDLE", 600)
+TENANT_NAME = re.compile(r"[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?")
+
+
+def tenant_path(tenant):
+    """Soubor databáze tenanta."""
+    return os.path.join(app.config["TENANTS_DIR"], tenant + ".db")
+
+
+def tenant_exists(tenant):
+    """Je název tenanta platný a má tenant databázi?"""
+    return bool(tenant) and TENANT_NAME.fullmatch(tenant) is not None and os.path.exists(tenant_path(tenant))
+
+
+def database_path():
+    """Databáze aktuálního požadavku: v režimu více firem databáze tenanta, jinak DATABASE.
+
+    Mimo požadavek (CLI) platí tenant z g.tenant, je-li nastaven.
+    """
+    if app.config["TENANTS_DIR"] and (has_request_context() or g.get("tenant")):
+        if g.get("tenant") is None:
+            abort(404)
+        return tenant_path(g.tenant)
+    return app.config["DATABASE"]
+
+
+# CLI příkazy pracují s DATABASE; ZAKAZKY_TENANT je přesměruje na databázi tenanta
+if app.config["TENANTS_DIR"] and os.environ.get("ZAKAZKY_TENANT"):
+    app.config["DATABASE"] = tenant_path(os.environ["ZAKAZKY_TENANT"])
+
+
+def open_db_connection(path):
+    """Otevře nové připojení k SQLite v režimu WAL s nastavenými PRAGMA."""
+    # uri=True kvůli připojení archivu jen pro čtení (file:...?mode=ro), obyčejné cesty fungují dál
+    conn = sqlite3.connect(path, timeout=app.config["DB_PRAGMAS"]["busy_timeout"] / 1000, check_same_thread=False,
+                           factory=InstrumentedConnection, uri=True)
     conn.row_factory = sqlite3.Row
+    conn.path = path
+    # WAL je vlastnost souboru databáze, stačí ji nastavit jednou, ale příkaz je levný
+    conn.execute("PRAGMA journal_mode = WAL")
+    for name, value in app.config["DB_PRAGMAS"].items():
+        conn.execute(f"PRAGMA {name} = {value}")
     return conn
 
-def init_db():
-    """Vytvoří databázové tabulky, pokud neexistují a přidá nové sloupce."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+
+def open_pool(path):
+    """Fond pro databázi použitou poprvé v procesu; databáze se předtím zkontroluje (a zmigruje)."""
+    check_schema_version(path)
+    return ConnectionPool(path, app.config["DB_POOL_SIZE"], open_db_connection)
+
+
+def forget_database(path):
+    """Uvolní stav procesu vázaný na databázi vyřazeného fondu (zapisovač, číselníky)."""
+    with _write_queue_lock:
+        writer = _write_queues.pop(path, None)
+    if writer is not None and writer.pid == os.getpid():
+        writer.close()
+    lookup_cache.discard(path)
+
+
+pools = PoolRegistry(open_pool, on_evict=forget_database)
+
+
+def get_pool():
+    """Vrátí (a případně vytvoří) fond připojení pro databázi aktuálního požadavku.
+
+    Zároveň se zavřou nejdéle nepoužité fondy nad TENANT_POOLS_MAX a fondy
+    nečinné déle než TENANT_POOL_IDLE.
+    """
+    pool = pools.get(database_path(), app.config["TENANT_POOLS_MAX"], app.config["TENANT_POOL_IDLE"])
+    with _metrics_lock:
+        METRICS["db_pools"].set((), len(pools))
+    return pool
+
+
+def get_db_connection():
+    """Vrátí připojení k databázi SQLite pro aktuální požadavek.
+
+    Připojení se půjčí z fondu při prvním volání a vrátí se do něj
+    automaticky v teardown_appcontext, routy ho tedy nezavírají.
+    """
+    if "db" not in g:
+        g.db_pool = get_pool()
+        g.db = g.db_pool.acquire()
+    return g.db
+
+
+@app.teardown_appcontext
+def release_db_connection(exception):
+    """Vrátí připojení požadavku do fondu, ze kterého pochází (nepotvrzené změny se zahodí)."""
+    conn = g.pop("db", None)
+    if conn is not None:
+        g.pop("db_pool").release(conn)
+
+# --- Migrace schématu (verze v PRAGMA user_version) ---
+MIGRATIONS = []
+
+def migration(version, description, foreign_keys=True):
+    """Dekorátor pro registraci kroku migrace.
+
+    Migrace, které přestavují tabulky, se registrují s foreign_keys=False;
+    kontrola cizích klíčů je pak během kroku vypnutá.
+    """
+    def decorator(f):
+        f.foreign_keys = foreign_keys
+        MIGRATIONS.append((version, description, f))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return f
+    return decorator
+
+@migration(1, "Výchozí tabulky")
+def migrate_initial_schema(cursor):
+    """Vytvoří databázové tabulky, pokud neexistují."""
     
     # Tabulka pro zákazníky
     cursor.execute("""
@@ -136,28 +294,1317 @@ def init_db():
         );
     """)
 
-    conn.commit()
-    conn.close()
+@migration(2, "Indexy pro detail zakázky, pracovníka, zákazníka, faktury a dashboard")
+def migrate_secondary_indexes(cursor):
+    """Vytvoří sekundární indexy odpovídající WHERE/ORDER BY v routách."""
+    # job_detail: úkoly, hodiny a služby jedné zakázky (hodiny i pro SUM bez čtení tabulky)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tasks_job_due ON tasks (job_id, due_date)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_hours_job_date ON hours_spent (job_id, date_spent, hours)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_services_job ON additional_services (job_id, cost)")
+    # worker_detail: hodiny pracovníka seskupené podle zakázky (pokrývající)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_hours_worker_job ON hours_spent (worker_id, job_id, hours)")
+    # customer_history: zakázky zákazníka podle termínu
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_jobs_customer_due ON jobs (customer_id, due_date)")
+    # index, job_list: řazení podle termínu, aktivní zakázky podle stavu a termínu
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_jobs_due ON jobs (due_date)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_due ON jobs (status, due_date)")
+    # index: měsíční tržby z uhrazených zakázek (pokrývající)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_jobs_payment ON jobs (payment_status, invoice_date, total_paid)")
+    # invoice_list, unpaid_invoices_list
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_invoices_date ON invoices (invoice_date)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_invoices_status_date ON invoices (payment_status, invoice_date)")
+    cursor.execute("ANALYZE")
+
+# --- Souhrnné statistiky dashboardu (udržované triggery, měsíc bez data je '') ---
+def rebuild_dashboard_stats(cursor):
+    """Přepočítá souhrnné tabulky dashboardu od začátku ze zdrojových dat."""
+    cursor.execute("DELETE FROM stats_monthly_jobs")
+    cursor.execute("""
+        INSERT INTO stats_monthly_jobs (month, count)
+        SELECT COALESCE(substr(due_date, 1, 7), ''), COUNT(id)
+        FROM jobs
+        GROUP BY 1
+    """)
+    cursor.execute("DELETE FROM stats_monthly_revenue")
+    cursor.execute("""
+        INSERT INTO stats_monthly_revenue (month, total, jobs)
+        SELECT COALESCE(substr(invoice_date, 1, 7), ''), SUM(total_paid), COUNT(id)
+        FROM jobs
+        WHERE payment_status = 'Uhrazeno' AND total_paid IS NOT NULL
+        GROUP BY 1
+    """)
+    cursor.execute("DELETE FROM stats_counters")
+    cursor.execute("""
+        INSERT INTO stats_counters (name, value) VALUES
+            ('open_jobs', (SELECT COUNT(id) FROM jobs WHERE status NOT IN ('Dokončená', 'Fakturovaná'))),
+            ('unpaid_invoices', (SELECT COUNT(id) FROM invoices WHERE payment_status = 'Nezaplaceno')),
+            ('customers', (SELECT COUNT(id) FROM customers))
+    """)
+
+# Součty hodin a služeb zakázek (job_totals) udržované triggery, čtou se jedním JOINem
+def rebuild_job_totals(cursor):
+    """Přepočítá součty zakázek od začátku ze zdrojových dat."""
+    cursor.execute("DELETE FROM job_totals")
+    cursor.execute("""
+        INSERT INTO job_totals (job_id, hours, services_cost)
+        SELECT jobs.id,
+               (SELECT COALESCE(SUM(hours), 0) FROM hours_spent WHERE job_id = jobs.id),
+               (SELECT COALESCE(SUM(cost), 0) FROM additional_services WHERE job_id = jobs.id)
+        FROM jobs
+    """)
+
+@migration(3, "Souhrnné tabulky dashboardu udržované triggery")
+def migrate_dashboard_stats(cursor):
+    """Vytvoří souhrnné tabulky dashboardu, triggery a naplní je."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS stats_monthly_jobs (
+            month TEXT PRIMARY KEY,
+            count INTEGER NOT NULL
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS stats_monthly_revenue (
+            month TEXT PRIMARY KEY,
+            total REAL NOT NULL,
+            jobs INTEGER NOT NULL
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS stats_counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_stats_jobs_insert AFTER INSERT ON jobs
+        BEGIN
+            INSERT INTO stats_monthly_jobs (month, count)
+            VALUES (COALESCE(strftime('%Y-%m', NEW.due_date), ''), 1)
+            ON CONFLICT (month) DO UPDATE SET count = count + 1;
+            INSERT INTO stats_monthly_revenue (month, total, jobs)
+            SELECT COALESCE(strftime('%Y-%m', NEW.invoice_date), ''), NEW.total_paid, 1
+            WHERE NEW.payment_status = 'Uhrazeno' AND NEW.total_paid IS NOT NULL
+            ON CONFLICT (month) DO UPDATE SET total = total + excluded.total, jobs = jobs + 1;
+            UPDATE stats_counters SET value = value + 1
+            WHERE name = 'open_jobs' AND NEW.status NOT IN ('Dokončená', 'Fakturovaná');
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_stats_jobs_delete AFTER DELETE ON jobs
+        BEGIN
+            UPDATE stats_monthly_jobs SET count = count - 1
+            WHERE month = COALESCE(strftime('%Y-%m', OLD.due_date), '');
+            DELETE FROM stats_monthly_jobs
+            WHERE month = COALESCE(strftime('%Y-%m', OLD.due_date), '') AND count <= 0;
+            UPDATE stats_monthly_revenue SET total = total - OLD.total_paid, jobs = jobs - 1
+            WHERE month = COALESCE(strftime('%Y-%m', OLD.invoice_date), '')
+              AND OLD.payment_status = 'Uhrazeno' AND OLD.total_paid IS NOT NULL;
+            DELETE FROM stats_monthly_revenue
+            WHERE month = COALESCE(strftime('%Y-%m', OLD.invoice_date), '') AND jobs <= 0;
+            UPDATE stats_counters SET value = value - 1
+            WHERE name = 'open_jobs' AND OLD.status NOT IN ('Dokončená', 'Fakturovaná');
+        END
+    """)
+    # Změna řádku jobs se započítá jako odebrání staré a přidání nové verze
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_stats_jobs_update
+        AFTER UPDATE OF due_date, status, payment_status, total_paid, invoice_date ON jobs
+        BEGIN
+            UPDATE stats_monthly_jobs SET count = count - 1
+            WHERE month = COALESCE(strftime('%Y-%m', OLD.due_date), '');
+            INSERT INTO stats_monthly_jobs (month, count)
+            VALUES (COALESCE(strftime('%Y-%m', NEW.due_date), ''), 1)
+            ON CONFLICT (month) DO UPDATE SET count = count + 1;
+            DELETE FROM stats_monthly_jobs
+            WHERE month = COALESCE(strftime('%Y-%m', OLD.due_date), '') AND count <= 0;
+            UPDATE stats_monthly_revenue SET total = total - OLD.total_paid, jobs = jobs - 1
+            WHERE month = COALESCE(strftime('%Y-%m', OLD.invoice_date), '')
+              AND OLD.payment_status = 'Uhrazeno' AND OLD.total_paid IS NOT NULL;
+            INSERT INTO stats_monthly_revenue (month, total, jobs)
+            SELECT COALESCE(strftime('%Y-%m', NEW.invoice_date), ''), NEW.total_paid, 1
+            WHERE NEW.payment_status = 'Uhrazeno' AND NEW.total_paid IS NOT NULL
+            ON CONFLICT (month) DO UPDATE SET total = total + excluded.total, jobs = jobs + 1;
+            DELETE FROM stats_monthly_revenue
+            WHERE month = COALESCE(strftime('%Y-%m', OLD.invoice_date), '') AND jobs <= 0;
+            UPDATE stats_counters
+            SET value = value - (OLD.status NOT IN ('Dokončená', 'Fakturovaná'))
+                              + (NEW.status NOT IN ('Dokončená', 'Fakturovaná'))
+            WHERE name = 'open_jobs';
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_stats_invoices_insert AFTER INSERT ON invoices
+        WHEN NEW.payment_status = 'Nezaplaceno'
+        BEGIN
+            UPDATE stats_counters SET value = value + 1 WHERE name = 'unpaid_invoices';
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_stats_invoices_delete AFTER DELETE ON invoices
+        WHEN OLD.payment_status = 'Nezaplaceno'
+        BEGIN
+            UPDATE stats_counters SET value = value - 1 WHERE name = 'unpaid_invoices';
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_stats_invoices_update AFTER UPDATE OF payment_status ON invoices
+        BEGIN
+            UPDATE stats_counters
+            SET value = value - (OLD.payment_status = 'Nezaplaceno') + (NEW.payment_status = 'Nezaplaceno')
+            WHERE name = 'unpaid_invoices';
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_stats_customers_insert AFTER INSERT ON customers
+        BEGIN
+            UPDATE stats_counters SET value = value + 1 WHERE name = 'customers';
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_stats_customers_delete AFTER DELETE ON customers
+        BEGIN
+            UPDATE stats_counters SET value = value - 1 WHERE name = 'customers';
+        END
+    """)
+    # Naplnění z existujících dat
+    cursor.execute("""
+        INSERT INTO stats_monthly_jobs (month, count)
+        SELECT COALESCE(strftime('%Y-%m', due_date), ''), COUNT(id)
+        FROM jobs
+        GROUP BY 1
+    """)
+    cursor.execute("""
+        INSERT INTO stats_monthly_revenue (month, total, jobs)
+        SELECT COALESCE(strftime('%Y-%m', invoice_date), ''), SUM(total_paid), COUNT(id)
+        FROM jobs
+        WHERE payment_status = 'Uhrazeno' AND total_paid IS NOT NULL
+        GROUP BY 1
+    """)
+    cursor.execute("""
+        INSERT INTO stats_counters (name, value) VALUES
+            ('open_jobs', (SELECT COUNT(id) FROM jobs WHERE status NOT IN ('Dokončená', 'Fakturovaná'))),
+            ('unpaid_invoices', (SELECT COUNT(id) FROM invoices WHERE payment_status = 'Nezaplaceno')),
+            ('customers', (SELECT COUNT(id) FROM customers))
+    """)
+
+@migration(4, "Indexy pro řazení seznamů zákazníků a faktur")
+def migrate_list_indexes(cursor):
+    """Indexy pro stránkování seznamů podle jména zákazníka a čísla faktury."""
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_customers_name ON customers (name)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_invoices_number ON invoices (invoice_number)")
+
+# --- Fulltextové vyhledávání (FTS5 s externím obsahem, synchronizované triggery) ---
+FTS_TABLES = ("fts_jobs", "fts_customers", "fts_tasks", "fts_hours")
+
+def rebuild_fts(cursor):
+    """Znovu sestaví všechny FTS indexy ze zdrojových tabulek."""
+    for fts_name in FTS_TABLES:
+        cursor.execute(f"INSERT INTO {fts_name} ({fts_name}) VALUES ('rebuild')")
+
+@migration(5, "Fulltextové vyhledávání (FTS5)")
+def migrate_fulltext_search(cursor):
+    """Vytvoří FTS5 tabulky nad zakázkami, zákazníky, úkoly a výkazy."""
+    # Název FTS tabulky -> (zdrojová tabulka, indexované sloupce)
+    sources = {
+        "fts_jobs": ("jobs", ("job_name", "job_number", "description")),
+        "fts_customers": ("customers", ("name", "company", "address", "email")),
+        "fts_tasks": ("tasks", ("task_name", "notes")),
+        "fts_hours": ("hours_spent", ("description",)),
+    }
+    for fts_name, (table, columns) in sources.items():
+        names = ", ".join(columns)
+        new_values = ", ".join(f"NEW.{c}" for c in columns)
+        old_values = ", ".join(f"OLD.{c}" for c in columns)
+        # Prefixové indexy pro našeptávání, diakritika se při hledání ignoruje
+        cursor.execute(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS {fts_name} USING fts5(
+                {names},
+                content='{table}', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+            )
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{fts_name}_insert AFTER INSERT ON {table}
+            BEGIN
+                INSERT INTO {fts_name} (rowid, {names}) VALUES (NEW.id, {new_values});
+            END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{fts_name}_delete AFTER DELETE ON {table}
+            BEGIN
+                INSERT INTO {fts_name} ({fts_name}, rowid, {names}) VALUES ('delete', OLD.id, {old_values});
+            END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{fts_name}_update AFTER UPDATE OF {names} ON {table}
+            BEGIN
+                INSERT INTO {fts_name} ({fts_name}, rowid, {names}) VALUES ('delete', OLD.id, {old_values});
+                INSERT INTO {fts_name} (rowid, {names}) VALUES (NEW.id, {new_values});
+            END
+        """)
+        cursor.execute(f"INSERT INTO {fts_name} ({fts_name}) VALUES ('rebuild')")
+
+@migration(6, "Neměnné snímky faktur")
+def migrate_invoice_snapshots(cursor):
+    """Vytvoří tabulky snímků faktur a naplní je pro již vystavené faktury."""
+    cursor.execute("ALTER TABLE invoices ADD COLUMN snapshot_version INTEGER NOT NULL DEFAULT 1")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS invoice_snapshots (
+            invoice_id INTEGER PRIMARY KEY REFERENCES invoices (id) ON DELETE CASCADE,
+            job_number TEXT,
+            job_name TEXT,
+            customer_name TEXT,
+            customer_company TEXT,
+            customer_address TEXT,
+            customer_phone TEXT,
+            customer_email TEXT,
+            supplier_company_name TEXT,
+            supplier_address TEXT,
+            supplier_ico TEXT,
+            supplier_dic TEXT,
+            supplier_bank_account TEXT,
+            supplier_bank_code TEXT,
+            supplier_variable_symbol TEXT
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS invoice_lines (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            invoice_id INTEGER NOT NULL REFERENCES invoices (id) ON DELETE CASCADE,
+            position INTEGER NOT NULL,
+            description TEXT NOT NULL,
+            quantity REAL NOT NULL,
+            unit_price REAL NOT NULL,
+            amount REAL NOT NULL
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_invoice_lines_invoice ON invoice_lines (invoice_id, position)")
+    # Již vystavené faktury dostanou snímek z aktuálních dat, částka zůstává původní.
+    # Dotazy odpovídají vystavení faktury ve verzi 6 a záměrně nevolají pozdější pomocné funkce.
+    cursor.execute("""
+        INSERT OR REPLACE INTO invoice_snapshots (
+            invoice_id, job_number, job_name,
+            customer_name, customer_company, customer_address, customer_phone, customer_email,
+            supplier_company_name, supplier_address, supplier_ico, supplier_dic,
+            supplier_bank_account, supplier_bank_code, supplier_variable_symbol)
+        SELECT invoices.id, jobs.job_number, jobs.job_name,
+               customers.name, customers.company, customers.address, customers.phone, customers.email,
+               supplier.company_name, supplier.address, supplier.ico, supplier.dic,
+               supplier.bank_account, supplier.bank_code, supplier.variable_symbol
+        FROM invoices
+        JOIN jobs ON jobs.id = invoices.job_id
+        LEFT JOIN customers ON jobs.customer_id = customers.id
+        LEFT JOIN (SELECT * FROM supplier_info LIMIT 1) AS supplier ON 1
+    """)
+    # Položky v pořadí pevná cena, hodinová práce, služby (podle id), číslované od 1
+    cursor.execute("""
+        INSERT INTO invoice_lines (invoice_id, position, description, quantity, unit_price, amount)
+        SELECT invoice_id, ROW_NUMBER() OVER (PARTITION BY invoice_id ORDER BY kind, item),
+               description, quantity, unit_price, amount
+        FROM (
+            SELECT invoices.id AS invoice_id, 0 AS kind, 0 AS item,
+                   'Pevná cena za zakázku "' || jobs.job_name || '"' AS description,
+                   1 AS quantity, CAST(jobs.price AS REAL) AS unit_price, CAST(jobs.price AS REAL) AS amount
+            FROM invoices JOIN jobs ON jobs.id = invoices.job_id
+            WHERE jobs.price
+            UNION ALL
+            SELECT invoices.id, 1, 0, printf('Hodinová práce (%.2fh x %.2f Kč/h)', hours.total, jobs.hourly_rate),
+                   hours.total, jobs.hourly_rate, hours.total * jobs.hourly_rate
+            FROM invoices
+            JOIN jobs ON jobs.id = invoices.job_id
+            JOIN (SELECT job_id, SUM(hours) AS total FROM hours_spent GROUP BY job_id) AS hours
+                ON hours.job_id = jobs.id
+            WHERE jobs.hourly_rate AND hours.total > 0
+            UNION ALL
+            SELECT invoices.id, 2, services.id, services.service_name, 1, services.cost, services.cost
+            FROM invoices
+            JOIN jobs ON jobs.id = invoices.job_id
+            JOIN additional_services AS services ON services.job_id = jobs.id
+        )
+    """)
+
+def rebuild_table(cursor, table, create_sql):
+    """Přestaví tabulku podle nové definice (postup z dokumentace SQLite).
+
+    create_sql je CREATE TABLE {table} (...) s novou definicí. Data, indexy,
+    triggery i stav AUTOINCREMENT se přenesou. Volá se s vypnutými cizími klíči.
+    """
+    extras = [row[0] for row in cursor.execute(
+        "SELECT sql FROM sqlite_master WHERE tbl_name = ? AND type IN ('index', 'trigger') AND sql IS NOT NULL",
+        (table,)).fetchall()]
+    sequence = cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (table,)).fetchone()
+    old_columns = [row[1] for row in cursor.execute(f"PRAGMA table_info({table})").fetchall()]
+
+    cursor.execute(create_sql.format(table=f"{table}__new"))
+    new_columns = {row[1] for row in cursor.execute(f"PRAGMA table_info({table}__new)").fetchall()}
+    columns = ", ".join(c for c in old_columns if c in new_columns)
+    cursor.execute(f"INSERT INTO {table}__new ({columns}) SELECT {columns} FROM {table}")
+    cursor.execute(f"DROP TABLE {table}")
+    cursor.execute(f"ALTER TABLE {table}__new RENAME TO {table}")
+    for sql in extras:
+        cursor.execute(sql)
+    if sequence is not None:
+        cursor.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = ?", (sequence[0], table))
+
+@migration(7, "Cizí klíče s ON DELETE CASCADE / SET NULL", foreign_keys=False)
+def migrate_cascading_foreign_keys(cursor):
+    """Přestaví tabulky tak, aby mazání zakázek a zákazníků zajistily cizí klíče."""
+    rebuild_table(cursor, "jobs", """
+        CREATE TABLE {table} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            job_number TEXT UNIQUE NOT NULL,
+            job_name TEXT NOT NULL,
+            description TEXT,
+            customer_id INTEGER,
+            status TEXT NOT NULL,
+            due_date TEXT,
+            price REAL,
+            hourly_rate REAL,
+            deposit REAL,
+            total_paid REAL,
+            is_invoiced INTEGER DEFAULT 0,
+            invoice_date TEXT,
+            payment_status TEXT DEFAULT 'Nezaplaceno',
+            FOREIGN KEY (customer_id) REFERENCES customers (id) ON DELETE CASCADE
+        )
+    """)
+    rebuild_table(cursor, "tasks", """
+        CREATE TABLE {table} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            job_id INTEGER,
+            task_name TEXT NOT NULL,
+            notes TEXT,
+            due_date TEXT,
+            is_completed INTEGER DEFAULT 0,
+            FOREIGN KEY (job_id) REFERENCES jobs (id) ON DELETE CASCADE
+        )
+    """)
+    rebuild_table(cursor, "hours_spent", """
+        CREATE TABLE {table} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            job_id INTEGER NOT NULL,
+            worker_id INTEGER,
+            date_spent TEXT NOT NULL,
+            hours REAL NOT NULL,
+            description TEXT,
+            FOREIGN KEY (job_id) REFERENCES jobs (id) ON DELETE CASCADE,
+            FOREIGN KEY (worker_id) REFERENCES workers (id) ON DELETE SET NULL
+        )
+    """)
+    rebuild_table(cursor, "additional_services", """
+        CREATE TABLE {table} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            job_id INTEGER NOT NULL,
+            service_name TEXT NOT NULL,
+            cost REAL NOT NULL,
+            notes TEXT,
+            FOREIGN KEY (job_id) REFERENCES jobs (id) ON DELETE CASCADE
+        )
+    """)
+    rebuild_table(cursor, "invoices", """
+        CREATE TABLE {table} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            job_id INTEGER UNIQUE NOT NULL,
+            invoice_number TEXT NOT NULL,
+            invoice_date TEXT NOT NULL,
+            due_date TEXT NOT NULL,
+            payment_type TEXT NOT NULL,
+            total_price REAL NOT NULL,
+            payment_status TEXT NOT NULL DEFAULT 'Nezaplaceno',
+            snapshot_version INTEGER NOT NULL DEFAULT 1,
+            FOREIGN KEY (job_id) REFERENCES jobs (id) ON DELETE CASCADE
+        )
+    """)
+
+def find_orphans(conn):
+    """Vrátí porušení cizích klíčů jako (tabulka, rowid, rodičovská tabulka, sloupec, akce)."""
+    orphans = []
+    foreign_keys = {}
+    for table, rowid, parent, fkid in conn.execute("PRAGMA foreign_key_check").fetchall():
+        if table not in foreign_keys:
+            foreign_keys[table] = {row[0]: (row[3], row[6]) for row in conn.execute(f"PRAGMA foreign_key_list({table})")}
+        column, on_delete = foreign_keys[table][fkid]
+        orphans.append((table, rowid, parent, column, on_delete))
+    return orphans
+
+def clean_orphans(conn):
+    """Odstraní osiřelé řádky (u ON DELETE SET NULL jen vynuluje odkaz).
+
+    Mazání běží se zapnutými cizími klíči, takže se kaskádově odstraní
+    i data závislá na smazaných řádcích. Vrací počet opravených řádků.
+    """
+    fixed = 0
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        while True:
+            orphans = find_orphans(conn)
+            if not orphans:
+                break
+            for table, rowid, parent, column, on_delete in orphans:
+                if on_delete == "SET NULL":
+                    conn.execute(f"UPDATE {table} SET {column} = NULL WHERE rowid = ?", (rowid,))
+                else:
+                    conn.execute(f"DELETE FROM {table} WHERE rowid = ?", (rowid,))
+            fixed += len(orphans)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return fixed
+
+@migration(8, "Čítače změn tabulek pro podmíněné HTTP odpovědi")
+def migrate_table_versions(cursor):
+    """Vytvoří table_versions a triggery, které při každé změně zvýší verzi tabulky."""
+    versioned = ("customers", "jobs", "tasks", "workers", "hours_spent",
+                 "additional_services", "invoices", "supplier_info")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS table_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL
+        ) WITHOUT ROWID
+    """)
+    for table in versioned:
+        cursor.execute("INSERT OR IGNORE INTO table_versions (name, version) VALUES (?, 1)", (table,))
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_version_{table}_{event.lower()} AFTER {event} ON {table}
+                BEGIN
+                    UPDATE table_versions SET version = version + 1 WHERE name = '{table}';
+                END
+            """)
+
+@migration(9, "Normalizovaná data, generované sloupce měsíce a jejich indexy")
+def migrate_normalized_dates(cursor):
+    """Převede existující data na RRRR-MM-DD a přidá kontroly a měsíční sloupce.
+
+    Původní podoba každého přepsaného data zůstane v tabulce
+    date_migration_originals, nepřevoditelné hodnoty se navíc zalogují.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS date_migration_originals (
+            table_name TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            column_name TEXT NOT NULL,
+            original TEXT NOT NULL,
+            PRIMARY KEY (table_name, row_id, column_name)
+        )
+    """)
+    # (tabulka, sloupec, smí být NULL)
+    date_columns = [
+        ("jobs", "due_date", True),
+        ("jobs", "invoice_date", True),
+        ("tasks", "due_date", True),
+        ("hours_spent", "date_spent", False),
+        ("invoices", "invoice_date", False),
+        ("invoices", "due_date", False),
+    ]
+    for table, column, nullable in date_columns:
+        cursor.execute(f"""
+            INSERT OR IGNORE INTO date_migration_originals (table_name, row_id, column_name, original)
+            SELECT '{table}', rowid, '{column}', {column} FROM {table}
+            WHERE {column} IS NOT NULL AND {column} IS NOT date({column})
+        """)
+        # Co umí SQLite (např. '2025-08-14 10:00'), převede přímo
+        cursor.execute(f"""
+            UPDATE {table} SET {column} = date({column})
+            WHERE {column} IS NOT date({column}) AND date({column}) IS NOT NULL
+        """)
+        rows = cursor.execute(f"""
+            SELECT rowid, {column} FROM {table}
+            WHERE {column} IS NOT NULL AND {column} IS NOT date({column})
+        """).fetchall()
+        for rowid, value in rows:
+            # Zbývá formát D.M.RRRR z formulářů
+            try:
+                day, month, year = (int(part) for part in str(value).strip().split("."))
+                normalized = datetime.date(year, month, day).isoformat()
+            except ValueError:
+                if not nullable:
+                    app.logger.warning("%s#%s: datum '%s' nelze převést, ponecháno", table, rowid, value)
+                    continue
+                app.logger.warning("%s#%s: datum '%s' nelze převést, %s vynulováno "
+                                   "(původní hodnota v date_migration_originals)", table, rowid, value, column)
+                normalized = None
+            cursor.execute(f"UPDATE {table} SET {column} = ? WHERE rowid = ?", (normalized, rowid))
+        for event in ("INSERT", "UPDATE OF " + column):
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_date_{table}_{column}_{event.split()[0].lower()}
+                BEFORE {event} ON {table}
+                WHEN NEW.{column} IS NOT NULL AND NEW.{column} IS NOT date(NEW.{column})
+                BEGIN
+                    SELECT RAISE(ABORT, 'Neplatné datum v {table}.{column}, očekáváno RRRR-MM-DD');
+                END
+            """)
+
+    cursor.execute("ALTER TABLE jobs ADD COLUMN due_month TEXT GENERATED ALWAYS AS (substr(due_date, 1, 7)) VIRTUAL")
+    cursor.execute("ALTER TABLE invoices ADD COLUMN invoice_month TEXT GENERATED ALWAYS AS (substr(invoice_date, 1, 7)) VIRTUAL")
+    cursor.execute("ALTER TABLE hours_spent ADD COLUMN spent_month TEXT GENERATED ALWAYS AS (substr(date_spent, 1, 7)) VIRTUAL")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_jobs_due_month ON jobs (due_month)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_invoices_month ON invoices (invoice_month, payment_status, total_price)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_hours_month ON hours_spent (spent_month, job_id, hours)")
+    # Faktury po splatnosti: rozsah podle due_date v rámci stavu úhrady
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_invoices_status_due ON invoices (payment_status, due_date)")
+
+    # Měsíc je nad normalizovanými daty prostý prefix, triggery statistik se přepíší bez strftime
+    for event in ("insert", "delete", "update"):
+        cursor.execute(f"DROP TRIGGER IF EXISTS trg_stats_jobs_{event}")
+    cursor.execute("""
+        CREATE TRIGGER trg_stats_jobs_insert AFTER INSERT ON jobs
+        BEGIN
+            INSERT INTO stats_monthly_jobs (month, count)
+            VALUES (COALESCE(substr(NEW.due_date, 1, 7), ''), 1)
+            ON CONFLICT (month) DO UPDATE SET count = count + 1;
+            INSERT INTO stats_monthly_revenue (month, total, jobs)
+            SELECT COALESCE(substr(NEW.invoice_date, 1, 7), ''), NEW.total_paid, 1
+            WHERE NEW.payment_status = 'Uhrazeno' AND NEW.total_paid IS NOT NULL
+            ON CONFLICT (month) DO UPDATE SET total = total + excluded.total, jobs = jobs + 1;
+            UPDATE stats_counters SET value = value + 1
+            WHERE name = 'open_jobs' AND NEW.status NOT IN ('Dokončená', 'Fakturovaná');
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER trg_stats_jobs_delete AFTER DELETE ON jobs
+        BEGIN
+            UPDATE stats_monthly_jobs SET count = count - 1
+            WHERE month = COALESCE(substr(OLD.due_date, 1, 7), '');
+            DELETE FROM stats_monthly_jobs
+            WHERE month = COALESCE(substr(OLD.due_date, 1, 7), '') AND count <= 0;
+            UPDATE stats_monthly_revenue SET total = total - OLD.total_paid, jobs = jobs - 1
+            WHERE month = COALESCE(substr(OLD.invoice_date, 1, 7), '')
+              AND OLD.payment_status = 'Uhrazeno' AND OLD.total_paid IS NOT NULL;
+            DELETE FROM stats_monthly_revenue
+            WHERE month = COALESCE(substr(OLD.invoice_date, 1, 7), '') AND jobs <= 0;
+            UPDATE stats_counters SET value = value - 1
+            WHERE name = 'open_jobs' AND OLD.status NOT IN ('Dokončená', 'Fakturovaná');
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER trg_stats_jobs_update
+        AFTER UPDATE OF due_date, status, payment_status, total_paid, invoice_date ON jobs
+        BEGIN
+            UPDATE stats_monthly_jobs SET count = count - 1
+            WHERE month = COALESCE(substr(OLD.due_date, 1, 7), '');
+            INSERT INTO stats_monthly_jobs (month, count)
+            VALUES (COALESCE(substr(NEW.due_date, 1, 7), ''), 1)
+            ON CONFLICT (month) DO UPDATE SET count = count + 1;
+            DELETE FROM stats_monthly_jobs
+            WHERE month = COALESCE(substr(OLD.due_date, 1, 7), '') AND count <= 0;
+            UPDATE stats_monthly_revenue SET total = total - OLD.total_paid, jobs = jobs - 1
+            WHERE month = COALESCE(substr(OLD.invoice_date, 1, 7), '')
+              AND OLD.payment_status = 'Uhrazeno' AND OLD.total_paid IS NOT NULL;
+            INSERT INTO stats_monthly_revenue (month, total, jobs)
+            SELECT COALESCE(substr(NEW.invoice_date, 1, 7), ''), NEW.total_paid, 1
+            WHERE NEW.payment_status = 'Uhrazeno' AND NEW.total_paid IS NOT NULL
+            ON CONFLICT (month) DO UPDATE SET total = total + excluded.total, jobs = jobs + 1;
+            DELETE FROM stats_monthly_revenue
+            WHERE month = COALESCE(substr(OLD.invoice_date, 1, 7), '') AND jobs <= 0;
+            UPDATE stats_counters
+            SET value = value - (OLD.status NOT IN ('Dokončená', 'Fakturovaná'))
+                              + (NEW.status NOT IN ('Dokončená', 'Fakturovaná'))
+            WHERE name = 'open_jobs';
+        END
+    """)
+    # Měsíční souhrny znovu z převedených dat (neplatná nepovinná data jsou teď NULL)
+    cursor.execute("DELETE FROM stats_monthly_jobs")
+    cursor.execute("""
+        INSERT INTO stats_monthly_jobs (month, count)
+        SELECT COALESCE(substr(due_date, 1, 7), ''), COUNT(id)
+        FROM jobs
+        GROUP BY 1
+    """)
+    cursor.execute("DELETE FROM stats_monthly_revenue")
+    cursor.execute("""
+        INSERT INTO stats_monthly_revenue (month, total, jobs)
+        SELECT COALESCE(substr(invoice_date, 1, 7), ''), SUM(total_paid), COUNT(id)
+        FROM jobs
+        WHERE payment_status = 'Uhrazeno' AND total_paid IS NOT NULL
+        GROUP BY 1
+    """)
+    cursor.execute("ANALYZE")
+
+@migration(10, "Udržované součty hodin a služeb zakázek")
+def migrate_job_totals(cursor):
+    """Vytvoří tabulku job_totals, její triggery a naplní ji."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS job_totals (
+            job_id INTEGER PRIMARY KEY REFERENCES jobs (id) ON DELETE CASCADE,
+            hours REAL NOT NULL DEFAULT 0,
+            services_cost REAL NOT NULL DEFAULT 0
+        )
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_totals_jobs_insert AFTER INSERT ON jobs
+        BEGIN
+            INSERT OR IGNORE INTO job_totals (job_id) VALUES (NEW.id);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_totals_hours_insert AFTER INSERT ON hours_spent
+        BEGIN
+            INSERT INTO job_totals (job_id, hours) VALUES (NEW.job_id, NEW.hours)
+            ON CONFLICT (job_id) DO UPDATE SET hours = hours + excluded.hours;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_totals_hours_delete AFTER DELETE ON hours_spent
+        BEGIN
+            UPDATE job_totals SET hours = hours - OLD.hours WHERE job_id = OLD.job_id;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_totals_hours_update AFTER UPDATE OF job_id, hours ON hours_spent
+        BEGIN
+            UPDATE job_totals SET hours = hours - OLD.hours WHERE job_id = OLD.job_id;
+            INSERT INTO job_totals (job_id, hours) VALUES (NEW.job_id, NEW.hours)
+            ON CONFLICT (job_id) DO UPDATE SET hours = hours + excluded.hours;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_totals_services_insert AFTER INSERT ON additional_services
+        BEGIN
+            INSERT INTO job_totals (job_id, services_cost) VALUES (NEW.job_id, NEW.cost)
+            ON CONFLICT (job_id) DO UPDATE SET services_cost = services_cost + excluded.services_cost;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_totals_services_delete AFTER DELETE ON additional_services
+        BEGIN
+            UPDATE job_totals SET services_cost = services_cost - OLD.cost WHERE job_id = OLD.job_id;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_totals_services_update AFTER UPDATE OF job_id, cost ON additional_services
+        BEGIN
+            UPDATE job_totals SET services_cost = services_cost - OLD.cost WHERE job_id = OLD.job_id;
+            INSERT INTO job_totals (job_id, services_cost) VALUES (NEW.job_id, NEW.cost)
+            ON CONFLICT (job_id) DO UPDATE SET services_cost = services_cost + excluded.services_cost;
+        END
+    """)
+    # Naplnění z existujících dat
+    cursor.execute("""
+        INSERT INTO job_totals (job_id, hours, services_cost)
+        SELECT jobs.id,
+               (SELECT COALESCE(SUM(hours), 0) FROM hours_spent WHERE job_id = jobs.id),
+               (SELECT COALESCE(SUM(cost), 0) FROM additional_services WHERE job_id = jobs.id)
+        FROM jobs
+    """)
+
+@migration(11, "Indexy pro stránkování sekcí detailu zakázky")
+def migrate_job_section_indexes(cursor):
+    """Doplní id do indexů hodin a služeb zakázky kvůli řazení podle klíče (keyset)."""
+    # Hodiny: (datum, id) sestupně; hours zůstává na konci kvůli pokrývajícím součtům
+    cursor.execute("DROP INDEX IF EXISTS idx_hours_job_date")
+    cursor.execute("CREATE INDEX idx_hours_job_date ON hours_spent (job_id, date_spent, id, hours)")
+    # Služby v pořadí zadání
+    cursor.execute("DROP INDEX IF EXISTS idx_services_job")
+    cursor.execute("CREATE INDEX idx_services_job ON additional_services (job_id, id, cost)")
+    cursor.execute("ANALYZE")
+
+@migration(12, "Přihlašovací heslo firmy")
+def migrate_credentials(cursor):
+    """Tabulka s hashem hesla; bez záznamu platí heslo PASSWORD z konfigurace."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS credentials (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            password_hash TEXT NOT NULL
+        )
+    """)
+
+@migration(13, "Příznaky splatnosti faktur a termínů zakázek, plánovač úloh")
+def migrate_due_flags(cursor):
+    """Indexované příznaky po splatnosti / před termínem, jejich triggery a tabulky plánovače."""
+    cursor.execute("ALTER TABLE jobs ADD COLUMN due_state TEXT")
+    cursor.execute("ALTER TABLE invoices ADD COLUMN overdue INTEGER NOT NULL DEFAULT 0")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_jobs_due_state ON jobs (due_state, due_date)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_invoices_overdue ON invoices (overdue, invoice_date)")
+    # Stav termínu: 'overdue', 'upcoming' (do 10 dní), 'later'; NULL u uzavřených zakázek a bez termínu
+    due_state = """CASE
+            WHEN NEW.status IN ('Dokončená', 'Fakturovaná') OR NEW.due_date IS NULL THEN NULL
+            WHEN NEW.due_date < date('now', 'localtime') THEN 'overdue'
+            WHEN NEW.due_date <= date('now', 'localtime', '+10 days') THEN 'upcoming'
+            ELSE 'later'
+        END"""
+    overdue = "COALESCE(NEW.payment_status = 'Nezaplaceno' AND NEW.due_date < date('now', 'localtime'), 0)"
+    for name, event in (("trg_due_jobs_insert", "INSERT"), ("trg_due_jobs_update", "UPDATE OF due_date, status")):
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} ON jobs
+            WHEN NEW.due_state IS NOT {due_state}
+            BEGIN
+                UPDATE jobs SET due_state = {due_state} WHERE id = NEW.id;
+            END
+        """)
+    for name, event in (("trg_due_invoices_insert", "INSERT"),
+                        ("trg_due_invoices_update", "UPDATE OF payment_status, due_date")):
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} ON invoices
+            WHEN NEW.overdue IS NOT {overdue}
+            BEGIN
+                UPDATE invoices SET overdue = {overdue} WHERE id = NEW.id;
+            END
+        """)
+    # Naplnění z existujících dat
+    cursor.execute(f"UPDATE jobs SET due_state = {due_state.replace('NEW.', '')}")
+    cursor.execute(f"UPDATE invoices SET overdue = {overdue.replace('NEW.', '')}")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS scheduler_leader (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            owner TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS scheduler_runs (
+            task TEXT PRIMARY KEY,
+            last_start REAL,
+            last_end REAL,
+            last_status TEXT,
+            last_result TEXT,
+            duration REAL,
+            runs INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+
+def latest_schema_version():
+    """Vrátí číslo poslední známé migrace."""
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+def get_schema_version(conn):
+    """Vrátí aktuální verzi schématu databáze."""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate_db(conn, target=None, log=print):
+    """Aplikuje chybějící migrace až po verzi target (výchozí je poslední).
+
+    Každý krok běží ve vlastní transakci BEGIN IMMEDIATE a verze se ověřuje
+    až po získání zámku, takže souběžně startující workery migraci neprovedou
+    dvakrát. Vrací seznam aplikovaných verzí.
+    """
+    target = latest_schema_version() if target is None else target
+    applied = []
+    for version, description, step in MIGRATIONS:
+        if version > target:
+            break
+        # PRAGMA foreign_keys nelze měnit uvnitř transakce
+        if not step.foreign_keys:
+            conn.execute("PRAGMA foreign_keys = OFF")
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if get_schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            step(conn.cursor())
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.execute(f"PRAGMA foreign_keys = {app.config['DB_PRAGMAS']['foreign_keys']}")
+        applied.append(version)
+        log(f"Migrace {version}: {description}")
+    return applied
+
+def check_schema_version(path=None):
+    """Ověří verzi schématu databáze (výchozí DATABASE); zastaralou zmigruje, je-li to povoleno.
+
+    Volá se při startu a při prvním otevření databáze tenanta v procesu.
+    """
+    path = path or app.config["DATABASE"]
+    conn = open_db_connection(path)
+    try:
+        version = get_schema_version(conn)
+        if version < latest_schema_version():
+            if not app.config["AUTO_MIGRATE"]:
+                app.logger.warning("Schéma databáze má verzi %s, aktuální je %s. Spusťte 'flask db-upgrade'.",
+                                   version, latest_schema_version())
+                return
+            migrate_db(conn, log=app.logger.info)
+            # Archiv dostane sloupce přidané migracemi, aby na něj seděly dotazy historie
+            if os.path.exists(archive_path(path)):
+                open_archive(conn, archive_path(path))
+    finally:
+        conn.close()
+
+@app.cli.command("db-upgrade")
+@click.option("--target", type=int, default=None, help="Cílová verze schématu.")
+def db_upgrade_command(target):
+    """Aplikuje chybějící migrace schématu."""
+    conn = open_db_connection(app.config["DATABASE"])
+    try:
+        applied = migrate_db(conn, target, log=click.echo)
+        if applied and os.path.exists(archive_path()):
+            open_archive(conn, archive_path())
+        click.echo(f"Schéma je ve verzi {get_schema_version(conn)}{'' if applied else ' (beze změn)'}.")
+    finally:
+        conn.close()
+
+@app.cli.command("db-version")
+def db_version_command():
+    """Vypíše verzi schématu databáze."""
+    conn = open_db_connection(app.config["DATABASE"])
+    try:
+        click.echo(f"{get_schema_version(conn)} / {latest_schema_version()}")
+    finally:
+        conn.close()
+
+@app.cli.command("stats-rebuild")
+def stats_rebuild_command():
+    """Přepočítá souhrnné statistiky dashboardu a součty zakázek od začátku."""
+    conn = open_db_connection(app.config["DATABASE"])
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        rebuild_dashboard_stats(conn.cursor())
+        rebuild_job_totals(conn.cursor())
+        conn.commit()
+        click.echo("Statistiky dashboardu a součty zakázek byly přepočítány.")
+    finally:
+        conn.close()
+
+@app.cli.command("search-rebuild")
+def search_rebuild_command():
+    """Znovu sestaví fulltextové indexy."""
+    conn = open_db_connection(app.config["DATABASE"])
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        rebuild_fts(conn.cursor())
+        conn.commit()
+        click.echo("Fulltextové indexy byly znovu sestaveny.")
+    finally:
+        conn.close()
+
+@app.cli.command("invoice-batch")
+@click.option("--prefix", default=None, help="Prefix čísla faktury (výchozí aktuální rok).")
+@click.option("--payment-type", default="příkazem")
+@click.option("--dry-run", is_flag=True, help="Pouze vypíše, co by se vyfakturovalo.")
+def invoice_batch_command(prefix, payment_type, dry_run):
+    """Vystaví faktury všem dokončeným zakázkám bez faktury."""
+    conn = open_db_connection(app.config["DATABASE"])
+    try:
+        rows = run_batch_invoicing(conn, prefix or str(datetime.date.today().year), payment_type, dry_run)
+        for row in rows:
+            click.echo(f"{row['invoice_number']}\t{row['job_number']}\t{row['total_price']:.2f}")
+        click.echo(f"{'Navrženo' if dry_run else 'Vystaveno'} faktur: {len(rows)}")
+    finally:
+        conn.close()
+
+@app.cli.command("db-orphans")
+@click.option("--delete", is_flag=True, help="Osiřelé řádky odstranit.")
+def db_orphans_command(delete):
+    """Vypíše (a případně odstraní) řádky odkazující na neexistující záznamy."""
+    conn = open_db_connection(app.config["DATABASE"])
+    try:
+        orphans = find_orphans(conn)
+        for table, rowid, parent, column, on_delete in orphans:
+            click.echo(f"{table}#{rowid}: {column} -> {parent} neexistuje")
+        if delete and orphans:
+            click.echo(f"Opraveno řádků: {clean_orphans(conn)}")
+        elif not orphans:
+            click.echo("Žádné osiřelé řádky.")
+    finally:
+        conn.close()
+
+@app.cli.command("tenant-create")
+@click.argument("name")
+@click.password_option("--password", help="Přihlašovací heslo firmy.")
+def tenant_create_command(name, password):
+    """Založí databázi nového tenanta (firmy) v TENANTS_DIR."""
+    if not app.config["TENANTS_DIR"]:
+        raise click.ClickException("Režim více firem není zapnutý (ZAKAZKY_TENANTS_DIR).")
+    if not TENANT_NAME.fullmatch(name):
+        raise click.ClickException("Název smí obsahovat jen malá písmena, číslice a pomlčky.")
+    path = tenant_path(name)
+    if os.path.exists(path):
+        raise click.ClickException(f"Tenant {name} už existuje.")
+    os.makedirs(app.config["TENANTS_DIR"], exist_ok=True)
+    conn = open_db_connection(path)
+    try:
+        migrate_db(conn, log=click.echo)
+    finally:
+        conn.close()
+    g.tenant = name
+    run_write(set_password, password)
+    click.echo(f"Tenant {name} založen: {path}")
+
+@app.cli.command("tenant-password")
+@click.argument("name")
+@click.password_option("--password", help="Nové přihlašovací heslo firmy.")
+def tenant_password_command(name, password):
+    """Nastaví přihlašovací heslo tenanta."""
+    if not tenant_exists(name):
+        raise click.ClickException(f"Tenant {name} neexistuje.")
+    g.tenant = name
+    run_write(set_password, password)
+    click.echo("Heslo bylo změněno.")
+
+def tenant_names():
+    """Názvy všech tenantů podle souborů v TENANTS_DIR."""
+    folder = app.config["TENANTS_DIR"]
+    if not folder or not os.path.isdir(folder):
+        return []
+    return sorted(name[:-3] for name in os.listdir(folder)
+                  if name.endswith(".db") and TENANT_NAME.fullmatch(name[:-3]))
+
+@app.cli.command("tenant-list")
+def tenant_list_command():
+    """Vypíše tenanty, verzi jejich schématu a velikost databáze."""
+    for name in tenant_names():
+        conn = open_db_connection(tenant_path(name))
+        try:
+            version = get_schema_version(conn)
+        finally:
+            conn.close()
+        size = os.path.getsize(tenant_path(name)) / 1024 / 1024
+        click.echo(f"{name}\t{version} / {latest_schema_version()}\t{size:.1f} MB")
+
+@app.cli.command("tenant-upgrade")
+def tenant_upgrade_command():
+    """Aplikuje chybějící migrace na databáze všech tenantů."""
+    for name in tenant_names():
+        path = tenant_path(name)
+        conn = open_db_connection(path)
+        try:
+            applied = migrate_db(conn, log=lambda message: click.echo(f"{name}: {message}"))
+            if applied and os.path.exists(archive_path(path)):
+                open_archive(conn, archive_path(path))
+            click.echo(f"{name}: schéma ve verzi {get_schema_version(conn)}{'' if applied else ' (beze změn)'}")
+        finally:
+            conn.close()
+
+# --- Měření a metriky (dotazy a čas v SQLite podle endpointu, za jeden proces) ---
+app.config.setdefault("SLOW_QUERY_MS", float(os.environ.get("ZAKAZKY_SLOW_QUERY_MS", "100")))
+# /metrics vyžaduje hlavičku "Authorization: Bearer <token>"; bez nastaveného
+# tokenu endpoint neexistuje (za reverzní proxy chodí vše z localhostu)
+app.config.setdefault("METRICS_TOKEN", os.environ.get("ZAKAZKY_METRICS_TOKEN"))
+
+def record_query(sql, params, elapsed, conn):
+    """Započítá dotaz do aktuálního požadavku a pomalý dotaz zaloguje s plánem."""
+    if not has_request_context():
+        return
+    g.sql_queries = g.get("sql_queries", 0) + 1
+    g.sql_time = g.get("sql_time", 0.0) + elapsed
+    if sql is None or elapsed * 1000 < app.config["SLOW_QUERY_MS"]:
+        return
+    g.slow_queries = g.get("slow_queries", 0) + 1
+    plan = ""
+    if params is not None and sql.split(None, 1)[0].upper() in ("SELECT", "WITH", "UPDATE", "DELETE", "INSERT"):
+        try:
+            # Obyčejný kurzor, aby se EXPLAIN sám nezapočítal
+            rows = sqlite3.Cursor(conn).execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+            plan = "\n".join(f"  {row[3]}" for row in rows)
+        except sqlite3.Error:
+            pass
+    app.logger.warning("Pomalý dotaz (%.1f ms) v %s:\n%s\n%s", elapsed * 1000, request.endpoint,
+                       " ".join(sql.split()), plan)
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Kurzor, který měří čas execute a fetch* a hlásí ho record_query."""
+
+    def execute(self, sql, params=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, params)
+        finally:
+            record_query(sql, params, time.perf_counter() - start, self.connection)
+
+    def executemany(self, sql, seq_of_params):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_params)
+        finally:
+            record_query(sql, None, time.perf_counter() - start, self.connection)
+
+    def _timed_fetch(self, fetch, *args):
+        start = time.perf_counter()
+        try:
+            return fetch(*args)
+        finally:
+            if has_request_context():
+                g.sql_time = g.get("sql_time", 0.0) + time.perf_counter() - start
+
+    def fetchone(self):
+        return self._timed_fetch(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._timed_fetch(super().fetchmany, self.arraysize if size is None else size)
+
+    def fetchall(self):
+        return self._timed_fetch(super().fetchall)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Připojení, jehož kurzory (i z conn.execute) jsou InstrumentedCursor."""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self.cursor().executemany(sql, seq_of_params)
+
+
+class Histogram:
+    """Histogram s pevnými hranicemi košů, rozdělený podle štítků."""
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._series = {}
+
+    def observe(self, labels, value):
+        series = self._series.setdefault(labels, [[0] * len(self.buckets), 0, 0.0])
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[0][i] += 1
+        series[1] += 1
+        series[2] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, count, total) in sorted(self._series.items()):
+            label_text = format_labels(labels)
+            prefix = label_text + "," if label_text else ""
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {bucket_count}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {count}')
+            suffix = f"{{{label_text}}}" if label_text else ""
+            lines.append(f"{self.name}_count{suffix} {count}")
+            lines.append(f"{self.name}_sum{suffix} {total:.6f}")
+        return lines
+
+
+class Counter:
+    """Čítač rozdělený podle štítků."""
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self._series = collections.Counter()
+
+    def inc(self, labels, value=1):
+        self._series[labels] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._series.items()):
+            lines.append(f"{self.name}{{{format_labels(labels)}}} {value}")
+        return lines
+
+
+class Gauge:
+    """Okamžitá hodnota rozdělená podle štítků."""
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self._series = {}
+
+    def set(self, labels, value):
+        self._series[labels] = value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        for labels, value in sorted(self._series.items()):
+            label_text = format_labels(labels)
+            lines.append(f"{self.name}{{{label_text}}} {value}" if label_text else f"{self.name} {value}")
+        return lines
+
+
+def format_labels(labels):
+    """Převede n-tici dvojic (název, hodnota) na štítky Promethea."""
+    return ",".join('{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+                    for name, value in labels)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+METRICS = {
+    "requests": Counter("zakazky_http_requests_total", "Počet HTTP požadavků."),
+    "latency": Histogram("zakazky_http_request_duration_seconds", "Celková doba zpracování požadavku.",
+                         LATENCY_BUCKETS),
+    "sql_time": Histogram("zakazky_sql_duration_seconds", "Čas strávený v SQLite během požadavku.",
+                          LATENCY_BUCKETS),
+    "sql_queries": Histogram("zakazky_sql_queries_per_request", "Počet SQL dotazů na požadavek.",
+                             QUERY_COUNT_BUCKETS),
+    "template_time": Histogram("zakazky_template_render_seconds", "Čas vykreslování šablon během požadavku.",
+                               LATENCY_BUCKETS),
+    "slow_queries": Counter("zakazky_sql_slow_queries_total", "Počet dotazů nad prahem SLOW_QUERY_MS."),
+    "write_queue_depth": Gauge("zakazky_write_queue_depth", "Počet zápisů čekajících ve frontě zapisovače."),
+    "db_pools": Gauge("zakazky_db_pools", "Počet otevřených fondů připojení (databází tenantů)."),
+    "backup_last_success": Gauge("zakazky_backup_last_success_timestamp_seconds",
+                                 "Čas posledního úspěšného snímku databáze (Unix)."),
+    "backup_duration": Gauge("zakazky_backup_duration_seconds", "Doba vytvoření posledního snímku databáze."),
+    "scheduler_last_success": Gauge("zakazky_scheduler_last_success_timestamp_seconds",
+                                    "Čas začátku posledního úspěšného běhu úlohy plánovače (Unix)."),
+    "scheduler_duration": Gauge("zakazky_scheduler_task_duration_seconds", "Doba posledního běhu úlohy plánovače."),
+    "scheduler_failures": Counter("zakazky_scheduler_failures_total", "Počet neúspěšných běhů úloh plánovače."),
+    "write_batch_size": Histogram("zakazky_write_batch_size", "Počet zápisů potvrzených jedním commitem.",
+                                  BATCH_SIZE_BUCKETS),
+    "write_wait": Histogram("zakazky_write_wait_seconds", "Doba od zařazení zápisu do fronty po jeho potvrzení.",
+                            LATENCY_BUCKETS),
+}
+_metrics_lock = threading.Lock()
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@before_render_template.connect_via(app)
+def start_template_timer(sender, template, context, **extra):
+    g.template_start = time.perf_counter()
+
+@template_rendered.connect_via(app)
+def stop_template_timer(sender, template, context, **extra):
+    start = g.pop("template_start", None)
+    if start is not None:
+        g.template_time = g.get("template_time", 0.0) + time.perf_counter() - start
+
+@app.after_request
+def record_request_metrics(response):
+    """Zapíše měření požadavku do metrik a přidá hlavičku Server-Timing."""
+    start = g.get("request_start")
+    if start is None:
+        return response
+    endpoint = (("endpoint", request.endpoint or "none"),)
+    elapsed = time.perf_counter() - start
+    sql_time, sql_queries = g.get("sql_time", 0.0), g.get("sql_queries", 0)
+    template_time = g.get("template_time", 0.0)
+    with _metrics_lock:
+        METRICS["requests"].inc(endpoint + (("method", request.method), ("status", response.status_code)))
+        METRICS["latency"].observe(endpoint, elapsed)
+        METRICS["sql_time"].observe(endpoint, sql_time)
+        METRICS["sql_queries"].observe(endpoint, sql_queries)
+        METRICS["template_time"].observe(endpoint, template_time)
+        if g.get("slow_queries"):
+            METRICS["slow_queries"].inc(endpoint, g.slow_queries)
+    response.headers["Server-Timing"] = (f'sql;dur={sql_time * 1000:.1f};desc="dotazy: {sql_queries}", '
+                                         f"tpl;dur={template_time * 1000:.1f}, total;dur={elapsed * 1000:.1f}")
+    return response
+
+@app.route("/metrics")
+def metrics():
+    """Metriky ve formátu Prometheus (jen s METRICS_TOKEN)."""
+    token = app.config["METRICS_TOKEN"]
+    if not token:
+        abort(404)
+    if not hmac.compare_digest(request.headers.get("Authorization", "").encode(), f"Bearer {token}".encode()):
+        abort(401)
+    with _metrics_lock:
+        lines = [line for metric in METRICS.values() for line in metric.render()]
+    return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
+
+# --- Fronta zápisů (volitelný WRITE_QUEUE, skupinový commit v modulu write_queue) ---
+app.config.setdefault("WRITE_QUEUE", os.environ.get("ZAKAZKY_WRITE_QUEUE", "0") == "1")
+app.config.setdefault("WRITE_BATCH_WINDOW_MS", float(os.environ.get("ZAKAZKY_WRITE_BATCH_WINDOW_MS", "2")))
+# Maximální počet zápisů v jedné transakci
+app.config.setdefault("WRITE_BATCH_MAX", 64)
+# Jak dlouho (s) požadavek nejvýše čeká na potvrzení svého zápisu
+app.config.setdefault("WRITE_TIMEOUT", 30)
+
+def record_write_depth(depth):
+    """Zapíše aktuální délku fronty zápisů do metrik."""
+    with _metrics_lock:
+        METRICS["write_queue_depth"].set((), depth)
+
+def record_write_batch(size, waits):
+    """Zapíše velikost potvrzené dávky a čekání jejích zápisů do metrik."""
+    with _metrics_lock:
+        METRICS["write_batch_size"].observe((), size)
+        for wait in waits:
+            METRICS["write_wait"].observe((), wait)
+
+_write_queues = {}   # cesta k databázi -> WriteQueue
+_write_queue_lock = threading.Lock()
+
+
+def get_write_queue():
+    """Vrátí (a případně spustí) zapisovač pro databázi požadavku a aktuální proces."""
+    path = database_path()
+    current = _write_queues.get(path)
+    if current is None or current.closed or current.pid != os.getpid():
+        with _write_queue_lock:
+            current = _write_queues.get(path)
+            # Vlákno zděděné přes fork neběží, nahradí se zapisovačem tohoto procesu
+            if current is None or current.closed or current.pid != os.getpid():
+                _write_queues[path] = current = WriteQueue(
+                    path, open_db_connection, app.config["WRITE_BATCH_WINDOW_MS"] / 1000,
+                    app.config["WRITE_BATCH_MAX"], on_depth=record_write_depth, on_batch=record_write_batch)
+    return current
+
 
-# Spuštění inicializace databáze
-init_db()
+def run_write(func, *args):
+    """Provede zápis func(conn, *args) v transakci a vrátí jeho výsledek.
+
+    func změny neukládá sama; výjimka z ní zápis vrátí zpět a předá se
+    volajícímu. V režimu WRITE_QUEUE zápis provede zapisovač ve skupinové
+    transakci, jinak se provede hned na připojení požadavku.
+    """
+    if app.config["WRITE_QUEUE"]:
+        while True:
+            try:
+                future = get_write_queue().submit(func, args)
+                break
+            except WriteQueueClosed:
+                # Zapisovač se právě zavřel s vyřazeným fondem, get_write_queue spustí nový
+                continue
+        return future.result(timeout=app.config["WRITE_TIMEOUT"])
+    conn = get_db_connection()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        result = func(conn, *args)
+    except Exception:
+        conn.rollback()
+        raise
+    conn.commit()
+    return result
 
 # --- Autentifikace a routy ---
 def login_required(f):
     """Dekorátor pro ochranu rout heslem."""
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if 'logged_in' not in session:
+        if g.user is None:
             return redirect(url_for('login'))
         return f(*args, **kwargs)
     return decorated_function
 
+def set_password(conn, password):
+    """Uloží hash přihlašovacího hesla do databáze (firmy); volá se přes run_write."""
+    conn.execute("INSERT OR REPLACE INTO credentials (id, password_hash) VALUES (1, ?)",
+                 (generate_password_hash(password),))
+
+def check_password(conn, password):
+    """Ověří heslo proti hashi v databázi, bez něj proti PASSWORD."""
+    row = conn.execute("SELECT password_hash FROM credentials WHERE id = 1").fetchone()
+    if row is None:
+        return password == PASSWORD
+    return check_password_hash(row["password_hash"], password or "")
+
+def request_tenant():
+    """Tenant požadavku a zda pochází ze subdomény (jinak z přihlášení v session)."""
+    domain = app.config["TENANT_DOMAIN"]
+    host = request.host.rsplit(":", 1)[0].lower()
+    if domain and host.endswith("." + domain):
+        return host[:-len(domain) - 1], True
+    return session.get("tenant"), False
+
 @app.route("/login", methods=["GET", "POST"])
 def login():
-    """Přihlašovací stránka."""
+    """Přihlašovací stránka (v režimu více firem i s volbou firmy, není-li v subdoméně)."""
     if request.method == "POST":
-        if request.form.get("password") == PASSWORD:
+        # Bez subdomény rozhoduje firma z formuláře, ne ta z dřívějšího přihlášení v session
+        if app.config["TENANTS_DIR"] and not g.tenant_from_host:
+            tenant = request.form.get("tenant", "").strip().lower()
+            if not tenant_exists(tenant):
+                return render_template("login.html", error="Nesprávná firma nebo heslo")
+            g.tenant = tenant
+        if check_password(get_db_connection(), request.form.get("password")):
             session['logged_in'] = True
+            session['tenant'] = g.tenant
             return redirect(url_for('index'))
         else:
             return render_template("login.html", error="Nesprávné heslo")
@@ -167,172 +1614,1143 @@ def login():
 def logout():
     """Odhlášení."""
     session.pop('logged_in', None)
+    session.pop('tenant', None)
     return redirect(url_for('login'))
 
 @app.before_request
 def before_request():
     g.user = None
-    if 'logged_in' in session:
+    g.tenant = None
+    g.tenant_from_host = False
+    if app.config["TENANTS_DIR"]:
+        tenant, g.tenant_from_host = request_tenant()
+        if tenant_exists(tenant):
+            g.tenant = tenant
+        elif g.tenant_from_host:
+            abort(404)
+    # Přihlášení platí jen pro firmu, ve které proběhlo
+    if 'logged_in' in session and session.get('tenant') == g.tenant:
         g.user = "admin"
 
+# --- Podmíněné HTTP odpovědi (ETag z verzí tabulek, 304 a LRU cache stránek) ---
+app.config.setdefault("PAGE_CACHE_SIZE", 256)
+
+def _etag_salt():
+    """Sůl ETagu, která se změní s novou verzí kódu nebo šablon."""
+    paths = [os.path.join(app.root_path, "app.py")]
+    templates = os.path.join(app.root_path, "templates")
+    paths += [os.path.join(templates, name) for name in os.listdir(templates)]
+    return str(max(os.path.getmtime(p) for p in paths))
+
+ETAG_SALT = _etag_salt()
+
+
+class PageCache:
+    """Omezená LRU cache vykreslených stránek v paměti procesu."""
+
+    def __init__(self, size):
+        self.size = size
+        self._pages = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            page = self._pages.get(key)
+            if page is not None:
+                self._pages.move_to_end(key)
+            return page
+
+    def put(self, key, page):
+        if self.size <= 0:
+            return
+        with self._lock:
+            self._pages[key] = page
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.size:
+                self._pages.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+
+
+page_cache = PageCache(app.config["PAGE_CACHE_SIZE"])
+
+def table_versions(conn, tables):
+    """Vrátí verze zadaných tabulek z table_versions."""
+    placeholders = ", ".join("?" * len(tables))
+    return conn.execute(f"SELECT name, version FROM table_versions WHERE name IN ({placeholders}) ORDER BY name",
+                        tables).fetchall()
+
+def conditional(*tables):
+    """Dekorátor GET routy: ETag z verzí tabulek, 304 a LRU cache stránek.
+
+    Stránky závislé na dnešním datu čtou příznaky termínů (jobs.due_state,
+    invoices.overdue). Ty se změnou data posune až úloha plánovače a tím
+    zvýší verzi tabulky, takže po půlnoci může ETag i obsah zůstat starý
+    nejvýš po dobu intervalu úlohy (SCHEDULER_DUE_INTERVAL).
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return f(*args, **kwargs)
+            versions = table_versions(get_db_connection(), tables)
+            # Kódování je součástí klíče, aby se neshodly varianty s kompresí a bez ní
+            key = "|".join([ETAG_SALT, database_path(), request.full_path, str(g.user),
+                            request.headers.get("Accept-Encoding", ""), repr([tuple(v) for v in versions])])
+            etag = hashlib.sha1(key.encode()).hexdigest()
+
+            if request.if_none_match.contains_weak(etag):
+                response = Response(status=304)
+            else:
+                page = page_cache.get(etag)
+                if page is not None:
+                    response = Response(page[0], mimetype=page[1])
+                else:
+                    response = make_response(f(*args, **kwargs))
+                    if response.status_code != 200 or response.is_streamed:
+                        return response
+                    page_cache.put(etag, (response.get_data(), response.mimetype))
+            response.set_etag(etag, weak=True)
+            response.headers["Cache-Control"] = "private, no-cache"
+            response.vary.add("Cookie")
+            response.vary.add("Accept-Encoding")
+            return response
+        return decorated_function
+    return decorator
+
+# --- Statické soubory a komprese (CSS sestavuje `flask assets-build` modulem assets_build) ---
+app.config.setdefault("ASSETS_DIR", os.environ.get("ZAKAZKY_ASSETS_DIR") or os.path.join(app.static_folder, "dist"))
+app.config.setdefault("COMPRESS_MIN_SIZE", 1024)
+app.config.setdefault("COMPRESS_LEVEL", 6)
+TEMPLATES_DIR = os.path.join(app.root_path, app.template_folder)
+ASSET_MAX_AGE = 365 * 24 * 3600
+COMPRESS_MIMETYPES = {"text/html", "application/json", "text/csv", "text/plain"}
+
+_asset_manifest = None
+
+def asset_manifest():
+    """Manifest sestavených souborů (v debug režimu se čte při každém použití znovu)."""
+    global _asset_manifest
+    if _asset_manifest is None or app.debug:
+        path = os.path.join(app.config["ASSETS_DIR"], "manifest.json")
+        try:
+            with open(path, encoding="utf-8") as f:
+                _asset_manifest = json.load(f)
+        except FileNotFoundError:
+            raise RuntimeError(f"Chybí {path}, sestavte styly příkazem 'flask assets-build'.") from None
+    return _asset_manifest
+
+@app.template_global()
+def asset_url(name):
+    """URL sestaveného souboru s otiskem obsahu (např. asset_url('app.css'))."""
+    return url_for("asset", filename=asset_manifest()[name])
+
+@app.route("/assets/<path:filename>")
+def asset(filename):
+    """Soubor z ASSETS_DIR: neměnný obsah, dlouhá cache a předkomprimované varianty."""
+    if filename == "manifest.json" or filename.endswith((".gz", ".br")):
+        abort(404)
+    directory = app.config["ASSETS_DIR"]
+    mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+        if request.accept_encodings[encoding] and os.path.isfile(os.path.join(directory, filename + suffix)):
+            response = send_from_directory(directory, filename + suffix, mimetype=mimetype, max_age=ASSET_MAX_AGE)
+            response.headers["Content-Encoding"] = encoding
+            break
+    else:
+        response = send_from_directory(directory, filename, mimetype=mimetype, max_age=ASSET_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    response.vary.add("Accept-Encoding")
+    return response
+
+@app.after_request
+def compress_response(response):
+    """Gzip pro HTML/JSON odpovědi rout, pokud to klient podporuje a vyplatí se to."""
+    if response.mimetype not in COMPRESS_MIMETYPES or request.endpoint == "asset":
+        return response
+    response.vary.add("Accept-Encoding")
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or "Content-Encoding" in response.headers or not request.accept_encodings["gzip"]):
+        return response
+    data = response.get_data()
+    if len(data) < app.config["COMPRESS_MIN_SIZE"]:
+        return response
+    response.set_data(gzip.compress(data, compresslevel=app.config["COMPRESS_LEVEL"], mtime=0))
+    response.headers["Content-Encoding"] = "gzip"
+    return response
+
+@app.cli.command("assets-build")
+def assets_build_command():
+    """Sestaví CSS do ASSETS_DIR (otisk v názvu, .gz a .br varianty)."""
+    assets_build.build(app.static_folder, TEMPLATES_DIR, app.config["ASSETS_DIR"], echo=click.echo)
+
+# --- Cache číselníků (modul lookup_cache, platnost podle verze tabulky v table_versions) ---
+lookup_cache = LookupCache()
+
+# --- Stránkování seznamů podle klíče (řadicí sloupec, id) ---
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+def encode_cursor(value, row_id):
+    """Zakóduje pozici v seznamu do řetězce pro URL."""
+    return base64.urlsafe_b64encode(json.dumps([value, row_id]).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    """Dekóduje pozici v seznamu; při neplatném kurzoru vrátí None."""
+    try:
+        value, row_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        return None
+    # Hodnota řadicího sloupce i id jdou rovnou do parametrů dotazu
+    if not isinstance(value, (str, int, float, type(None))) or type(row_id) is not int:
+        return None
+    return value, row_id
+
+def keyset_condition(column, id_column, value, row_id, forward):
+    """Podmínka pro řádky za (forward) nebo před pozicí (value, row_id).
+
+    NULL hodnoty řadí SQLite vzestupně na začátek, proto se ošetřují zvlášť;
+    pro ostatní se použije porovnání řádkových hodnot, které umí index.
+    """
+    if value is None:
+        if forward:
+            return f"(({column} IS NULL AND {id_column} > ?) OR {column} IS NOT NULL)", [row_id]
+        return f"({column} IS NULL AND {id_column} < ?)", [row_id]
+    if forward:
+        return f"({column}, {id_column}) > (?, ?)", [value, row_id]
+    return f"(({column}, {id_column}) < (?, ?) OR {column} IS NULL)", [value, row_id]
+
+def page_sql(select_sql, where, column, id_column, direction):
+    """SQL jedné stránky: filtr, řazení podle (column, id_column) a LIMIT ?."""
+    sql = select_sql
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    return sql + f" ORDER BY {column} {direction}, {id_column} {direction} LIMIT ?"
+
+def fetch_page(conn, select_sql, sort, where=None, params=(), count_sql=None, count_params=(), args=None,
+               count=True):
+    """Načte jednu stránku seznamu řazeného podle sort.
+
+    select_sql je SELECT ... FROM ... bez WHERE/ORDER BY, sort je dvojice
+    ((řadicí sloupec, klíč v řádku), (sloupec id, klíč v řádku)) a where
+    seznam podmínek filtru. Celkový počet se spočítá se stejným filtrem,
+    pokud není zadán vlastní count_sql (např. z udržovaných počítadel);
+    s count=False se nepočítá a total je None.
+    Parametry stránkování (after, before, dir, size) se čtou z args
+    (výchozí request.args); neplatný kurzor ukončí požadavek chybou 400.
+    Vrací slovník se stránkou řádků, kurzory sousedních stránek
+    a celkovým počtem.
+    """
+    args = request.args if args is None else args
+    (column, row_key), (id_column, id_key) = sort
+    descending = args.get("dir") == "desc"
+    try:
+        size = min(max(int(args.get("size", PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        size = PAGE_SIZE
+
+    where = list(where or [])
+    params = list(params)
+    if count and count_sql is None:
+        # SELECT ... FROM ... -> SELECT COUNT(*) FROM ... se stejným filtrem
+        count_sql = "SELECT COUNT(*)" + select_sql[select_sql.upper().index(" FROM "):]
+        if where:
+            count_sql += " WHERE " + " AND ".join(where)
+        count_params = params
+    total = conn.execute(count_sql, list(count_params)).fetchone()[0] if count else None
+
+    after, before = (decode_cursor(args[key]) if args.get(key) else None for key in ("after", "before"))
+    # Neplatný kurzor je chyba klienta, ne tiché vrácení první stránky
+    if (args.get("after") and after is None) or (args.get("before") and before is None):
+        abort(400)
+    if after:
+        before = None
+    position = after or before
+    if position:
+        # Při sestupném řazení je "další stránka" směrem k menším hodnotám
+        forward = (after is not None) != descending
+        condition, condition_params = keyset_condition(column, id_column, *position, forward)
+        where.append(condition)
+        params.extend(condition_params)
+
+    # Předchozí stránka se čte v obráceném pořadí a pak se otočí
+    reverse = before is not None
+    direction = "DESC" if descending != reverse else "ASC"
+    rows = conn.execute(page_sql(select_sql, where, column, id_column, direction), params + [size + 1]).fetchall()
+    has_more = len(rows) > size
+    rows = rows[:size]
+    if reverse:
+        rows.reverse()
+
+    first, last = (rows[0], rows[-1]) if rows else (None, None)
+    has_next = has_more if not reverse else True
+    has_prev = has_more if reverse else after is not None
+    return {
+        "rows": rows,
+        "total": total,
+        "size": size,
+        "next": encode_cursor(last[row_key], last[id_key]) if rows and has_next else None,
+        "prev": encode_cursor(first[row_key], first[id_key]) if rows and has_prev else None,
+    }
+
+@app.template_global()
+def page_url(**changes):
+    """URL aktuální stránky se změněnými parametry (None parametr odstraní)."""
+    args = request.args.to_dict()
+    # Změna filtru nebo řazení začíná seznam znovu od začátku
+    if not {"after", "before"} & changes.keys():
+        args.pop("after", None)
+        args.pop("before", None)
+    args.update(changes)
+    args = {k: v for k, v in args.items() if v not in (None, "")}
+    return url_for(request.endpoint, **request.view_args, **args)
+
+def sort_spec(choices, default):
+    """Vybere řazení podle parametru sort z povolených možností."""
+    return choices.get(request.args.get("sort"), choices[default])
+
+def job_filters():
+    """Podmínky filtru zakázek z parametrů status, customer_id, date_from, date_to."""
+    where, params = [], []
+    if request.args.get("status"):
+        where.append("jobs.status = ?")
+        params.append(request.args["status"])
+    if request.args.get("customer_id", type=int):
+        where.append("jobs.customer_id = ?")
+        params.append(request.args.get("customer_id", type=int))
+    if request.args.get("date_from"):
+        where.append("jobs.due_date >= ?")
+        params.append(request.args["date_from"])
+    if request.args.get("date_to"):
+        where.append("jobs.due_date <= ?")
+        params.append(request.args["date_to"])
+    return where, params
+
+def invoice_filters():
+    """Podmínky filtru faktur z parametrů payment_status, customer_id, date_from, date_to."""
+    where, params = [], []
+    if request.args.get("payment_status"):
+        where.append("invoices.payment_status = ?")
+        params.append(request.args["payment_status"])
+    if request.args.get("customer_id", type=int):
+        where.append("jobs.customer_id = ?")
+        params.append(request.args.get("customer_id", type=int))
+    if request.args.get("date_from"):
+        where.append("invoices.invoice_date >= ?")
+        params.append(request.args["date_from"])
+    if request.args.get("date_to"):
+        where.append("invoices.invoice_date <= ?")
+        params.append(request.args["date_to"])
+    return where, params
+
+def name_filter(column):
+    """Podmínka filtru podle začátku jména (rozsah, aby šel použít index)."""
+    prefix = request.args.get("q", "").strip()
+    if not prefix:
+        return [], []
+    return [f"{column} >= ? AND {column} < ?"], [prefix, prefix + "\U0010ffff"]
+
+# Finanční souhrn zakázky nad jobs LEFT JOIN job_totals; stejný výpočet
+# jako u fakturace: pevná cena + hodiny x sazba + další služby
+JOB_LABOUR_SQL = "CASE WHEN jobs.hourly_rate THEN COALESCE(job_totals.hours, 0) * jobs.hourly_rate ELSE 0 END"
+JOB_TOTAL_SQL = f"COALESCE(NULLIF(jobs.price, 0), 0) + {JOB_LABOUR_SQL} + COALESCE(job_totals.services_cost, 0)"
+JOB_SUMMARY_COLUMNS = f"""
+    COALESCE(job_totals.hours, 0) AS hours,
+    {JOB_LABOUR_SQL} AS labour_value,
+    COALESCE(job_totals.services_cost, 0) AS services_cost,
+    {JOB_TOTAL_SQL} AS total
+"""
+
+JOB_LIST_SQL = f"""
+    SELECT jobs.*, customers.name AS customer_name, {JOB_SUMMARY_COLUMNS}
+    FROM jobs
+    LEFT JOIN customers ON jobs.customer_id = customers.id
+    LEFT JOIN job_totals ON job_totals.job_id = jobs.id
+"""
+JOB_SORTS = {
+    "due_date": (("jobs.due_date", "due_date"), ("jobs.id", "id")),
+    "job_number": (("jobs.job_number", "job_number"), ("jobs.id", "id")),
+}
+INVOICE_LIST_SQL = """
+    SELECT 
+        invoices.*, 
+        jobs.job_name, 
+        customers.name AS customer_name
+    FROM invoices
+    LEFT JOIN jobs ON invoices.job_id = jobs.id
+    LEFT JOIN customers ON jobs.customer_id = customers.id
+"""
+INVOICE_SORTS = {
+    "invoice_date": (("invoices.invoice_date", "invoice_date"), ("invoices.id", "id")),
+    "invoice_number": (("invoices.invoice_number", "invoice_number"), ("invoices.id", "id")),
+}
+
+def stats_counter(conn, name):
+    """Vrátí hodnotu udržovaného počítadla ze stats_counters."""
+    row = conn.execute("SELECT value FROM stats_counters WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else 0
+
+# --- Registr dotazů (pojmenované SQL horkých rout, plány kontroluje db-check-plans) ---
+Query = collections.namedtuple("Query", "sql params allow_scan allow_temp_btree")
+QUERIES = {}
+# Tabulky, které rostou s objemem dat; malé tabulky (pracovníci, dodavatel) se nekontrolují
+LARGE_TABLES = {"customers", "jobs", "tasks", "hours_spent", "additional_services",
+                "invoices", "invoice_snapshots", "invoice_lines"}
+
+def register_query(name, sql, params=(), allow_scan=(), allow_temp_btree=False):
+    """Zaregistruje dotaz pod jménem a vrátí jeho SQL (pro konstantu v modulu)."""
+    QUERIES[name] = Query(sql, tuple(params), frozenset(allow_scan), allow_temp_btree)
+    return sql
+
+def register_page_queries(name, select_sql, sorts, where=(), params=(), count=True, **allow):
+    """Zaregistruje varianty stránkovaného seznamu, jak je skládá fetch_page.
+
+    Pro každé řazení a směr první stránku a stránku za kurzorem, případně
+    i dotaz na celkový počet se stejným filtrem.
+    """
+    for sort_name, ((column, _), (id_column, _)) in sorts.items():
+        for direction in ("ASC", "DESC"):
+            condition, condition_params = keyset_condition(column, id_column, "2025-01-01", 1,
+                                                           direction == "ASC")
+            register_query(f"{name}:{sort_name}:{direction.lower()}",
+                           page_sql(select_sql, list(where), column, id_column, direction),
+                           [*params, PAGE_SIZE + 1], **allow)
+            register_query(f"{name}:{sort_name}:{direction.lower()}:after",
+                           page_sql(select_sql, [*where, condition], column, id_column, direction),
+                           [*params, *condition_params, PAGE_SIZE + 1], **allow)
+    if count and where:
+        count_sql = "SELECT COUNT(*)" + select_sql[select_sql.upper().index(" FROM "):]
+        register_query(f"{name}:count", count_sql + " WHERE " + " AND ".join(where), params, **allow)
+
+def explain_query(conn, query):
+    """Vrátí řádky plánu dotazu (sloupec detail z EXPLAIN QUERY PLAN)."""
+    return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + query.sql, query.params)]
+
+def plan_problems(query, plan):
+    """Najde v plánu úplné průchody velkých tabulek a řazení přes dočasný B-strom."""
+    # Průchod indexem v pořadí ORDER BY je v pořádku jen s LIMIT, jinak čte vše
+    limited = re.search(r"\bLIMIT\b", query.sql, re.IGNORECASE) is not None
+    problems = []
+    for detail in plan:
+        words = detail.split()
+        if words[0] == "SCAN" and words[1] in LARGE_TABLES and ("USING" not in words or not limited) \
+                and words[1] not in query.allow_scan:
+            problems.append(detail)
+        elif detail.startswith("USE TEMP B-TREE") and not query.allow_temp_btree:
+            problems.append(detail)
+    return problems
+
+def check_query_plans(conn):
+    """Zkontroluje plány všech registrovaných dotazů; vrací {jméno: (plán, problémy)}.
+
+    Dotazy nad archivem se bez připojeného archivu přeskočí.
+    """
+    archive = archive_attached(conn)
+    return {name: (plan, plan_problems(query, plan))
+            for name, query in QUERIES.items() if archive or "archive." not in query.sql
+            for plan in [explain_query(conn, query)]}
+
+DASHBOARD_NEXT_JOBS_SQL = register_query("dashboard_next_jobs", """
+    SELECT jobs.*, customers.name AS customer_name
+    FROM jobs
+    LEFT JOIN customers ON jobs.customer_id = customers.id
+    ORDER BY due_date ASC
+    LIMIT 5
+""")
+DASHBOARD_UPCOMING_SQL = register_query("dashboard_upcoming", """
+    SELECT jobs.*, customers.name AS customer_name
+    FROM jobs
+    LEFT JOIN customers ON jobs.customer_id = customers.id
+    WHERE jobs.due_state = 'upcoming'
+    ORDER BY due_date ASC
+""")
+DASHBOARD_OVERDUE_SQL = register_query("dashboard_overdue", """
+    SELECT (SELECT COUNT(*) FROM jobs WHERE due_state = 'overdue') AS jobs,
+           (SELECT COUNT(*) FROM invoices WHERE overdue = 1) AS invoices
+""")
+JOB_DETAIL_SQL = register_query("job_detail", f"""
+    SELECT jobs.*, customers.name AS customer_name, customers.company, customers.phone, customers.email, customers.address,
+           {JOB_SUMMARY_COLUMNS}
+    FROM jobs
+    LEFT JOIN customers ON jobs.customer_id = customers.id
+    LEFT JOIN job_totals ON job_totals.job_id = jobs.id
+    WHERE jobs.id = ?
+""", (1,))
+# Úkoly, hodiny a služby na detailu zakázky se stránkují každé zvlášť;
+# první stránka se vykreslí přímo do detailu, další se dočítají jako fragmenty
+JobSection = collections.namedtuple("JobSection", "select_sql where sort direction")
+TASK_FIELDS = "id, task_name, notes, due_date, is_completed"
+JOB_SECTIONS = {
+    "tasks": JobSection(f"SELECT {TASK_FIELDS} FROM tasks", "job_id = ?",
+                        (("due_date", "due_date"), ("id", "id")), "asc"),
+    "hours": JobSection("""
+        SELECT hours_spent.*, workers.name AS worker_name
+        FROM hours_spent
+        LEFT JOIN workers ON hours_spent.worker_id = workers.id
+    """, "hours_spent.job_id = ?", (("hours_spent.date_spent", "date_spent"), ("hours_spent.id", "id")), "desc"),
+    "services": JobSection("SELECT * FROM additional_services", "job_id = ?", (("id", "id"), ("id", "id")), "asc"),
+}
+JOB_SECTION_SIZE = 20
+for section_name, section in JOB_SECTIONS.items():
+    register_page_queries(f"job_detail:{section_name}", section.select_sql, {"default": section.sort},
+                          [section.where], (1,), count=False)
+# Historie zákazníka a pracovníka se skládá z části nad živou databází a,
+# je-li připojen archiv, ze stejné části nad ním ({db} a {archived})
+def archive_union(part_sql, params, archive, order_by):
+    """Spojí části dotazu přes UNION ALL (s archive=True i nad archivem); vrací (sql, params)."""
+    schemas = [("main", 0), ("archive", 1)] if archive else [("main", 0)]
+    sql = "\nUNION ALL\n".join(part_sql.format(db=db, archived=archived) for db, archived in schemas)
+    return sql + f"\nORDER BY {order_by}", list(params) * len(schemas)
+
+CUSTOMER_JOBS_PART = f"""
+    SELECT jobs.id, jobs.job_number, jobs.job_name, jobs.status, jobs.due_date,
+           {JOB_SUMMARY_COLUMNS}, {{archived}} AS archived
+    FROM {{db}}.jobs AS jobs
+    LEFT JOIN {{db}}.job_totals AS job_totals ON job_totals.job_id = jobs.id
+    WHERE jobs.customer_id = ?
+"""
+# Seskupení a řazení jen hodin jednoho pracovníka (přes index), dočasný B-strom je v pořádku
+WORKER_JOBS_PART = """
+    SELECT jobs.id, jobs.job_number, jobs.job_name, jobs.status, jobs.due_date,
+           SUM(hours_spent.hours) AS total_hours,
+           SUM(hours_spent.hours) * COALESCE(jobs.hourly_rate, 0) AS labour_value,
+           COALESCE(job_totals.hours, 0) AS job_hours, {archived} AS archived
+    FROM {db}.hours_spent AS hours_spent
+    LEFT JOIN {db}.jobs AS jobs ON hours_spent.job_id = jobs.id
+    LEFT JOIN {db}.job_totals AS job_totals ON job_totals.job_id = jobs.id
+    WHERE hours_spent.worker_id = ?
+    GROUP BY jobs.id
+"""
+for archive in (False, True):
+    suffix = ":archive" if archive else ""
+    register_query("customer_history" + suffix, *archive_union(CUSTOMER_JOBS_PART, (1,), archive, "due_date DESC"),
+                   allow_temp_btree=archive)
+    register_query("worker_detail" + suffix, *archive_union(WORKER_JOBS_PART, (1,), archive, "due_date DESC"),
+                   allow_temp_btree=True)
+INVOICE_VERSION_SQL = register_query("view_invoice:version",
+                                     "SELECT snapshot_version FROM invoices WHERE id = ?", (1,))
+INVOICE_SNAPSHOT_SQL = register_query("view_invoice:snapshot", """
+    SELECT invoices.*, invoice_snapshots.*
+    FROM invoices
+    JOIN invoice_snapshots ON invoice_snapshots.invoice_id = invoices.id
+    WHERE invoices.id = ?
+""", (1,))
+INVOICE_LINES_SQL = register_query("view_invoice:lines",
+                                   "SELECT * FROM invoice_lines WHERE invoice_id = ? ORDER BY position", (1,))
+
+# Přehled ziskovosti záměrně čte všechny (vyfiltrované) zakázky jedním průchodem
+PROFITABILITY_GROUPS = {
+    "month": ("jobs.due_month", "NULLIF(jobs.due_month, '')", "group_key DESC"),
+    "customer": ("jobs.customer_id", "customers.name", "total DESC"),
+    "status": ("jobs.status", "jobs.status", "total DESC"),
+}
+
+PROFITABILITY_SUMS = ("jobs", "hours", "labour_value", "services_cost", "fixed_price", "total", "paid")
+
+def profitability_sql(group, where=(), archive=False):
+    """Agregační dotaz přehledu ziskovosti seskupený podle group.
+
+    S archive=True se sečtou skupiny z živé databáze i z archivu; parametry
+    podmínek where se pak předávají dvakrát.
+    """
+    key, label, order = PROFITABILITY_GROUPS[group]
+    part = f"""
+        SELECT {label} AS label, {key} AS group_key, COUNT(jobs.id) AS jobs,
+               SUM(COALESCE(job_totals.hours, 0)) AS hours,
+               SUM({JOB_LABOUR_SQL}) AS labour_value,
+               SUM(COALESCE(job_totals.services_cost, 0)) AS services_cost,
+               SUM(COALESCE(jobs.price, 0)) AS fixed_price,
+               SUM({JOB_TOTAL_SQL}) AS total,
+               SUM(COALESCE(jobs.total_paid, 0)) AS paid
+        FROM {{db}}.jobs AS jobs
+        LEFT JOIN {{db}}.job_totals AS job_totals ON job_totals.job_id = jobs.id
+        LEFT JOIN main.customers AS customers ON jobs.customer_id = customers.id
+        {"WHERE " + " AND ".join(where) if where else ""}
+        GROUP BY {key}
+    """
+    if not archive:
+        return part.format(db="main") + f"ORDER BY {order}"
+    sums = ", ".join(f"SUM({column}) AS {column}" for column in PROFITABILITY_SUMS)
+    return f"""
+        SELECT MAX(label) AS label, group_key, {sums}
+        FROM ({part.format(db="main")} UNION ALL {part.format(db="archive")})
+        GROUP BY group_key
+        ORDER BY {order}
+    """
+
+for group in PROFITABILITY_GROUPS:
+    for archive in (False, True):
+        register_query(f"profitability:{group}" + (":archive" if archive else ""), profitability_sql(group, (), archive),
+                       allow_scan={"jobs"}, allow_temp_btree=True)
+
+OPEN_JOBS_WHERE = "jobs.status NOT IN ('Dokončená', 'Fakturovaná')"
+UNPAID_INVOICES_WHERE = "invoices.payment_status = 'Nezaplaceno'"
+UPCOMING_JOBS_WHERE = "jobs.due_state = 'upcoming'"
+OVERDUE_JOBS_WHERE = "jobs.due_state = 'overdue'"
+OVERDUE_INVOICES_WHERE = "invoices.overdue = 1"
+CUSTOMER_SORT = (("name", "name"), ("id", "id"))
+
+register_page_queries("job_list", JOB_LIST_SQL, JOB_SORTS)
+register_page_queries("job_list:status", JOB_LIST_SQL, JOB_SORTS, ["jobs.status = ?"], ["Rozpracovaná"])
+register_page_queries("job_list:customer", JOB_LIST_SQL, {"due_date": JOB_SORTS["due_date"]},
+                      ["jobs.customer_id = ?"], [1])
+register_page_queries("active_jobs_list", JOB_LIST_SQL, JOB_SORTS, [OPEN_JOBS_WHERE], count=False)
+register_page_queries("upcoming_jobs_list", JOB_LIST_SQL, {"due_date": JOB_SORTS["due_date"]}, [UPCOMING_JOBS_WHERE])
+register_page_queries("overdue_jobs_list", JOB_LIST_SQL, {"due_date": JOB_SORTS["due_date"]}, [OVERDUE_JOBS_WHERE])
+register_page_queries("invoice_list", INVOICE_LIST_SQL, INVOICE_SORTS)
+register_page_queries("unpaid_invoices_list", INVOICE_LIST_SQL, INVOICE_SORTS, [UNPAID_INVOICES_WHERE], count=False)
+register_page_queries("overdue_invoices_list", INVOICE_LIST_SQL, INVOICE_SORTS, [OVERDUE_INVOICES_WHERE])
+register_page_queries("customer_list", "SELECT * FROM customers", {"name": CUSTOMER_SORT})
+register_page_queries("customer_list:q", "SELECT * FROM customers", {"name": CUSTOMER_SORT},
+                      ["name >= ? AND name < ?"], ["No", "No\U0010ffff"])
+
+def seed_plan_check_database(conn, archive):
+    """Připraví prázdnou databázi pro kontrolu plánů (db-check-plans, testy).
+
+    Menší, ale realisticky rozložená data, ať planner vidí statistiky
+    ANALYZE. Polovina uhrazených zakázek se přesune do archivu v souboru
+    archive, ať se kontrolují i dotazy nad ním.
+    """
+    migrate_db(conn, log=lambda *args: None)
+    seed_database(conn, customers=500, workers=20, jobs=5000, tasks=10000, hours=20000,
+                  services=2000, invoiced=0.4, seed=1)
+    cutoff = conn.execute("""
+        SELECT invoice_date FROM invoices WHERE payment_status = 'Uhrazeno'
+        ORDER BY invoice_date LIMIT 1 OFFSET (SELECT COUNT(*) / 2 FROM invoices WHERE payment_status = 'Uhrazeno')
+    """).fetchone()
+    open_archive(conn, archive)
+    archive_jobs(conn, cutoff[0] if cutoff else "0000")
+    conn.execute("ANALYZE archive")
+
+@app.cli.command("db-check-plans")
+@click.option("--current", is_flag=True, help="Kontrolovat nad nastavenou databází místo vygenerované.")
+@click.option("--verbose", "-v", is_flag=True, help="Vypsat plány všech dotazů.")
+def db_check_plans_command(current, verbose):
+    """Ověří plány registrovaných dotazů; při regresi skončí chybou."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = app.config["DATABASE"] if current else os.path.join(directory, "plans.db")
+        conn = open_db_connection(path)
+        try:
+            if not current:
+                seed_plan_check_database(conn, os.path.join(directory, "plans_archive.db"))
+            else:
+                attach_archive(conn, archive_path(conn.path))
+            results = check_query_plans(conn)
+        finally:
+            conn.close()
+
+    failed = 0
+    for name, (plan, problems) in results.items():
+        if problems:
+            failed += 1
+            click.echo(f"CHYBA {name}: " + "; ".join(problems))
+        elif verbose:
+            click.echo(f"OK {name}")
+        if verbose or problems:
+            for detail in plan:
+                click.echo(f"    {detail}")
+    click.echo(f"Zkontrolováno dotazů: {len(results)}, s regresí: {failed}")
+    if failed:
+        raise SystemExit(1)
+
+# --- Archiv uzavřených zakázek (modul archive, připojený jako schema archive jen pro čtení) ---
+app.config.setdefault("ARCHIVE_DATABASE", os.environ.get("ZAKAZKY_ARCHIVE_DB"))
+app.config.setdefault("ARCHIVE_AFTER_DAYS", int(os.environ.get("ZAKAZKY_ARCHIVE_AFTER_DAYS", "730")))
+register_query("archive_candidates", ARCHIVE_CANDIDATES_SQL, ("2024-01-01", ARCHIVE_BATCH))
+
+def archive_path(database=None):
+    """Cesta k archivu: ARCHIVE_DATABASE, jinak <databáze>_archive.db vedle živé databáze.
+
+    V režimu více firem má archiv každý tenant vlastní a ARCHIVE_DATABASE se nepoužije.
+    """
+    if app.config["ARCHIVE_DATABASE"] and not app.config["TENANTS_DIR"]:
+        return app.config["ARCHIVE_DATABASE"]
+    return os.path.splitext(database or app.config["DATABASE"])[0] + "_archive.db"
+
+@app.cli.command("db-archive")
+@click.option("--days", type=int, default=None,
+              help="Archivovat zakázky s fakturou starší než N dní (výchozí ARCHIVE_AFTER_DAYS).")
+@click.option("--dry-run", is_flag=True, help="Jen vypsat, kolik zakázek by se přesunulo.")
+@click.option("--vacuum", is_flag=True, help="Po přesunu zmenšit soubor živé databáze (VACUUM).")
+def db_archive_command(days, dry_run, vacuum):
+    """Přesune staré uhrazené zakázky do archivu."""
+    days = app.config["ARCHIVE_AFTER_DAYS"] if days is None else days
+    cutoff = (datetime.date.today() - datetime.timedelta(days=days)).isoformat()
+    conn = open_db_connection(app.config["DATABASE"])
+    try:
+        if dry_run:
+            count = len(conn.execute(ARCHIVE_CANDIDATES_SQL, (cutoff, -1)).fetchall())
+            click.echo(f"K archivaci: {count} zakázek s fakturou před {cutoff}.")
+            return
+        open_archive(conn, archive_path())
+        moved = archive_jobs(conn, cutoff)
+        conn.execute("PRAGMA optimize")
+        if vacuum and moved:
+            conn.execute("VACUUM main")
+        click.echo(f"Archivováno zakázek: {moved} (faktura před {cutoff}) do {archive_path()}.")
+    finally:
+        conn.close()
+
+@app.cli.command("db-archive-restore")
+@click.option("--job", "job_ids", type=int, multiple=True, help="Id zakázky (lze opakovat).")
+@click.option("--customer", "customer_id", type=int, default=None, help="Všechny archivované zakázky zákazníka.")
+@click.option("--all", "restore_all", is_flag=True, help="Celý archiv.")
+def db_archive_restore_command(job_ids, customer_id, restore_all):
+    """Vrátí zakázky z archivu do živé databáze."""
+    if not (job_ids or customer_id or restore_all):
+        raise click.UsageError("Zadejte --job, --customer nebo --all.")
+    if not os.path.exists(archive_path()):
+        raise click.ClickException(f"Archiv {archive_path()} neexistuje.")
+    conn = open_db_connection(app.config["DATABASE"])
+    try:
+        open_archive(conn, archive_path())
+        where, params = [], []
+        if job_ids:
+            where.append(f"id IN ({', '.join('?' * len(job_ids))})")
+            params.extend(job_ids)
+        if customer_id:
+            where.append("customer_id = ?")
+            params.append(customer_id)
+        sql = "SELECT id FROM archive.jobs" + (" WHERE " + " AND ".join(where) if where else "") + " ORDER BY id"
+        selected = [row[0] for row in conn.execute(sql, params)]
+        try:
+            restored = restore_jobs(conn, selected)
+        except sqlite3.IntegrityError as e:
+            raise click.ClickException(f"Obnovení se nezdařilo: {e}")
+        click.echo(f"Obnoveno zakázek: {restored}.")
+    finally:
+        conn.close()
+
+# --- Zálohy (ověřené snímky za běhu v modulu backups, BACKUP_DIR/<databáze>/) ---
+app.config.setdefault("BACKUP_DIR", os.environ.get("ZAKAZKY_BACKUP_DIR", os.path.join(app.root_path, "backups")))
+app.config.setdefault("BACKUP_KEEP", int(os.environ.get("ZAKAZKY_BACKUP_KEEP", "14")))
+# "backup" = backup API po krocích, "vacuum" = VACUUM INTO (menší soubor, ale v jednom kroku)
+app.config.setdefault("BACKUP_METHOD", os.environ.get("ZAKAZKY_BACKUP_METHOD", "backup"))
+app.config.setdefault("BACKUP_STEP_PAGES", 1024)
+app.config.setdefault("BACKUP_STEP_SLEEP", 0.005)
+# "integrity" (integrity_check + foreign_key_check) nebo rychlejší "quick" (quick_check)
+app.config.setdefault("BACKUP_CHECK", os.environ.get("ZAKAZKY_BACKUP_CHECK", "integrity"))
+# 0 = zálohuje se jen příkazem flask db-backup, jinak úlohou plánovače
+app.config.setdefault("BACKUP_INTERVAL_HOURS", float(os.environ.get("ZAKAZKY_BACKUP_INTERVAL_HOURS", "0")))
+
+def backup_databases():
+    """Databáze k zálohování: živá (v režimu více firem všichni tenanti) a jejich existující archivy."""
+    if app.config["TENANTS_DIR"] and not os.environ.get("ZAKAZKY_TENANT"):
+        paths = [tenant_path(name) for name in tenant_names()]
+    else:
+        paths = [app.config["DATABASE"]]
+    return paths + [archive_path(path) for path in paths if os.path.exists(archive_path(path))]
+
+def backup_folder(path):
+    """Složka snímků databáze: BACKUP_DIR/<název souboru bez přípony>."""
+    return os.path.join(app.config["BACKUP_DIR"], os.path.splitext(os.path.basename(path))[0])
+
+def backup_database(path, method=None):
+    """Vytvoří ověřený snímek databáze, promaže staré a vrátí popis výsledku."""
+    folder = backup_folder(path)
+    start = time.perf_counter()
+    snapshot = backups.snapshot_database(
+        path, folder, method or app.config["BACKUP_METHOD"], timeout=app.config["DB_PRAGMAS"]["busy_timeout"] / 1000,
+        step_pages=app.config["BACKUP_STEP_PAGES"], step_sleep=app.config["BACKUP_STEP_SLEEP"],
+        check=app.config["BACKUP_CHECK"])
+    elapsed = time.perf_counter() - start
+    removed = backups.rotate_snapshots(folder, app.config["BACKUP_KEEP"])
+    labels = (("database", os.path.basename(folder)),)
+    with _metrics_lock:
+        METRICS["backup_last_success"].set(labels, int(time.time()))
+        METRICS["backup_duration"].set(labels, f"{elapsed:.3f}")
+    return (f"{snapshot} ({os.path.getsize(snapshot) / 1024 / 1024:.1f} MB, {elapsed:.1f} s"
+            + (f", smazáno starších: {len(removed)})" if removed else ")"))
+
+def run_backups(method=None, log=None):
+    """Zálohuje všechny databáze; vrací (popisy snímků, chyby).
+
+    Selhání jedné databáze nezastaví zálohu ostatních.
+    """
+    snapshots, failures = [], []
+    for path in backup_databases():
+        try:
+            snapshots.append(backup_database(path, method))
+        except Exception as e:
+            app.logger.exception("Záloha %s selhala", path)
+            failures.append((path, e))
+            continue
+        if log:
+            log(snapshots[-1])
+    return snapshots, failures
+
+@app.cli.command("db-backup")
+@click.option("--method", type=click.Choice(["backup", "vacuum"]), default=None,
+              help="backup = po krocích za běhu (výchozí), vacuum = VACUUM INTO.")
+def db_backup_command(method):
+    """Vytvoří ověřené snímky databází do BACKUP_DIR a promaže staré."""
+    snapshots, failures = run_backups(method, log=click.echo)
+    for path, error in failures:
+        click.echo(f"{path}: {error}", err=True)
+    if failures:
+        raise click.ClickException(f"Nezdařilo se zálohovat databází: {len(failures)}")
+
+@app.cli.command("db-backup-list")
+def db_backup_list_command():
+    """Vypíše snímky databází v BACKUP_DIR."""
+    for path in backup_databases():
+        for snapshot in backups.list_snapshots(backup_folder(path)):
+            click.echo(f"{snapshot}\t{os.path.getsize(snapshot) / 1024 / 1024:.1f} MB")
+
+@app.cli.command("db-restore")
+@click.argument("snapshot", type=click.Path(exists=True, dir_okay=False))
+@click.option("--archive", is_flag=True, help="Obnovit archiv místo živé databáze.")
+@click.option("--yes", is_flag=True, help="Neptat se na potvrzení.")
+def db_restore_command(snapshot, archive, yes):
+    """Obnoví databázi (nebo archiv) ze snímku; předtím uloží snímek současného stavu."""
+    path = archive_path() if archive else app.config["DATABASE"]
+    problems = backups.verify_snapshot(snapshot, app.config["BACKUP_CHECK"])
+    if problems:
+        raise click.ClickException("Snímek je poškozený: " + "; ".join(problems[:5]))
+    if not yes:
+        click.confirm(f"Přepsat {path} obsahem {snapshot}?", abort=True)
+    if os.path.exists(path):
+        current = backups.snapshot_database(path, backup_folder(path),
+                                            timeout=app.config["DB_PRAGMAS"]["busy_timeout"] / 1000)
+        click.echo(f"Současný stav uložen do {current}")
+    backups.restore_snapshot(snapshot, path, timeout=app.config["DB_PRAGMAS"]["busy_timeout"] / 1000)
+    # Snímek se starším schématem se dorovná na aktuální verzi
+    conn = open_db_connection(app.config["DATABASE"])
+    try:
+        if archive:
+            open_archive(conn, path)
+        else:
+            migrate_db(conn, log=click.echo)
+    finally:
+        conn.close()
+    click.echo(f"Obnoveno z {snapshot}.")
+
+# --- Plánovač úloh (modul scheduler, vlákno v každém obsluhujícím procesu, úlohy provádí vedoucí) ---
+app.config.setdefault("SCHEDULER", os.environ.get("ZAKAZKY_SCHEDULER", "1") == "1")
+app.config.setdefault("SCHEDULER_TICK", 30)
+app.config.setdefault("SCHEDULER_LEASE", 120)
+# Interval posunu příznaků termínů; o tolik může po půlnoci zaostávat dashboard i jeho ETag
+app.config.setdefault("SCHEDULER_DUE_INTERVAL", 300)
+UPCOMING_DAYS = 10
+
+# Příznaky termínů (jobs.due_state, invoices.overdue) nastavují triggery migrace 13
+# při zápisu, plánovač posouvá jen ty, které se změnily plynutím času
+def job_due_state_sql(row):
+    """Výraz stavu termínu zakázky pro řádek row: 'overdue', 'upcoming', 'later', NULL u uzavřených a bez termínu."""
+    return f"""CASE
+        WHEN {row}.status IN ('Dokončená', 'Fakturovaná') OR {row}.due_date IS NULL THEN NULL
+        WHEN {row}.due_date < date('now', 'localtime') THEN 'overdue'
+        WHEN {row}.due_date <= date('now', 'localtime', '+{UPCOMING_DAYS} days') THEN 'upcoming'
+        ELSE 'later'
+    END"""
+
+def invoice_overdue_sql(row):
+    """Výraz příznaku faktury po splatnosti pro řádek row (alias tabulky nebo NEW)."""
+    return (f"COALESCE({row}.payment_status = 'Nezaplaceno' "
+            f"AND {row}.due_date < date('now', 'localtime'), 0)")
+
+MARK_OVERDUE_INVOICES_SQL = register_query("scheduler:overdue_invoices", """
+    UPDATE invoices SET overdue = 1
+    WHERE payment_status = 'Nezaplaceno' AND due_date < date('now', 'localtime') AND overdue = 0
+""")
+REFRESH_JOB_DUE_SQL = register_query("scheduler:job_due_flags", f"""
+    UPDATE jobs SET due_state = {job_due_state_sql("jobs")}
+    WHERE due_state IN ('upcoming', 'later') AND due_date <= date('now', 'localtime', '+{UPCOMING_DAYS} days')
+      AND due_state IS NOT {job_due_state_sql("jobs")}
+""")
+
+def record_scheduler_run(path, name, status, start, elapsed):
+    """Metriky běhu úlohy plánovače."""
+    labels = (("database", os.path.splitext(os.path.basename(path))[0]), ("task", name))
+    with _metrics_lock:
+        if status == "ok":
+            METRICS["scheduler_last_success"].set(labels, int(start))
+        else:
+            METRICS["scheduler_failures"].inc(labels)
+        METRICS["scheduler_duration"].set(labels, f"{elapsed:.3f}")
+
+scheduler = Scheduler(on_run=record_scheduler_run)
+
+@scheduler.task("overdue_invoices", lambda: app.config["SCHEDULER_DUE_INTERVAL"])
+def mark_overdue_invoices(conn):
+    """Označí faktury, kterým uplynula splatnost."""
+    marked = conn.execute(MARK_OVERDUE_INVOICES_SQL).rowcount
+    conn.commit()
+    return f"nově po splatnosti: {marked}"
+
+@scheduler.task("job_due_flags", lambda: app.config["SCHEDULER_DUE_INTERVAL"])
+def refresh_job_due_flags(conn):
+    """Posune zakázky mezi 'later', 'upcoming' a 'overdue' podle dnešního data."""
+    changed = conn.execute(REFRESH_JOB_DUE_SQL).rowcount
+    conn.commit()
+    return f"změněno: {changed}"
+
+@scheduler.task("optimize", 24 * 3600)
+def optimize_database(conn):
+    """PRAGMA optimize: obnoví statistiky planneru tam, kde se vyplatí."""
+    conn.execute("PRAGMA analysis_limit = 1000")
+    conn.execute("PRAGMA optimize")
+
+@scheduler.task("analyze", 7 * 24 * 3600)
+def analyze_database(conn):
+    """Úplné (vzorkované) ANALYZE všech indexů."""
+    conn.execute("PRAGMA analysis_limit = 1000")
+    conn.execute("ANALYZE")
+    conn.commit()
+
+@scheduler.task("wal_checkpoint", 600)
+def checkpoint_wal(conn):
+    """Pasivní checkpoint WAL, aby soubor -wal nerostl mezi automatickými checkpointy."""
+    busy, pages, checkpointed = conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+    return f"stránek ve WAL: {pages}, zapsáno: {checkpointed}" + (" (databáze zaneprázdněná)" if busy else "")
+
+@scheduler.task("backup", lambda: app.config["BACKUP_INTERVAL_HOURS"] * 3600)
+def backup_task(conn):
+    """Snímek databáze a jejího archivu (viz Zálohy)."""
+    paths = [conn.path]
+    if os.path.exists(archive_path(conn.path)):
+        paths.append(archive_path(conn.path))
+    return "; ".join(backup_database(path) for path in paths)
+
+def scheduler_databases():
+    """Databáze obsluhované plánovačem (v režimu více firem všichni tenanti)."""
+    if app.config["TENANTS_DIR"] and not os.environ.get("ZAKAZKY_TENANT"):
+        return [tenant_path(name) for name in tenant_names()]
+    return [app.config["DATABASE"]]
+
+def scheduler_visit(path, owner):
+    """Kolo vlákna plánovače na krátkodobém připojení; vrací čas příští návštěvy.
+
+    Fondy připojení patří požadavkům: návštěva fond neotevírá ani neposouvá
+    v LRU, takže nečinné databáze se dál vyřazují. Databáze se zastaralým
+    schématem se nemigruje, jen přeskočí (0 = zkusit znovu příště).
+    """
+    conn = open_db_connection(path)
+    try:
+        if get_schema_version(conn) < latest_schema_version():
+            return 0
+        scheduler.run_round(conn, owner, app.config["SCHEDULER_LEASE"])
+        return scheduler.next_visit(conn, owner)
+    finally:
+        conn.close()
+
+@app.before_request
+def start_scheduler():
+    """Spustí vlákno plánovače v procesu, který obsluhuje požadavky."""
+    if app.config["SCHEDULER"]:
+        scheduler.start(scheduler_databases, scheduler_visit, app.config["SCHEDULER_TICK"])
+
+@app.cli.command("scheduler-run")
+@click.argument("tasks", nargs=-1)
+@click.option("--force", is_flag=True, help="Spustit i tehdy, když databázi vede jiný proces.")
+def scheduler_run_command(tasks, force):
+    """Spustí úlohy plánovače hned (bez argumentů ty s prošlým intervalem)."""
+    unknown = set(tasks) - set(scheduler.tasks)
+    if unknown:
+        raise click.UsageError(f"Neznámé úlohy: {', '.join(sorted(unknown))} "
+                               f"(k dispozici: {', '.join(scheduler.tasks)})")
+    owner = f"cli:{process_owner()}"
+    failed = 0
+    for path in scheduler_databases():
+        conn = open_db_connection(path)
+        try:
+            if get_schema_version(conn) < latest_schema_version():
+                click.echo(f"{path}: zastaralé schéma, spusťte 'flask db-upgrade'")
+                continue
+            if force:
+                release_leadership(conn)
+            results = scheduler.run_round(conn, owner, app.config["SCHEDULER_LEASE"], tasks or None, release=True)
+        finally:
+            conn.close()
+        if results is None:
+            click.echo(f"{path}: plánovač vede jiný proces (--force ho přebije)")
+            continue
+        for name, status, result in results:
+            failed += status != "ok"
+            click.echo(f"{path}: {name} {status}" + (f" – {result}" if result else ""))
+    if failed:
+        raise click.ClickException(f"Neúspěšných úloh: {failed}")
+
+@app.cli.command("scheduler-status")
+def scheduler_status_command():
+    """Vypíše vedoucí proces a poslední běhy úloh plánovače."""
+    for path in scheduler_databases():
+        conn = open_db_connection(path)
+        try:
+            if get_schema_version(conn) < latest_schema_version():
+                click.echo(f"{path}: zastaralé schéma, plánovač ji přeskakuje")
+                continue
+            leader = conn.execute("SELECT owner, expires_at FROM scheduler_leader").fetchone()
+            runs = {row["task"]: row for row in conn.execute("SELECT * FROM scheduler_runs")}
+        finally:
+            conn.close()
+        active = leader and leader["expires_at"] > time.time()
+        click.echo(f"{path}: vedoucí {leader['owner'] if active else '–'}")
+        for name in scheduler.tasks:
+            run = runs.get(name)
+            interval = scheduler.interval(name)
+            line = f"  {name:<16} {'každých %d s' % interval if interval > 0 else 'ručně':<16}"
+            if run and run["last_end"]:
+                line += (f" {datetime.datetime.fromtimestamp(run['last_end']):%Y-%m-%d %H:%M:%S}"
+                         f" {run['last_status']} ({run['duration']:.2f} s, běhů {run['runs']})"
+                         + (f" – {run['last_result']}" if run["last_result"] else ""))
+            click.echo(line)
+
 # --- Hlavní stránka a zakázky ---
 @app.route("/")
 @login_required
+@conditional("jobs", "customers", "invoices")
 def index():
     """Hlavní dashboard s přehledem."""
     conn = get_db_connection()
-    jobs_count = conn.execute("SELECT COUNT(id) FROM jobs WHERE status NOT IN ('Dokončená', 'Fakturovaná')").fetchone()[0]
-    customers_count = conn.execute("SELECT COUNT(id) FROM customers").fetchone()[0]
-    unpaid_invoices_count = conn.execute("SELECT COUNT(id) FROM invoices WHERE payment_status = 'Nezaplaceno'").fetchone()[0]
+    counters = dict(conn.execute("SELECT name, value FROM stats_counters").fetchall())
+    jobs_count = counters.get("open_jobs", 0)
+    customers_count = counters.get("customers", 0)
+    unpaid_invoices_count = counters.get("unpaid_invoices", 0)
     
-    jobs = conn.execute("""
-        SELECT jobs.*, customers.name AS customer_name
-        FROM jobs
-        LEFT JOIN customers ON jobs.customer_id = customers.id
-        ORDER BY due_date ASC
-        LIMIT 5
-    """).fetchall()
+    jobs = conn.execute(DASHBOARD_NEXT_JOBS_SQL).fetchall()
 
-    today = datetime.date.today()
-    in_ten_days = today + datetime.timedelta(days=10)
-
-    upcoming_jobs = conn.execute("""
-        SELECT jobs.*, customers.name AS customer_name
-        FROM jobs
-        LEFT JOIN customers ON jobs.customer_id = customers.id
-        WHERE date(jobs.due_date) BETWEEN date(?) AND date(?) AND jobs.status NOT IN ('Dokončená', 'Fakturovaná')
-        ORDER BY due_date ASC
-    """, (today.isoformat(), in_ten_days.isoformat(),)).fetchall()
+    # Příznaky termínů udržují triggery a plánovač úloh
+    upcoming_jobs = conn.execute(DASHBOARD_UPCOMING_SQL).fetchall()
+    overdue = conn.execute(DASHBOARD_OVERDUE_SQL).fetchone()
 
     monthly_jobs = conn.execute("""
-        SELECT strftime('%Y-%m', due_date) AS month, COUNT(id) AS count
-        FROM jobs
-        GROUP BY month
+        SELECT NULLIF(month, '') AS month, count
+        FROM stats_monthly_jobs
         ORDER BY month DESC
     """).fetchall()
 
     monthly_revenue = conn.execute("""
-        SELECT strftime('%Y-%m', invoice_date) AS month, SUM(total_paid) AS total
-        FROM jobs
-        WHERE payment_status = 'Uhrazeno' AND total_paid IS NOT NULL
-        GROUP BY month
+        SELECT NULLIF(month, '') AS month, total
+        FROM stats_monthly_revenue
         ORDER BY month DESC
     """).fetchall()
     
-    conn.close()
-    return render_template("index.html", jobs_count=jobs_count, customers_count=customers_count, unpaid_invoices_count=unpaid_invoices_count, jobs=jobs, upcoming_jobs=upcoming_jobs, monthly_jobs=monthly_jobs, monthly_revenue=monthly_revenue)
+    return render_template("index.html", jobs_count=jobs_count, customers_count=customers_count, unpaid_invoices_count=unpaid_invoices_count, jobs=jobs, upcoming_jobs=upcoming_jobs, overdue_jobs_count=overdue["jobs"], overdue_invoices_count=overdue["invoices"], monthly_jobs=monthly_jobs, monthly_revenue=monthly_revenue)
 
 @app.route("/jobs")
 @login_required
+@conditional("jobs", "customers", "hours_spent", "additional_services")
 def job_list():
     """Zobrazí seznam všech zakázek."""
     conn = get_db_connection()
-    jobs = conn.execute("""
-        SELECT jobs.*, customers.name AS customer_name
-        FROM jobs
-        LEFT JOIN customers ON jobs.customer_id = customers.id
-        ORDER BY due_date ASC
-    """).fetchall()
-    conn.close()
-    return render_template("job_list.html", jobs=jobs)
+    where, params = job_filters()
+    # Bez filtru se celkový počet čte z udržované statistiky
+    count_sql = None if where else "SELECT COALESCE(SUM(count), 0) FROM stats_monthly_jobs"
+    page = fetch_page(conn, JOB_LIST_SQL, sort_spec(JOB_SORTS, "due_date"), where, params, count_sql=count_sql)
+    return render_template("job_list.html", jobs=page["rows"], page=page)
+
+def insert_job(conn, job, new_customer=None):
+    """Vloží zakázku, s new_customer i nového zákazníka (volá se přes run_write).
+
+    job i new_customer jsou slovníky sloupců; id nově vloženého zákazníka
+    se do zakázky doplní jako customer_id.
+    """
+    if new_customer is not None:
+        job["customer_id"] = conn.execute("""
+            INSERT INTO customers (name, company, address, phone, email)
+            VALUES (:name, :company, :address, :phone, :email)
+        """, new_customer).lastrowid
+    conn.execute("""
+        INSERT INTO jobs (job_number, job_name, description, customer_id, status, due_date, price, hourly_rate)
+        VALUES (:job_number, :job_name, :description, :customer_id, :status, :due_date, :price, :hourly_rate)
+    """, job)
 
 @app.route("/jobs/add", methods=["GET", "POST"])
 @login_required
 def add_job():
     """Formulář pro přidání nové zakázky."""
     if request.method == "POST":
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
         customer_id = None
+        new_customer = None
         customer_choice = request.form.get("customer_choice")
 
         # Zjistí, zda se vytváří nový zákazník, nebo se používá existující
         if customer_choice == 'new':
             new_customer_name = request.form.get("new_customer_name")
             if not new_customer_name:
-                conn.close()
                 return "Jméno nového zákazníka je povinné.", 400
 
-            new_company = request.form.get("new_customer_company")
-            new_address = request.form.get("new_customer_address")
-            new_phone = request.form.get("new_customer_phone")
-            new_email = request.form.get("new_customer_email")
-
-            cursor.execute("""
-                INSERT INTO customers (name, company, address, phone, email)
-                VALUES (?, ?, ?, ?, ?)
-            """, (new_customer_name, new_company, new_address, new_phone, new_email))
-            customer_id = cursor.lastrowid
+            new_customer = {
+                "name": new_customer_name,
+                "company": request.form.get("new_customer_company"),
+                "address": request.form.get("new_customer_address"),
+                "phone": request.form.get("new_customer_phone"),
+                "email": request.form.get("new_customer_email"),
+            }
         
         elif customer_choice == 'existing':
             customer_id = request.form.get("customer_id")
             if not customer_id:
-                conn.close()
                 return "Musíte vybrat existujícího zákazníka, nebo nemáte žádné zákazníky založené.", 400
         
         else:
             # Tento stav by neměl nastat, pokud formulář funguje správně
-            conn.close()
             return "Chybný výběr zákazníka.", 400
 
 
-        # Následně vloží zakázku s určeným customer_id
-        job_number = request.form["job_number"]
-        job_name = request.form["job_name"]
-        description = request.form["description"]
-        status = request.form["status"]
-        due_date = request.form["due_date"]
-        price = request.form.get("price")
-        hourly_rate = request.form.get("hourly_rate")
+        # Následně vloží zakázku s určeným customer_id (nového zákazníka ve stejné transakci)
+        try:
+            due_date = normalize_date(request.form["due_date"])
+        except ValueError as e:
+            return str(e), 400
+        job = {
+            "job_number": request.form["job_number"],
+            "job_name": request.form["job_name"],
+            "description": request.form["description"],
+            "customer_id": customer_id,
+            "status": request.form["status"],
+            "due_date": due_date,
+            "price": request.form.get("price"),
+            "hourly_rate": request.form.get("hourly_rate"),
+        }
         
         try:
-            cursor.execute("""
-                INSERT INTO jobs (job_number, job_name, description, customer_id, status, due_date, price, hourly_rate)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, (job_number, job_name, description, customer_id, status, due_date, price, hourly_rate))
-            conn.commit()
+            run_write(insert_job, job, new_customer)
             return redirect(url_for("job_list"))
         except sqlite3.IntegrityError as e:
-            conn.rollback()
             return f"Zakázka s tímto číslem již existuje. Chyba: {e}", 400
-        finally:
-            conn.close()
     
     # Pro GET požadavek
-    conn = get_db_connection()
-    customers = conn.execute("SELECT id, name FROM customers ORDER BY name").fetchall()
-    conn.close()
-    return render_template("job_form.html", customers=customers, job=None)
+    customers = lookup_cache.get(get_db_connection(), "customers")
+    return render_template("job_form.html", customer_count=len(customers), job=None)
 
 @app.route("/jobs/<int:job_id>")
 @login_required
+@conditional("jobs", "customers", "tasks", "workers", "hours_spent", "additional_services")
 def job_detail(job_id):
-    """Zobrazí detail konkrétní zakázky."""
-    conn = get_db_connection()
-    job = conn.execute("""
-        SELECT jobs.*, customers.name AS customer_name, customers.company, customers.phone, customers.email, customers.address
-        FROM jobs
-        LEFT JOIN customers ON jobs.customer_id = customers.id
-        WHERE jobs.id = ?
-    """, (job_id,)).fetchone()
-    tasks = conn.execute("SELECT * FROM tasks WHERE job_id = ? ORDER BY due_date", (job_id,)).fetchall()
-    workers = conn.execute("SELECT * FROM workers ORDER BY name").fetchall()
-    hours = conn.execute("""
-        SELECT hours_spent.*, workers.name AS worker_name
-        FROM hours_spent
-        LEFT JOIN workers ON hours_spent.worker_id = workers.id
-        WHERE hours_spent.job_id = ?
-        ORDER BY date_spent DESC
-    """, (job_id,)).fetchall()
-
-    total_hours = sum(h['hours'] for h in hours)
-    additional_services = conn.execute("SELECT * FROM additional_services WHERE job_id = ?", (job_id,)).fetchall()
-    
-    conn.close()
+    """Zobrazí detail konkrétní zakázky."""
+    conn = get_db_connection()
+    job = conn.execute(JOB_DETAIL_SQL, (job_id,)).fetchone()
     if job is None:
         return "Zakázka nenalezena.", 404
-    return render_template("job_detail.html", job=job, tasks=tasks, workers=workers, hours=hours, total_hours=total_hours, additional_services=additional_services)
+    # Součty hodin a služeb jsou v job_totals, sekce se načtou jen první stránkou
+    sections = {name: fetch_job_section(conn, job_id, name, {}) for name in JOB_SECTIONS}
+    workers = lookup_cache.get(conn, "workers").items()
+    return render_template("job_detail.html", job=job, sections=sections, workers=workers)
+
+def fetch_job_section(conn, job_id, name, args=None):
+    """Stránka sekce detailu zakázky (tasks, hours, services) od kurzoru v args."""
+    section = JOB_SECTIONS[name]
+    args = dict((request.args if args is None else args).items())
+    args.setdefault("dir", section.direction)
+    args.setdefault("size", JOB_SECTION_SIZE)
+    return fetch_page(conn, section.select_sql, section.sort, [section.where], [job_id], args=args, count=False)
+
+@app.route("/jobs/<int:job_id>/sections/<section>")
+@login_required
+@conditional("tasks", "workers", "hours_spent", "additional_services")
+def job_section(job_id, section):
+    """Další stránka sekce detailu zakázky jako HTML fragment, s format=json jako JSON."""
+    if section not in JOB_SECTIONS:
+        abort(404)
+    page = fetch_job_section(get_db_connection(), job_id, section)
+    if request.args.get("format") == "json":
+        return jsonify({"rows": [dict(row) for row in page["rows"]], "next": page["next"]})
+    return render_template("_job_section.html", section=section, page=page, job_id=job_id)
 
 
 @app.route("/jobs/<int:job_id>/edit", methods=["GET", "POST"])
@@ -341,57 +2759,54 @@ def edit_job(job_id):
     """Formulář pro úpravu zakázky."""
     conn = get_db_connection()
     job = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
-    customers = conn.execute("SELECT id, name FROM customers ORDER BY name").fetchall()
     
     if job is None:
-        conn.close()
         return "Zakázka nenalezena.", 404
         
     if request.method == "POST":
         job_number = request.form["job_number"]
         job_name = request.form["job_name"]
         description = request.form["description"]
-        customer_id = request.form["customer_id"]
+        customer_id = request.form.get("customer_id")
+        if not customer_id:
+            return "Musíte vybrat zákazníka.", 400
         status = request.form["status"]
-        due_date = request.form["due_date"]
         price = request.form.get("price")
         hourly_rate = request.form.get("hourly_rate")
+        try:
+            due_date = normalize_date(request.form["due_date"])
+        except ValueError as e:
+            return str(e), 400
         
-        conn.execute("""
+        run_write(lambda conn: conn.execute("""
             UPDATE jobs
             SET job_number = ?, job_name = ?, description = ?, customer_id = ?, status = ?, due_date = ?, price = ?, hourly_rate = ?
             WHERE id = ?
-        """, (job_number, job_name, description, customer_id, status, due_date, price, hourly_rate, job_id))
-        conn.commit()
-        conn.close()
+        """, (job_number, job_name, description, customer_id, status, due_date, price, hourly_rate, job_id)))
         return redirect(url_for("job_detail", job_id=job_id))
         
-    conn.close()
-    return render_template("job_form.html", job=job, customers=customers)
+    customers = lookup_cache.get(conn, "customers")
+    return render_template("job_form.html", job=job, customer_count=len(customers),
+                           customer_name=customers.name(job["customer_id"]))
     
 @app.route("/jobs/<int:job_id>/delete", methods=["POST"])
 @login_required
 def delete_job(job_id):
-    """Smaže zakázku a všechna související data."""
-    conn = get_db_connection()
-    conn.execute("DELETE FROM tasks WHERE job_id = ?", (job_id,))
-    conn.execute("DELETE FROM hours_spent WHERE job_id = ?", (job_id,))
-    conn.execute("DELETE FROM additional_services WHERE job_id = ?", (job_id,))
-    conn.execute("DELETE FROM invoices WHERE job_id = ?", (job_id,))
-    conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
-    conn.commit()
-    conn.close()
+    """Smaže zakázku a všechna související data (kaskádou přes cizí klíče)."""
+    run_write(lambda conn: conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,)))
     return redirect(url_for("job_list"))
 
 # --- Zákazníci ---
 @app.route("/customers")
 @login_required
+@conditional("customers")
 def customer_list():
     """Zobrazí seznam všech zákazníků."""
     conn = get_db_connection()
-    customers = conn.execute("SELECT * FROM customers ORDER BY name").fetchall()
-    conn.close()
-    return render_template("customer_list.html", customers=customers)
+    where, params = name_filter("name")
+    count_sql = None if where else "SELECT value FROM stats_counters WHERE name = 'customers'"
+    page = fetch_page(conn, "SELECT * FROM customers", CUSTOMER_SORT, where, params, count_sql=count_sql)
+    return render_template("customer_list.html", customers=page["rows"], page=page)
 
 @app.route("/customers/add", methods=["GET", "POST"])
 @login_required
@@ -404,13 +2819,10 @@ def add_customer():
         phone = request.form["phone"]
         email = request.form["email"]
         
-        conn = get_db_connection()
-        conn.execute("""
+        run_write(lambda conn: conn.execute("""
             INSERT INTO customers (name, company, address, phone, email)
             VALUES (?, ?, ?, ?, ?)
-        """, (name, company, address, phone, email))
-        conn.commit()
-        conn.close()
+        """, (name, company, address, phone, email)))
         return redirect(url_for("customer_list"))
         
     return render_template("customer_form.html")
@@ -418,39 +2830,25 @@ def add_customer():
 @app.route("/customers/<int:customer_id>/delete", methods=["POST"])
 @login_required
 def delete_customer(customer_id):
-    """Smaže zákazníka a všechny jeho související zakázky a data."""
-    conn = get_db_connection()
-    
-    jobs = conn.execute("SELECT id FROM jobs WHERE customer_id = ?", (customer_id,)).fetchall()
-    
-    for job in jobs:
-        job_id = job['id']
-        conn.execute("DELETE FROM tasks WHERE job_id = ?", (job_id,))
-        conn.execute("DELETE FROM hours_spent WHERE job_id = ?", (job_id,))
-        conn.execute("DELETE FROM additional_services WHERE job_id = ?", (job_id,))
-        conn.execute("DELETE FROM invoices WHERE job_id = ?", (job_id,))
-    
-    conn.execute("DELETE FROM jobs WHERE customer_id = ?", (customer_id,))
-    conn.execute("DELETE FROM customers WHERE id = ?", (customer_id,))
-    
-    conn.commit()
-    conn.close()
+    """Smaže zákazníka a všechny jeho související zakázky a data (kaskádou přes cizí klíče)."""
+    run_write(lambda conn: conn.execute("DELETE FROM customers WHERE id = ?", (customer_id,)))
     
     return redirect(url_for("customer_list"))
     
 @app.route("/customers/<int:customer_id>/history")
 @login_required
+@conditional("customers", "jobs", "hours_spent", "additional_services")
 def customer_history(customer_id):
     """Zobrazí historii zakázek pro konkrétního zákazníka."""
     conn = get_db_connection()
     customer = conn.execute("SELECT * FROM customers WHERE id = ?", (customer_id,)).fetchone()
     
     if customer is None:
-        conn.close()
         return "Zákazník nenalezen.", 404
         
-    jobs = conn.execute("SELECT * FROM jobs WHERE customer_id = ? ORDER BY due_date DESC", (customer_id,)).fetchall()
-    conn.close()
+    archive = attach_archive(conn, archive_path(conn.path))
+    sql, params = archive_union(CUSTOMER_JOBS_PART, (customer_id,), archive, "due_date DESC")
+    jobs = conn.execute(sql, params).fetchall()
     
     return render_template("customer_history.html", customer=customer, jobs=jobs)
 
@@ -462,41 +2860,101 @@ def add_task():
     job_id = request.form["job_id"]
     task_name = request.form["task_name"]
     notes = request.form["notes"]
-    due_date = request.form["due_date"]
+    try:
+        due_date = normalize_date(request.form["due_date"])
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
     
-    conn = get_db_connection()
-    conn.execute("""
+    run_write(lambda conn: conn.execute("""
         INSERT INTO tasks (job_id, task_name, notes, due_date)
         VALUES (?, ?, ?, ?)
-    """, (job_id, task_name, notes, due_date))
-    conn.commit()
-    conn.close()
+    """, (job_id, task_name, notes, due_date)))
     return jsonify({"success": True})
 
 @app.route("/tasks/<int:task_id>/toggle", methods=["POST"])
 @login_required
 def toggle_task(task_id):
     """API pro přepnutí stavu úkolu."""
-    conn = get_db_connection()
-    task = conn.execute("SELECT is_completed FROM tasks WHERE id = ?", (task_id,)).fetchone()
+    task = run_write(lambda conn: conn.execute(
+        "UPDATE tasks SET is_completed = 1 - is_completed WHERE id = ? RETURNING is_completed", (task_id,)).fetchone())
     if task:
-        new_status = 1 if task["is_completed"] == 0 else 0
-        conn.execute("UPDATE tasks SET is_completed = ? WHERE id = ?", (new_status, task_id))
-        conn.commit()
-        conn.close()
-        return jsonify({"success": True, "new_status": new_status})
-    conn.close()
+        return jsonify({"success": True, "new_status": task["is_completed"]})
     return jsonify({"success": False}), 404
 
+def apply_task_operations(conn, job_id, operations):
+    """Provede dávku operací s úkoly zakázky (volá se přes run_write).
+
+    Operace jsou slovníky s klíčem op: add (task_name, notes, due_date),
+    toggle (id), complete (id, completed) a delete (id). Úkol musí patřit
+    k dané zakázce. Při první chybě vyhodí ValueError(číslo operace, text),
+    takže run_write celou dávku vrátí zpět.
+    """
+    for number, operation in enumerate(operations, start=1):
+        op = operation.get("op")
+        if op == "add":
+            # Hodnoty z JSONu mohou mít libovolný typ
+            for field in ("task_name", "notes", "due_date"):
+                if not isinstance(operation.get(field), (str, type(None))):
+                    raise ValueError(number, f"Pole {field} musí být text.")
+            task_name = (operation.get("task_name") or "").strip()
+            if not task_name:
+                raise ValueError(number, "Název úkolu je povinný.")
+            try:
+                due_date = normalize_date(operation.get("due_date"))
+            except ValueError as e:
+                raise ValueError(number, str(e))
+            conn.execute("INSERT INTO tasks (job_id, task_name, notes, due_date) VALUES (?, ?, ?, ?)",
+                         (job_id, task_name, (operation.get("notes") or "").strip() or None, due_date))
+            continue
+        if op == "toggle":
+            sql = "UPDATE tasks SET is_completed = 1 - is_completed WHERE id = ? AND job_id = ? RETURNING id"
+            params = (operation.get("id"), job_id)
+        elif op == "complete":
+            sql = "UPDATE tasks SET is_completed = ? WHERE id = ? AND job_id = ? RETURNING id"
+            params = (1 if operation.get("completed", True) else 0, operation.get("id"), job_id)
+        elif op == "delete":
+            sql = "DELETE FROM tasks WHERE id = ? AND job_id = ? RETURNING id"
+            params = (operation.get("id"), job_id)
+        else:
+            raise ValueError(number, f"Neznámá operace '{op}'.")
+        if type(operation.get("id")) is not int:
+            raise ValueError(number, "Id úkolu musí být celé číslo.")
+        if conn.execute(sql, params).fetchone() is None:
+            raise ValueError(number, f"Úkol {operation.get('id')} u zakázky neexistuje.")
+
+@app.route("/api/jobs/<int:job_id>/tasks", methods=["POST"])
+@login_required
+def task_batch(job_id):
+    """API pro dávku operací s úkoly ({"operations": [...]}); vrací první stránku úkolů."""
+    data = request.get_json(silent=True)
+    operations = data.get("operations") if isinstance(data, dict) else None
+    if not isinstance(operations, list) or not all(isinstance(op, dict) for op in operations):
+        return jsonify({"success": False, "errors": [{"operation": 0, "error": "Očekáván seznam operací."}]}), 400
+
+    conn = get_db_connection()
+    if conn.execute("SELECT 1 FROM jobs WHERE id = ?", (job_id,)).fetchone() is None:
+        return jsonify({"success": False, "errors": [{"operation": 0, "error": "Zakázka nenalezena."}]}), 404
+    errors = []
+    if operations:
+        try:
+            run_write(apply_task_operations, job_id, operations)
+        except ValueError as e:
+            errors = [{"operation": e.args[0], "error": e.args[1]}]
+    tasks = fetch_job_section(conn, job_id, "tasks", {})
+    return jsonify({"success": not errors, "errors": errors, "tasks": [dict(task) for task in tasks["rows"]],
+                    "next": tasks["next"]}), \
+        400 if errors else 200
+
 # --- Pracovníci ---
 @app.route("/workers")
 @login_required
+@conditional("workers")
 def worker_list():
     """Zobrazí seznam všech pracovníků."""
     conn = get_db_connection()
-    workers = conn.execute("SELECT * FROM workers ORDER BY name").fetchall()
-    conn.close()
-    return render_template("worker_list.html", workers=workers)
+    where, params = name_filter("name")
+    page = fetch_page(conn, "SELECT * FROM workers", (("name", "name"), ("id", "id")), where, params)
+    return render_template("worker_list.html", workers=page["rows"], page=page)
 
 @app.route("/workers/add", methods=["GET", "POST"])
 @login_required
@@ -507,50 +2965,37 @@ def add_worker():
         email = request.form["email"]
         phone = request.form["phone"]
         
-        conn = get_db_connection()
         try:
-            conn.execute("INSERT INTO workers (name, email, phone) VALUES (?, ?, ?)", (name, email, phone))
-            conn.commit()
+            run_write(lambda conn: conn.execute("INSERT INTO workers (name, email, phone) VALUES (?, ?, ?)",
+                                                (name, email, phone)))
             return redirect(url_for("worker_list"))
         except sqlite3.IntegrityError:
             return "Pracovník s tímto jménem již existuje.", 400
-        finally:
-            conn.close()
     
     return render_template("worker_form.html")
 
 @app.route("/workers/<int:worker_id>/delete", methods=["POST"])
 @login_required
 def delete_worker(worker_id):
-    """Smaže pracovníka."""
-    conn = get_db_connection()
-    conn.execute("UPDATE hours_spent SET worker_id = NULL WHERE worker_id = ?", (worker_id,))
-    conn.execute("DELETE FROM workers WHERE id = ?", (worker_id,))
-    conn.commit()
-    conn.close()
+    """Smaže pracovníka (jeho odpracované hodiny zůstanou bez pracovníka)."""
+    run_write(lambda conn: conn.execute("DELETE FROM workers WHERE id = ?", (worker_id,)))
     return redirect(url_for("worker_list"))
     
 @app.route("/workers/<int:worker_id>")
 @login_required
+@conditional("workers", "hours_spent", "jobs")
 def worker_detail(worker_id):
     """Zobrazí detail konkrétního pracovníka."""
     conn = get_db_connection()
     worker = conn.execute("SELECT * FROM workers WHERE id = ?", (worker_id,)).fetchone()
     
     if worker is None:
-        conn.close()
         return "Pracovník nenalezen.", 404
         
-    jobs = conn.execute("""
-        SELECT jobs.*, SUM(hours_spent.hours) AS total_hours
-        FROM hours_spent
-        LEFT JOIN jobs ON hours_spent.job_id = jobs.id
-        WHERE hours_spent.worker_id = ?
-        GROUP BY jobs.id
-        ORDER BY jobs.due_date DESC
-    """, (worker_id,)).fetchall()
+    archive = attach_archive(conn, archive_path(conn.path))
+    sql, params = archive_union(WORKER_JOBS_PART, (worker_id,), archive, "due_date DESC")
+    jobs = conn.execute(sql, params).fetchall()
     
-    conn.close()
     return render_template("worker_detail.html", worker=worker, jobs=jobs)
 
 # --- Odpracované hodiny ---
@@ -559,19 +3004,175 @@ def worker_detail(worker_id):
 def add_hours(job_id):
     """API pro přidání odpracovaných hodin k zakázce."""
     worker_id = request.form.get("worker_id")
-    date_spent = request.form["date_spent"]
     hours = request.form["hours"]
+    try:
+        date_spent = parse_date(request.form["date_spent"])
+    except ValueError as e:
+        return str(e), 400
     description = request.form.get("description")
     
-    conn = get_db_connection()
-    conn.execute("""
+    run_write(lambda conn: conn.execute("""
         INSERT INTO hours_spent (job_id, worker_id, date_spent, hours, description)
         VALUES (?, ?, ?, ?, ?)
-    """, (job_id, worker_id, date_spent, hours, description))
-    conn.commit()
-    conn.close()
+    """, (job_id, worker_id, date_spent, hours, description)))
     return redirect(url_for("job_detail", job_id=job_id))
 
+# Hromadný import výkazů: názvy sloupců (včetně českých variant) -> klíč
+TIMESHEET_COLUMNS = {
+    "worker": "worker", "pracovnik": "worker", "pracovník": "worker",
+    "job_number": "job_number", "job": "job_number", "zakazka": "job_number", "zakázka": "job_number",
+    "date_spent": "date_spent", "date": "date_spent", "datum": "date_spent",
+    "hours": "hours", "hodiny": "hours",
+    "description": "description", "popis": "description",
+}
+# Maximální počet parametrů v jednom IN (...) dotazu
+SQL_IN_CHUNK = 500
+
+def parse_date(value):
+    """Převede datum ve formátu RRRR-MM-DD nebo D.M.RRRR na ISO řetězec."""
+    value = (value or "").strip()
+    try:
+        if "." in value:
+            day, month, year = (int(part) for part in value.split("."))
+            return datetime.date(year, month, day).isoformat()
+        return datetime.date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise ValueError(f"Neplatné datum '{value}'.")
+
+def normalize_date(value):
+    """Jako parse_date, ale prázdná hodnota je None (nepovinné datum)."""
+    if not (value or "").strip():
+        return None
+    return parse_date(value)
+
+def load_job_ids(conn, keys, column="job_number"):
+    """Načte mapu hodnota sloupce (číslo zakázky nebo id) -> id jen pro zadané hodnoty."""
+    keys = list(keys)
+    job_ids = {}
+    for i in range(0, len(keys), SQL_IN_CHUNK):
+        chunk = keys[i:i + SQL_IN_CHUNK]
+        placeholders = ", ".join("?" * len(chunk))
+        job_ids.update(conn.execute(f"SELECT {column}, id FROM jobs WHERE {column} IN ({placeholders})", chunk).fetchall())
+    return job_ids
+
+def timesheet_text(row, field):
+    """Textová hodnota řádku výkazu; JSON může poslat libovolný typ."""
+    value = row.get(field)
+    if not isinstance(value, (str, type(None))):
+        raise ValueError(f"Pole {field} musí být text.")
+    return (value or "").strip()
+
+def timesheet_job_number(row):
+    """Číslo zakázky řádku; z JSONu se přijme i celé číslo."""
+    value = row.get("job_number")
+    if type(value) is int:
+        return str(value)
+    return timesheet_text(row, "job_number")
+
+def import_hours(conn, rows):
+    """Zvaliduje a vloží řádky výkazu do hours_spent (volá se přes run_write).
+
+    Řádky jsou slovníky s klíči worker, job_number (nebo job_id), date_spent,
+    hours, description. Pracovníci a zakázky se přeloží na id pomocí předem
+    načtených map. Pokud je některý řádek chybný, nevloží se nic. Vrací
+    dvojici (počet vložených řádků, seznam chyb {"row", "error"}).
+    """
+    worker_ids = dict(conn.execute("SELECT name, id FROM workers").fetchall())
+    job_numbers, ids = set(), set()
+    for row in rows:
+        if "job_id" in row:
+            if type(row["job_id"]) is int:
+                ids.add(row["job_id"])
+        elif isinstance(row.get("job_number"), (str, int)):
+            job_numbers.add(str(row["job_number"]).strip())
+    job_ids = load_job_ids(conn, job_numbers)
+    existing_ids = load_job_ids(conn, ids, column="id")
+
+    values, errors = [], []
+    for number, row in enumerate(rows, start=1):
+        try:
+            if "job_id" in row:
+                if type(row["job_id"]) is not int:
+                    raise ValueError("Pole job_id musí být celé číslo.")
+                if row["job_id"] not in existing_ids:
+                    raise ValueError(f"Zakázka s id {row['job_id']} neexistuje.")
+                job_id = row["job_id"]
+            else:
+                job_number = timesheet_job_number(row)
+                if job_number not in job_ids:
+                    raise ValueError(f"Zakázka '{job_number}' neexistuje.")
+                job_id = job_ids[job_number]
+            worker = timesheet_text(row, "worker")
+            if worker and worker not in worker_ids:
+                raise ValueError(f"Pracovník '{worker}' neexistuje.")
+            hours = row.get("hours")
+            if type(hours) in (int, float):
+                hours = float(hours)
+            elif isinstance(hours, (str, type(None))):
+                try:
+                    hours = float((hours or "").replace(",", "."))
+                except ValueError:
+                    raise ValueError(f"Neplatný počet hodin '{row.get('hours')}'.")
+            else:
+                raise ValueError("Pole hours musí být číslo.")
+            if not 0 < hours <= 24:
+                raise ValueError(f"Počet hodin musí být mezi 0 a 24, ne {hours}.")
+            date_spent = parse_date(timesheet_text(row, "date_spent"))
+            values.append((job_id, worker_ids.get(worker), date_spent, hours,
+                           timesheet_text(row, "description") or None))
+        except ValueError as e:
+            errors.append({"row": number, "error": str(e)})
+
+    if errors or not values:
+        return 0, errors
+    conn.executemany("""
+        INSERT INTO hours_spent (job_id, worker_id, date_spent, hours, description)
+        VALUES (?, ?, ?, ?, ?)
+    """, values)
+    return len(values), errors
+
+def read_timesheet_csv(stream):
+    """Načte CSV výkazu (oddělovač , ; nebo tab) do seznamu slovníků."""
+    text = stream.read().decode("utf-8-sig")
+    try:
+        dialect = csv.Sniffer().sniff(text[:4096], delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    rows = []
+    for row in csv.DictReader(io.StringIO(text), dialect=dialect):
+        rows.append({TIMESHEET_COLUMNS[k.strip().lower()]: v for k, v in row.items()
+                     if k and k.strip().lower() in TIMESHEET_COLUMNS})
+    return rows
+
+@app.route("/hours/import", methods=["GET", "POST"])
+@login_required
+def import_hours_csv():
+    """Formulář pro hromadný import výkazu hodin z CSV."""
+    if request.method == "POST":
+        upload = request.files.get("file")
+        if not upload or not upload.filename:
+            return render_template("hours_import.html", errors=[{"row": 0, "error": "Vyberte soubor CSV."}]), 400
+        try:
+            rows = read_timesheet_csv(upload.stream)
+        except UnicodeDecodeError:
+            return render_template("hours_import.html", errors=[{"row": 0, "error": "Soubor musí být v kódování UTF-8."}]), 400
+        inserted, errors = run_write(import_hours, rows)
+        return render_template("hours_import.html", inserted=inserted, errors=errors), 400 if errors else 200
+    return render_template("hours_import.html")
+
+@app.route("/api/hours/batch", methods=["POST"])
+@login_required
+def import_hours_batch():
+    """API pro hromadný import výkazu hodin z JSON (seznam řádků nebo {"rows": [...]})."""
+    data = request.get_json(silent=True)
+    rows = data.get("rows") if isinstance(data, dict) else data
+    if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+        return jsonify({"success": False, "errors": [{"row": 0, "error": "Očekáván seznam řádků."}]}), 400
+    inserted, errors = run_write(import_hours, rows)
+    if errors:
+        return jsonify({"success": False, "inserted": 0, "errors": errors}), 400
+    return jsonify({"success": True, "inserted": inserted, "errors": []})
+
 # --- Další služby ---
 @app.route("/jobs/<int:job_id>/services/add", methods=["POST"])
 @login_required
@@ -581,44 +3182,220 @@ def add_service(job_id):
     cost = request.form["cost"]
     notes = request.form.get("notes")
 
-    conn = get_db_connection()
-    conn.execute("""
+    run_write(lambda conn: conn.execute("""
         INSERT INTO additional_services (job_id, service_name, cost, notes)
         VALUES (?, ?, ?, ?)
-    """, (job_id, service_name, cost, notes))
-    conn.commit()
-    conn.close()
+    """, (job_id, service_name, cost, notes)))
     return redirect(url_for("job_detail", job_id=job_id))
 
 # --- Fakturace ---
 @app.route("/invoices")
 @login_required
+@conditional("invoices", "jobs", "customers")
 def invoice_list():
     """Zobrazí seznam všech vygenerovaných faktur."""
     conn = get_db_connection()
-    invoices = conn.execute("""
-        SELECT 
-            invoices.*, 
-            jobs.job_name, 
-            customers.name AS customer_name
-        FROM invoices
-        LEFT JOIN jobs ON invoices.job_id = jobs.id
-        LEFT JOIN customers ON jobs.customer_id = customers.id
-        ORDER BY invoices.invoice_date DESC
-    """).fetchall()
-    conn.close()
-    return render_template("invoice_list.html", invoices=invoices)
+    where, params = invoice_filters()
+    args = request.args.to_dict()
+    args.setdefault("dir", "desc")
+    page = fetch_page(conn, INVOICE_LIST_SQL, sort_spec(INVOICE_SORTS, "invoice_date"), where, params, args=args)
+    return render_template("invoice_list.html", invoices=page["rows"], page=page)
+
+# Číslované položky faktury pro jednotlivou i hromadnou fakturaci ({jobs}: job_id, job_name, price, hourly_rate, hours)
+INVOICE_LINES_TEMPLATE = """
+    WITH invoice_jobs AS MATERIALIZED ({jobs})
+    SELECT job_id, ROW_NUMBER() OVER (PARTITION BY job_id ORDER BY kind, item) AS position,
+           description, quantity, unit_price, amount
+    FROM (
+        SELECT job_id, 0 AS kind, 0 AS item, 'Pevná cena za zakázku "' || job_name || '"' AS description,
+               1.0 AS quantity, CAST(price AS REAL) AS unit_price, CAST(price AS REAL) AS amount
+        FROM invoice_jobs
+        WHERE price
+        UNION ALL
+        SELECT job_id, 1, 0, printf('Hodinová práce (%.2fh x %.2f Kč/h)', hours, hourly_rate),
+               CAST(hours AS REAL), CAST(hourly_rate AS REAL), CAST(hours AS REAL) * CAST(hourly_rate AS REAL)
+        FROM invoice_jobs
+        WHERE hourly_rate AND hours > 0
+        UNION ALL
+        SELECT services.job_id, 2, services.id, services.service_name, 1.0, CAST(services.cost AS REAL),
+               CAST(services.cost AS REAL)
+        FROM invoice_jobs
+        JOIN additional_services AS services ON services.job_id = invoice_jobs.job_id
+    )
+    ORDER BY job_id, position
+"""
+INVOICE_JOB_LINES_SQL = register_query("invoice_lines_for_job", INVOICE_LINES_TEMPLATE.format(jobs="""
+    SELECT jobs.id AS job_id, jobs.job_name, jobs.price, jobs.hourly_rate, COALESCE(job_totals.hours, 0) AS hours
+    FROM jobs
+    LEFT JOIN job_totals ON job_totals.job_id = jobs.id
+    WHERE jobs.id = ?
+"""), (1,), allow_temp_btree=True)
+
+def invoice_lines_for_job(conn, job_id):
+    """Spočítá položky faktury zakázky: pevná cena, hodinová práce a další služby.
+
+    Vrací seznam (popis, množství, jednotková cena, částka), nebo None,
+    pokud zakázka neexistuje.
+    """
+    lines = [tuple(line)[2:] for line in conn.execute(INVOICE_JOB_LINES_SQL, (job_id,))]
+    if not lines and conn.execute("SELECT 1 FROM jobs WHERE id = ?", (job_id,)).fetchone() is None:
+        return None
+    return lines
+
+# Snímek údajů odběratele a dodavatele pro faktury vybrané podmínkou {where}
+INVOICE_SNAPSHOT_INSERT_SQL = """
+    INSERT OR REPLACE INTO invoice_snapshots (
+        invoice_id, job_number, job_name,
+        customer_name, customer_company, customer_address, customer_phone, customer_email,
+        supplier_company_name, supplier_address, supplier_ico, supplier_dic,
+        supplier_bank_account, supplier_bank_code, supplier_variable_symbol)
+    SELECT invoices.id, jobs.job_number, jobs.job_name,
+           customers.name, customers.company, customers.address, customers.phone, customers.email,
+           supplier.company_name, supplier.address, supplier.ico, supplier.dic,
+           supplier.bank_account, supplier.bank_code, supplier.variable_symbol
+    FROM invoices
+    JOIN jobs ON jobs.id = invoices.job_id
+    LEFT JOIN customers ON jobs.customer_id = customers.id
+    LEFT JOIN (SELECT * FROM supplier_info LIMIT 1) AS supplier ON 1
+    WHERE {where}
+"""
+
+def store_invoice_snapshot(conn, invoice_id, lines):
+    """Uloží neměnný snímek faktury: položky, údaje odběratele a dodavatele."""
+    conn.execute(INVOICE_SNAPSHOT_INSERT_SQL.format(where="invoices.id = ?"), (invoice_id,))
+    conn.execute("DELETE FROM invoice_lines WHERE invoice_id = ?", (invoice_id,))
+    conn.executemany("""
+        INSERT INTO invoice_lines (invoice_id, position, description, quantity, unit_price, amount)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, [(invoice_id, position, *line) for position, line in enumerate(lines, start=1)])
+
+# Hromadná fakturace: všechny dokončené zakázky bez faktury najednou
+INVOICE_DUE_DAYS = 14
+# Zakázky se vyberou přes index stavu a čísla faktur se jim přidělí až potom
+BATCH_INVOICE_JOBS_SQL = register_query("batch_invoicing:jobs", """
+    WITH finished AS MATERIALIZED (
+        SELECT jobs.id AS job_id, jobs.job_number, jobs.job_name, jobs.price, jobs.hourly_rate,
+               COALESCE(job_totals.hours, 0) AS hours
+        FROM jobs
+        LEFT JOIN job_totals ON job_totals.job_id = jobs.id
+        WHERE jobs.status = 'Dokončená' AND NOT EXISTS (SELECT 1 FROM invoices WHERE invoices.job_id = jobs.id)
+    )
+    SELECT *, printf('%s%04d', ?, ? + ROW_NUMBER() OVER (ORDER BY job_id) - 1) AS invoice_number
+    FROM finished
+""", ("2025", 1), allow_temp_btree=True)
+BATCH_INVOICE_LINES_SQL = INVOICE_LINES_TEMPLATE.format(
+    jobs="SELECT job_id, job_name, price, hourly_rate, hours FROM temp.batch_invoice_jobs")
+BATCH_INVOICE_TOTALS_SQL = """
+    SELECT jobs.job_id, jobs.job_number, jobs.job_name, jobs.invoice_number,
+           COALESCE(SUM(lines.amount), 0) AS total_price
+    FROM temp.batch_invoice_jobs AS jobs
+    LEFT JOIN temp.batch_invoice_lines AS lines ON lines.job_id = jobs.job_id
+    GROUP BY jobs.job_id
+    ORDER BY jobs.job_id
+"""
+
+def next_invoice_sequence(conn, prefix):
+    """Vrátí další pořadové číslo pro čísla faktur ve tvaru <prefix><NNNN>."""
+    numbers = conn.execute("""
+        SELECT invoice_number FROM invoices
+        WHERE invoice_number >= ? AND invoice_number < ? AND length(invoice_number) = ?
+    """, (prefix + "0", prefix + ":", len(prefix) + 4)).fetchall()
+    suffixes = [int(n[0][len(prefix):]) for n in numbers if n[0][len(prefix):].isdigit()]
+    return max(suffixes, default=0) + 1
+
+def batch_invoices(conn, prefix, payment_type, dry_run=False):
+    """Vystaví faktury všem dokončeným zakázkám bez faktury (volá se přes run_write).
+
+    Zakázky s čísly faktur (postupně podle id zakázky) a jejich položky se
+    spočítají do dočasných tabulek stejným SQL jako u jednotlivé faktury,
+    faktury, snímky a položky se pak vloží množinově. Vrací seznam
+    vystavených (nebo při dry_run jen navrhovaných, bez zápisu) faktur.
+    """
+    today = datetime.date.today()
+    first = next_invoice_sequence(conn, prefix)
+    conn.execute("DROP TABLE IF EXISTS temp.batch_invoice_jobs")
+    conn.execute("DROP TABLE IF EXISTS temp.batch_invoice_lines")
+    try:
+        conn.execute("CREATE TEMP TABLE batch_invoice_jobs AS " + BATCH_INVOICE_JOBS_SQL, (prefix, first))
+        conn.execute("CREATE TEMP TABLE batch_invoice_lines AS " + BATCH_INVOICE_LINES_SQL)
+        if dry_run:
+            return [dict(row) for row in conn.execute(BATCH_INVOICE_TOTALS_SQL)]
+
+        conn.execute(f"""
+            INSERT INTO invoices (job_id, invoice_number, invoice_date, due_date, payment_type, total_price, payment_status)
+            SELECT job_id, invoice_number, ?, ?, ?, total_price, 'Nezaplaceno'
+            FROM ({BATCH_INVOICE_TOTALS_SQL})
+        """, (today.isoformat(), (today + datetime.timedelta(days=INVOICE_DUE_DAYS)).isoformat(), payment_type))
+        conn.execute(INVOICE_SNAPSHOT_INSERT_SQL.format(
+            where="invoices.job_id IN (SELECT job_id FROM temp.batch_invoice_jobs)"))
+        conn.execute("""
+            INSERT INTO invoice_lines (invoice_id, position, description, quantity, unit_price, amount)
+            SELECT invoices.id, lines.position, lines.description, lines.quantity, lines.unit_price, lines.amount
+            FROM temp.batch_invoice_lines AS lines
+            JOIN invoices ON invoices.job_id = lines.job_id
+        """)
+        conn.execute("UPDATE jobs SET status = 'Fakturovaná' WHERE id IN (SELECT job_id FROM temp.batch_invoice_jobs)")
+        return [dict(row) for row in conn.execute("""
+            SELECT invoices.id, invoices.invoice_number, invoices.total_price, b.job_id, b.job_number, b.job_name
+            FROM temp.batch_invoice_jobs AS b
+            JOIN invoices ON invoices.job_id = b.job_id
+            ORDER BY b.job_id
+        """)]
+    finally:
+        conn.execute("DROP TABLE IF EXISTS temp.batch_invoice_jobs")
+        conn.execute("DROP TABLE IF EXISTS temp.batch_invoice_lines")
+
+def run_batch_invoicing(conn, prefix, payment_type, dry_run=False):
+    """batch_invoices ve vlastní transakci na conn (příkazová řádka, seed)."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        invoices = batch_invoices(conn, prefix, payment_type, dry_run)
+        if not dry_run:
+            conn.commit()
+        return invoices
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+
+@app.route("/invoices/batch", methods=["GET", "POST"])
+@login_required
+def batch_invoicing():
+    """Hromadná fakturace dokončených zakázek (GET náhled, POST vystavení)."""
+    prefix = request.values.get("prefix") or str(datetime.date.today().year)
+    payment_type = request.values.get("payment_type") or "příkazem"
+    if request.method == "POST":
+        created = run_write(batch_invoices, prefix, payment_type)
+        return render_template("invoice_batch.html", created=created, prefix=prefix, payment_type=payment_type)
+    preview = batch_invoices(get_db_connection(), prefix, payment_type, dry_run=True)
+    return render_template("invoice_batch.html", preview=preview, prefix=prefix, payment_type=payment_type)
 
 @app.route("/invoices/<int:invoice_id>/delete", methods=["POST"])
 @login_required
 def delete_invoice(invoice_id):
     """Smaže fakturu."""
-    conn = get_db_connection()
-    conn.execute("DELETE FROM invoices WHERE id = ?", (invoice_id,))
-    conn.commit()
-    conn.close()
+    run_write(lambda conn: conn.execute("DELETE FROM invoices WHERE id = ?", (invoice_id,)))
     return redirect(url_for("invoice_list"))
 
+def issue_invoice(conn, job_id, invoice_number, payment_type):
+    """Vystaví fakturu zakázky i se snímkem položek (volá se přes run_write); vrací id faktury.
+
+    Pokud zakázka neexistuje (např. byla mezitím smazána), vyvolá LookupError.
+    """
+    lines = invoice_lines_for_job(conn, job_id)
+    if lines is None:
+        raise LookupError(f"Zakázka {job_id} neexistuje.")
+    total_price = sum(line[3] for line in lines)
+    invoice_date = datetime.date.today().isoformat()
+    due_date = (datetime.date.today() + datetime.timedelta(days=14)).isoformat()
+
+    invoice_id = conn.execute("""
+        INSERT INTO invoices (job_id, invoice_number, invoice_date, due_date, payment_type, total_price, payment_status)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, (job_id, invoice_number, invoice_date, due_date, payment_type, total_price, "Nezaplaceno")).lastrowid
+    store_invoice_snapshot(conn, invoice_id, lines)
+    conn.execute("UPDATE jobs SET status = 'Fakturovaná' WHERE id = ?", (job_id,))
+    return invoice_id
+
 @app.route("/jobs/<int:job_id>/create-invoice", methods=["POST"])
 @login_required
 def create_invoice(job_id):
@@ -627,105 +3404,323 @@ def create_invoice(job_id):
     
     job = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
     if job is None:
-        conn.close()
         return "Zakázka nenalezena.", 404
 
-    hours_data = conn.execute("SELECT SUM(hours) AS total_hours FROM hours_spent WHERE job_id = ?", (job_id,)).fetchone()
-    hours = hours_data['total_hours'] if hours_data['total_hours'] is not None else 0
-    
-    additional_services = conn.execute("SELECT * FROM additional_services WHERE job_id = ?", (job_id,)).fetchall()
-    
-    total_services_cost = sum(s['cost'] for s in additional_services)
-    total_price_hourly = float(hours) * float(job['hourly_rate']) if job['hourly_rate'] else 0
-    total_price_fixed = float(job['price']) if job['price'] else 0
-    total_price = total_price_hourly + total_price_fixed + total_services_cost
-    
     invoice_number = request.form["invoice_number"]
     payment_type = request.form["payment_type"]
-    invoice_date = datetime.date.today().isoformat()
-    due_date = (datetime.date.today() + datetime.timedelta(days=14)).isoformat()
 
     try:
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO invoices (job_id, invoice_number, invoice_date, due_date, payment_type, total_price, payment_status)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (job_id, invoice_number, invoice_date, due_date, payment_type, total_price, "Nezaplaceno"))
-        
-        conn.execute("UPDATE jobs SET status = 'Fakturovaná' WHERE id = ?", (job_id,))
-        conn.commit()
-        
-        invoice_id = cursor.lastrowid
-        conn.close()
+        invoice_id = run_write(issue_invoice, job_id, invoice_number, payment_type)
         return redirect(url_for('view_invoice', invoice_id=invoice_id))
+    except LookupError:
+        return "Zakázka nenalezena.", 404
     except sqlite3.IntegrityError:
-        conn.close()
         return "Faktura pro tuto zakázku již existuje.", 400
 
 
+# Vykreslené faktury podle verze snímku; GET faktury do databáze nezapisuje
+app.config.setdefault("INVOICE_CACHE_SIZE", 1024)
+invoice_cache = PageCache(app.config["INVOICE_CACHE_SIZE"])
+
 @app.route("/invoices/<int:invoice_id>/view")
 @login_required
 def view_invoice(invoice_id):
-    """Zobrazí náhled faktury."""
+    """Zobrazí náhled faktury.
+
+    Faktura se vykresluje ze snímku pořízeného při vystavení a výsledné
+    HTML se drží v invoice_cache; dokud se nezmění verze snímku (např.
+    úhradou), stačí jeden dotaz a vrácení hotového HTML.
+    """
     conn = get_db_connection()
-    invoice = conn.execute("SELECT * FROM invoices WHERE id = ?", (invoice_id,)).fetchone()
-    
-    if invoice is None:
-        conn.close()
+    version = conn.execute(INVOICE_VERSION_SQL, (invoice_id,)).fetchone()
+    if version is None:
         return "Faktura nenalezena.", 404
-    
-    job = conn.execute("""
-        SELECT jobs.*, customers.name AS customer_name, customers.company, customers.address, customers.phone, customers.email
-        FROM jobs
-        LEFT JOIN customers ON jobs.customer_id = customers.id
-        WHERE jobs.id = ?
-    """, (invoice['job_id'],)).fetchone()
+    key = (ETAG_SALT, database_path(), invoice_id, version["snapshot_version"])
+    html = invoice_cache.get(key)
+    if html is not None:
+        return html
 
-    hours_data = conn.execute("SELECT SUM(hours) AS total_hours FROM hours_spent WHERE job_id = ?", (job['id'],)).fetchone()
-    hours = hours_data['total_hours'] if hours_data['total_hours'] is not None else 0
-    
-    additional_services = conn.execute("SELECT * FROM additional_services WHERE job_id = ?", (job['id'],)).fetchall()
-    
-    supplier = conn.execute("SELECT * FROM supplier_info LIMIT 1").fetchone()
-    
-    conn.close()
-    if job is None:
-        return "Související zakázka nenalezena.", 404
-        
-    return render_template("invoice.html", job=job, hours=hours, invoice=invoice, additional_services=additional_services, supplier=supplier)
+    invoice = conn.execute(INVOICE_SNAPSHOT_SQL, (invoice_id,)).fetchone()
+    if invoice is None:
+        return "Snímek faktury nenalezen.", 404
+    lines = conn.execute(INVOICE_LINES_SQL, (invoice_id,)).fetchall()
+
+    html = render_template("invoice.html", invoice=invoice, lines=lines)
+    # Klíč podle verze právě přečteného snímku, mohla se mezitím změnit
+    invoice_cache.put(key[:3] + (invoice["snapshot_version"],), html)
+    return html
 
 
 @app.route("/invoices/<int:invoice_id>/set_paid", methods=["POST"])
 @login_required
 def set_invoice_paid(invoice_id):
     """Označí fakturu jako uhrazenou."""
-    conn = get_db_connection()
-    
-    invoice = conn.execute("SELECT job_id, total_price FROM invoices WHERE id = ?", (invoice_id,)).fetchone()
-    if not invoice:
-        conn.close()
+    if not run_write(mark_invoice_paid, invoice_id):
         return "Faktura nenalezena.", 404
-
-    job_id = invoice['job_id']
-    total_price = invoice['total_price']
-    
-    conn.execute("UPDATE invoices SET payment_status = 'Uhrazeno' WHERE id = ?", (invoice_id,))
-    conn.execute("UPDATE jobs SET payment_status = 'Uhrazeno', total_paid = ? WHERE id = ?", (total_price, job_id))
-    conn.commit()
-    conn.close()
     return redirect(url_for("invoice_list"))
 
+def mark_invoice_paid(conn, invoice_id):
+    """Zapíše úhradu faktury i zakázky (přes run_write); vrací False, pokud faktura neexistuje."""
+    # Změna stavu je na faktuře vidět, nová verze snímku zneplatní uložené HTML
+    invoice = conn.execute("""
+        UPDATE invoices SET payment_status = 'Uhrazeno', snapshot_version = snapshot_version + 1
+        WHERE id = ? RETURNING job_id, total_price
+    """, (invoice_id,)).fetchone()
+    if not invoice:
+        return False
+    conn.execute("UPDATE jobs SET payment_status = 'Uhrazeno', total_paid = ? WHERE id = ?",
+                 (invoice["total_price"], invoice["job_id"]))
+    return True
+
 @app.route("/jobs/<int:job_id>/status-done", methods=["POST"])
 @login_required
 def set_job_status_done(job_id):
     """Mění stav zakázky na 'Dokončená'."""
-    conn = get_db_connection()
-    conn.execute("UPDATE jobs SET status = 'Dokončená' WHERE id = ?", (job_id,))
-    conn.commit()
-    conn.close()
+    run_write(lambda conn: conn.execute("UPDATE jobs SET status = 'Dokončená' WHERE id = ?", (job_id,)))
     return redirect(url_for("job_detail", job_id=job_id))
 
+# --- Přehledy ---
+@app.route("/reports/profitability")
+@login_required
+@conditional("jobs", "customers", "hours_spent", "additional_services")
+def profitability_report():
+    """Přehled tržeb zakázek (hodiny, práce, služby, pevné ceny) po měsících, zákaznících nebo stavech."""
+    group = request.args.get("group", "month")
+    if group not in PROFITABILITY_GROUPS:
+        group = "month"
+    where, params = job_filters()
+    conn = get_db_connection()
+    archive = attach_archive(conn, archive_path(conn.path))
+    rows = conn.execute(profitability_sql(group, where, archive), params * (2 if archive else 1)).fetchall()
+    totals = {key: sum(row[key] or 0 for row in rows) for key in PROFITABILITY_SUMS}
+    return render_template("report_profitability.html", rows=rows, totals=totals, group=group, archive=archive)
+
+# --- Vyhledávání ---
+SEARCH_PAGE_SIZE = 20
+AUTOCOMPLETE_LIMIT = 10
+# Značky zvýraznění ve snippet(); text se nejprve escapuje, pak se nahradí <mark>
+_MARK_START, _MARK_END = "\x02", "\x03"
+
+# typ -> (FTS tabulka, nadpis, SELECT sloupců výsledku, JOIN zdrojové tabulky)
+SEARCH_SOURCES = {
+    "jobs": ("fts_jobs", "Zakázky",
+             "t.id, t.id AS job_id, t.job_number || ' – ' || t.job_name AS title",
+             "JOIN jobs t ON t.id = fts_jobs.rowid"),
+    "customers": ("fts_customers", "Zákazníci",
+                  "t.id, NULL AS job_id, t.name || COALESCE(' / ' || t.company, '') AS title",
+                  "JOIN customers t ON t.id = fts_customers.rowid"),
+    "tasks": ("fts_tasks", "Úkoly",
+              "t.id, t.job_id, t.task_name AS title",
+              "JOIN tasks t ON t.id = fts_tasks.rowid"),
+    "hours": ("fts_hours", "Odpracované hodiny",
+              "t.id, t.job_id, t.date_spent || ' (' || t.hours || ' h)' AS title",
+              "JOIN hours_spent t ON t.id = fts_hours.rowid"),
+}
+
+def fts_query(text):
+    """Převede uživatelský dotaz na FTS5 dotaz: každé slovo jako prefix, spojené AND."""
+    tokens = [t for t in re.split(r"\s+", text.strip()) if t]
+    return " ".join('"' + t.replace('"', '""') + '"*' for t in tokens)
+
+def highlight(snippet):
+    """Escapuje snippet a převede značky zvýraznění na <mark>."""
+    return Markup(str(escape(snippet or "")).replace(_MARK_START, "<mark>").replace(_MARK_END, "</mark>"))
+
+def search_source(conn, kind, match, limit, offset=0):
+    """Seřazené výsledky (bm25) jednoho typu a jejich celkový počet."""
+    fts_name, _, columns, join = SEARCH_SOURCES[kind]
+    rows = conn.execute(f"""
+        SELECT {columns}, snippet({fts_name}, -1, ?, ?, '…', 12) AS snippet
+        FROM {fts_name}
+        {join}
+        WHERE {fts_name} MATCH ?
+        ORDER BY rank
+        LIMIT ? OFFSET ?
+    """, (_MARK_START, _MARK_END, match, limit, offset)).fetchall()
+    total = conn.execute(f"SELECT COUNT(*) FROM {fts_name} WHERE {fts_name} MATCH ?", (match,)).fetchone()[0]
+    return rows, total
+
+@app.route("/search")
+@login_required
+def search():
+    """Fulltextové vyhledávání napříč zakázkami, zákazníky, úkoly a výkazy."""
+    text = request.args.get("q", "").strip()
+    kind = request.args.get("type")
+    if kind not in SEARCH_SOURCES:
+        kind = None
+    page = max(request.args.get("page", 1, type=int), 1)
+    match = fts_query(text)
+    results = {}
+    if match:
+        conn = get_db_connection()
+        # Bez zvoleného typu se ukáže první stránka od každého typu
+        for source in [kind] if kind else SEARCH_SOURCES:
+            offset = (page - 1) * SEARCH_PAGE_SIZE if kind else 0
+            rows, total = search_source(conn, source, match, SEARCH_PAGE_SIZE, offset)
+            results[source] = {
+                "title": SEARCH_SOURCES[source][1],
+                "total": total,
+                "rows": [dict(row, snippet=highlight(row["snippet"])) for row in rows],
+            }
+    if request.args.get("format") == "json":
+        return jsonify({source: {"total": r["total"], "rows": [dict(row, snippet=str(row["snippet"])) for row in r["rows"]]}
+                        for source, r in results.items()})
+    return render_template("search.html", q=text, kind=kind, page=page, results=results, page_size=SEARCH_PAGE_SIZE)
+
+@app.route("/api/autocomplete/<kind>")
+@login_required
+def autocomplete(kind):
+    """API pro našeptávání zakázek a zákazníků podle začátků slov."""
+    if kind not in ("jobs", "customers"):
+        abort(404)
+    match = fts_query(request.args.get("q", ""))
+    if not match:
+        return jsonify([])
+    rows, _ = search_source(get_db_connection(), kind, match, AUTOCOMPLETE_LIMIT)
+    return jsonify([{"id": row["id"], "label": row["title"]} for row in rows])
+
+@app.route("/api/lookup/<kind>")
+@login_required
+def lookup(kind):
+    """API pro našeptávání zákazníků a pracovníků podle začátku jména (z cache)."""
+    if kind not in LOOKUP_SOURCES:
+        abort(404)
+    limit = min(request.args.get("limit", AUTOCOMPLETE_LIMIT, type=int), 100)
+    return jsonify(lookup_cache.get(get_db_connection(), kind).prefix(request.args.get("q", ""), limit))
+
+# --- Export dat (streamuje se po dávkách přímo z kurzoru) ---
+EXPORT_BATCH_SIZE = 1000
+
+# dataset -> (SELECT bez WHERE, sloupec pro filtr data, sloupec pro filtr stavu, řadicí sloupec)
+EXPORTS = {
+    "jobs": ("""
+        SELECT jobs.id, jobs.job_number, jobs.job_name, jobs.description, jobs.status, jobs.due_date,
+               jobs.price, jobs.hourly_rate, jobs.deposit, jobs.total_paid, jobs.invoice_date, jobs.payment_status,
+               customers.id AS customer_id, customers.name AS customer_name, customers.company AS customer_company
+        FROM jobs
+        LEFT JOIN customers ON jobs.customer_id = customers.id
+    """, "jobs.due_date", "jobs.status", "jobs.id"),
+    "hours": ("""
+        SELECT hours_spent.id, hours_spent.job_id, jobs.job_number, hours_spent.date_spent, hours_spent.hours,
+               hours_spent.description, workers.id AS worker_id, workers.name AS worker_name
+        FROM hours_spent
+        LEFT JOIN workers ON hours_spent.worker_id = workers.id
+        LEFT JOIN jobs ON hours_spent.job_id = jobs.id
+    """, "hours_spent.date_spent", "jobs.status", "hours_spent.id"),
+    "services": ("""
+        SELECT additional_services.id, additional_services.job_id, jobs.job_number, additional_services.service_name,
+               additional_services.cost, additional_services.notes
+        FROM additional_services
+        LEFT JOIN jobs ON additional_services.job_id = jobs.id
+    """, "jobs.due_date", "jobs.status", "additional_services.id"),
+    "invoices": ("""
+        SELECT invoices.id, invoices.invoice_number, invoices.invoice_date, invoices.due_date, invoices.payment_type,
+               invoices.total_price, invoices.payment_status, invoices.job_id, jobs.job_number, jobs.job_name,
+               customers.id AS customer_id, customers.name AS customer_name, customers.company AS customer_company
+        FROM invoices
+        LEFT JOIN jobs ON invoices.job_id = jobs.id
+        LEFT JOIN customers ON jobs.customer_id = customers.id
+    """, "invoices.invoice_date", "invoices.payment_status", "invoices.id"),
+}
+EXPORT_FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+def export_query(dataset, date_from=None, date_to=None, status=None):
+    """Sestaví SQL a parametry exportu daného datasetu s filtry."""
+    select_sql, date_column, status_column, order_column = EXPORTS[dataset]
+    where, params = [], []
+    if date_from:
+        where.append(f"{date_column} >= ?")
+        params.append(date_from)
+    if date_to:
+        where.append(f"{date_column} <= ?")
+        params.append(date_to)
+    if status:
+        where.append(f"{status_column} = ?")
+        params.append(status)
+    sql = select_sql + (" WHERE " + " AND ".join(where) if where else "") + f" ORDER BY {order_column}"
+    return sql, params
+
+def generate_export(conn, dataset, fmt, **filters):
+    """Generátor částí exportu (CSV nebo NDJSON) čtených po dávkách fetchmany."""
+    sql, params = export_query(dataset, **filters)
+    cursor = conn.execute(sql, params)
+    columns = [c[0] for c in cursor.description]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == "csv" else None
+    if writer:
+        writer.writerow(columns)
+    while True:
+        batch = cursor.fetchmany(EXPORT_BATCH_SIZE)
+        if not batch:
+            break
+        for row in batch:
+            if writer:
+                writer.writerow(row)
+            else:
+                buffer.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False))
+                buffer.write("\n")
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+@app.route("/export/<dataset>.<fmt>")
+@login_required
+def export_data(dataset, fmt):
+    """Stáhne export datasetu (jobs, hours, services, invoices) jako CSV nebo NDJSON."""
+    if dataset not in EXPORTS or fmt not in EXPORT_FORMATS:
+        abort(404)
+    filters = {
+        "date_from": request.args.get("date_from"),
+        "date_to": request.args.get("date_to"),
+        "status": request.args.get("status"),
+    }
+
+    # Vlastní připojení z fondu, protože generátor běží až po návratu z routy;
+    # fond se vybere ještě během požadavku, kdy je známý tenant
+    pool = get_pool()
+
+    def stream():
+        conn = pool.acquire()
+        try:
+            yield from generate_export(conn, dataset, fmt, **filters)
+        finally:
+            pool.release(conn)
+
+    filename = f"{dataset}-{datetime.date.today().isoformat()}.{fmt}"
+    return Response(stream(), mimetype=EXPORT_FORMATS[fmt],
+                    headers={"Content-Disposition": f"attachment; filename={filename}"})
+
+@app.cli.command("export")
+@click.argument("dataset", type=click.Choice(sorted(EXPORTS)))
+@click.option("--format", "fmt", type=click.Choice(sorted(EXPORT_FORMATS)), default="csv")
+@click.option("--output", type=click.File("w", encoding="utf-8"), default="-", help="Výstupní soubor (výchozí stdout).")
+@click.option("--date-from", default=None)
+@click.option("--date-to", default=None)
+@click.option("--status", default=None)
+def export_command(dataset, fmt, output, date_from, date_to, status):
+    """Vyexportuje dataset do CSV nebo NDJSON."""
+    conn = open_db_connection(app.config["DATABASE"])
+    try:
+        for chunk in generate_export(conn, dataset, fmt, date_from=date_from, date_to=date_to, status=status):
+            output.write(chunk)
+    finally:
+        conn.close()
+
 # --- Nastavení ---
+def save_supplier_info(conn, values):
+    """Uloží údaje dodavatele, první uložení řádek založí (volá se přes run_write)."""
+    if conn.execute("SELECT 1 FROM supplier_info LIMIT 1").fetchone():
+        conn.execute("""
+            UPDATE supplier_info SET company_name = ?, address = ?, ico = ?, dic = ?, bank_account = ?, bank_code = ?, variable_symbol = ?
+        """, values)
+    else:
+        conn.execute("""
+            INSERT INTO supplier_info (company_name, address, ico, dic, bank_account, bank_code, variable_symbol)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, values)
+
 @app.route("/settings", methods=["GET", "POST"])
 @login_required
 def settings():
@@ -742,74 +3737,393 @@ def settings():
         bank_code = request.form["bank_code"]
         variable_symbol = request.form["variable_symbol"]
         
-        if supplier:
-            conn.execute("""
-                UPDATE supplier_info SET company_name = ?, address = ?, ico = ?, dic = ?, bank_account = ?, bank_code = ?, variable_symbol = ?
-            """, (company_name, address, ico, dic, bank_account, bank_code, variable_symbol))
-        else:
-            conn.execute("""
-                INSERT INTO supplier_info (company_name, address, ico, dic, bank_account, bank_code, variable_symbol)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (company_name, address, ico, dic, bank_account, bank_code, variable_symbol))
-        conn.commit()
-        conn.close()
+        run_write(save_supplier_info, (company_name, address, ico, dic, bank_account, bank_code, variable_symbol))
         return redirect(url_for("settings"))
         
-    conn.close()
     return render_template("settings.html", supplier=supplier)
 
 # --- Filtrované pohledy ---
 @app.route("/jobs/active")
 @login_required
+@conditional("jobs", "customers", "hours_spent", "additional_services")
 def active_jobs_list():
     """Zobrazí seznam aktivních zakázek."""
     conn = get_db_connection()
-    jobs = conn.execute("""
-        SELECT jobs.*, customers.name AS customer_name
-        FROM jobs
-        LEFT JOIN customers ON jobs.customer_id = customers.id
-        WHERE jobs.status NOT IN ('Dokončená', 'Fakturovaná')
-        ORDER BY due_date ASC
-    """).fetchall()
-    conn.close()
-    return render_template("job_list.html", jobs=jobs, title="Aktivní zakázky")
+    where, params = job_filters()
+    count_sql = None if where else "SELECT value FROM stats_counters WHERE name = 'open_jobs'"
+    where.append(OPEN_JOBS_WHERE)
+    page = fetch_page(conn, JOB_LIST_SQL, sort_spec(JOB_SORTS, "due_date"), where, params, count_sql=count_sql)
+    return render_template("job_list.html", jobs=page["rows"], page=page, title="Aktivní zakázky")
 
 @app.route("/jobs/upcoming")
 @login_required
+@conditional("jobs", "customers", "hours_spent", "additional_services")
 def upcoming_jobs_list():
     """Zobrazí seznam zakázek před termínem."""
     conn = get_db_connection()
-    today = datetime.date.today()
-    in_ten_days = today + datetime.timedelta(days=10)
-    jobs = conn.execute("""
-        SELECT jobs.*, customers.name AS customer_name
-        FROM jobs
-        LEFT JOIN customers ON jobs.customer_id = customers.id
-        WHERE date(jobs.due_date) BETWEEN date(?) AND date(?) AND jobs.status NOT IN ('Dokončená', 'Fakturovaná')
-        ORDER BY due_date ASC
-    """, (today.isoformat(), in_ten_days.isoformat(),)).fetchall()
-    conn.close()
-    return render_template("job_list.html", jobs=jobs, title="Zakázky před termínem")
+    where, params = job_filters()
+    where.append(UPCOMING_JOBS_WHERE)
+    page = fetch_page(conn, JOB_LIST_SQL, sort_spec(JOB_SORTS, "due_date"), where, params)
+    return render_template("job_list.html", jobs=page["rows"], page=page, title="Zakázky před termínem")
+
+@app.route("/jobs/overdue")
+@login_required
+@conditional("jobs", "customers", "hours_spent", "additional_services")
+def overdue_jobs_list():
+    """Zobrazí seznam neuzavřených zakázek po termínu."""
+    conn = get_db_connection()
+    where, params = job_filters()
+    where.append(OVERDUE_JOBS_WHERE)
+    page = fetch_page(conn, JOB_LIST_SQL, sort_spec(JOB_SORTS, "due_date"), where, params)
+    return render_template("job_list.html", jobs=page["rows"], page=page, title="Zakázky po termínu")
 
 @app.route("/invoices/unpaid")
 @login_required
+@conditional("invoices", "jobs", "customers")
 def unpaid_invoices_list():
     """Zobrazí seznam neuhrazených faktur."""
     conn = get_db_connection()
-    invoices = conn.execute("""
-        SELECT 
-            invoices.*, 
-            jobs.job_name, 
-            customers.name AS customer_name
-        FROM invoices
-        LEFT JOIN jobs ON invoices.job_id = jobs.id
-        LEFT JOIN customers ON jobs.customer_id = customers.id
-        WHERE invoices.payment_status = 'Nezaplaceno'
-        ORDER BY invoices.invoice_date DESC
-    """).fetchall()
-    conn.close()
-    return render_template("invoice_list.html", invoices=invoices, title="Neuhrazené faktury")
+    where, params = invoice_filters()
+    count_sql = None if where else "SELECT value FROM stats_counters WHERE name = 'unpaid_invoices'"
+    where.append(UNPAID_INVOICES_WHERE)
+    args = request.args.to_dict()
+    args.setdefault("dir", "desc")
+    page = fetch_page(conn, INVOICE_LIST_SQL, sort_spec(INVOICE_SORTS, "invoice_date"), where, params,
+                      count_sql=count_sql, args=args)
+    return render_template("invoice_list.html", invoices=page["rows"], page=page, title="Neuhrazené faktury")
+
+@app.route("/invoices/overdue")
+@login_required
+@conditional("invoices", "jobs", "customers")
+def overdue_invoices_list():
+    """Zobrazí seznam neuhrazených faktur po splatnosti."""
+    conn = get_db_connection()
+    where, params = invoice_filters()
+    where.append(OVERDUE_INVOICES_WHERE)
+    args = request.args.to_dict()
+    args.setdefault("dir", "desc")
+    page = fetch_page(conn, INVOICE_LIST_SQL, sort_spec(INVOICE_SORTS, "invoice_date"), where, params, args=args)
+    return render_template("invoice_list.html", invoices=page["rows"], page=page, title="Faktury po splatnosti")
+
+
+# --- Syntetická data (db-seed) a benchmark rout (bench, výsledky jako JSON) ---
+SEED_FIRST_NAMES = ["Jan", "Petr", "Pavel", "Tomáš", "Martin", "Jana", "Eva", "Hana", "Lucie", "Věra"]
+SEED_LAST_NAMES = ["Novák", "Svoboda", "Dvořák", "Černý", "Procházka", "Kučera", "Veselý", "Horák", "Němec", "Pokorný"]
+SEED_CITIES = ["Praha", "Brno", "Ostrava", "Plzeň", "Olomouc", "Liberec", "Zlín", "Jihlava"]
+SEED_WORDS = ["oprava", "montáž", "revize", "elektro", "střecha", "fasáda", "koupelna", "podlaha", "okna", "topení"]
+# Triggery souhrnných tabulek, které se při hromadném vkládání přepočítají najednou
+SEED_ROLLUP_TRIGGERS = ("trg_stats_*", "trg_totals_*")
+
+def seed_database(conn, customers, workers, jobs, tasks, hours, services, invoiced, seed):
+    """Vloží syntetická data a vrátí počty vložených řádků podle tabulek.
+
+    Nové řádky navazují na nejvyšší existující id. Souhrnné triggery
+    (SEED_ROLLUP_TRIGGERS) se po dobu hromadného vkládání odstraní a ve stejné
+    transakci se obnoví a souhrny přepočítají najednou; ostatní triggery
+    (fulltext, verze tabulek) běží dál. Faktury se pak vystaví přes
+    run_batch_invoicing a jejich data a stavy se rozprostřou do minulosti
+    i budoucnosti.
+    """
+    rng = random.Random(seed)
+    today = datetime.date.today()
+
+    def day(offset):
+        return (today + datetime.timedelta(days=offset)).isoformat()
+
+    def words(count):
+        return " ".join(rng.choice(SEED_WORDS) for _ in range(count))
+
+    first = {table: conn.execute(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {table}").fetchone()[0]
+             for table in ("customers", "workers", "jobs")}
+    customer_ids = range(first["customers"], first["customers"] + customers)
+    worker_ids = range(first["workers"], first["workers"] + workers)
+    job_ids = range(first["jobs"], first["jobs"] + jobs)
+    if jobs and not customer_ids and not conn.execute("SELECT 1 FROM customers").fetchone():
+        raise click.UsageError("Zakázky potřebují alespoň jednoho zákazníka.")
+    customer_pool = customer_ids or [row[0] for row in conn.execute("SELECT id FROM customers")]
+    worker_pool = worker_ids or [row[0] for row in conn.execute("SELECT id FROM workers")] or [None]
+
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        rollups = [row for pattern in SEED_ROLLUP_TRIGGERS for row in conn.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND name GLOB ?", (pattern,))]
+        for name, _ in rollups:
+            conn.execute(f"DROP TRIGGER {name}")
+
+        conn.executemany("INSERT INTO customers (id, name, company, address, phone, email) VALUES (?, ?, ?, ?, ?, ?)", (
+            (i, f"{rng.choice(SEED_FIRST_NAMES)} {rng.choice(SEED_LAST_NAMES)}",
+             f"{rng.choice(SEED_LAST_NAMES)} s.r.o." if rng.random() < 0.3 else None,
+             f"{rng.choice(SEED_CITIES)} {rng.randint(1, 999)}", f"+420 {rng.randint(600000000, 799999999)}",
+             f"zakaznik{i}@example.cz") for i in customer_ids))
+        conn.executemany("INSERT INTO workers (id, name, email, phone) VALUES (?, ?, ?, ?)", (
+            (i, f"Pracovník {i}", f"pracovnik{i}@example.cz", f"+420 {rng.randint(600000000, 799999999)}")
+            for i in worker_ids))
+
+        # Dokončené zakázky určené k fakturaci dostanou stav 'Dokončená' hned,
+        # ostatní dokončené až po hromadné fakturaci
+        done_later = []
+        def job_rows():
+            for i in job_ids:
+                roll = rng.random()
+                if roll < invoiced:
+                    status = "Dokončená"
+                elif roll < invoiced + 0.1:
+                    status = "Rozpracovaná"
+                    done_later.append((i,))
+                else:
+                    status = rng.choice(["Nová", "Rozpracovaná"])
+                fixed = rng.random() < 0.5
+                yield (i, f"S{i:07d}", words(2).capitalize(), words(8), rng.choice(customer_pool), status,
+                       day(rng.randint(-730, 120)), round(rng.uniform(1000, 200000), 2) if fixed else None,
+                       None if fixed else rng.choice([350.0, 450.0, 550.0, 650.0]))
+        conn.executemany("""
+            INSERT INTO jobs (id, job_number, job_name, description, customer_id, status, due_date, price, hourly_rate)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, job_rows())
+
+        if job_ids:
+            conn.executemany("INSERT INTO tasks (job_id, task_name, notes, due_date, is_completed) VALUES (?, ?, ?, ?, ?)", (
+                (rng.choice(job_ids), words(3).capitalize(), words(4) if rng.random() < 0.3 else None,
+                 day(rng.randint(-730, 120)), int(rng.random() < 0.5)) for _ in range(tasks)))
+            conn.executemany("INSERT INTO hours_spent (job_id, worker_id, date_spent, hours, description) VALUES (?, ?, ?, ?, ?)", (
+                (rng.choice(job_ids), rng.choice(worker_pool), day(rng.randint(-730, 0)),
+                 rng.choice([0.5, 1.0, 2.0, 4.0, 6.0, 8.0]), words(3) if rng.random() < 0.5 else None)
+                for _ in range(hours)))
+            conn.executemany("INSERT INTO additional_services (job_id, service_name, cost, notes) VALUES (?, ?, ?, ?)", (
+                (rng.choice(job_ids), words(2).capitalize(), round(rng.uniform(100, 20000), 2), None)
+                for _ in range(services)))
+        conn.execute("""
+            INSERT INTO supplier_info (company_name, address, ico, dic, bank_account, bank_code, variable_symbol)
+            SELECT 'Dodavatel s.r.o.', 'Praha 1', '12345678', 'CZ12345678', '123456789', '0100', '2025'
+            WHERE NOT EXISTS (SELECT 1 FROM supplier_info)
+        """)
+
+        for _, sql in rollups:
+            conn.execute(sql)
+        cursor = conn.cursor()
+        rebuild_dashboard_stats(cursor)
+        rebuild_job_totals(cursor)
+        conn.commit()
+
+        issued = run_batch_invoicing(conn, f"S{seed}-", "příkazem") if invoiced else []
+        conn.execute("BEGIN IMMEDIATE")
+        # Faktura je vystavena k termínu zakázky; starší faktury jsou většinou
+        # uhrazené, novější zčásti po splatnosti a zčásti ještě ve lhůtě
+        conn.execute("""
+            UPDATE invoices SET
+                invoice_date = (SELECT due_date FROM jobs WHERE jobs.id = invoices.job_id),
+                due_date = date((SELECT due_date FROM jobs WHERE jobs.id = invoices.job_id), ?),
+                payment_status = CASE WHEN (id * 2654435761) % 100 < 60 THEN 'Uhrazeno' ELSE 'Nezaplaceno' END
+            WHERE invoice_number LIKE ?
+        """, (f"+{INVOICE_DUE_DAYS} days", f"S{seed}-%"))
+        conn.execute("""
+            UPDATE jobs SET
+                is_invoiced = 1,
+                invoice_date = invoices.invoice_date,
+                payment_status = invoices.payment_status,
+                total_paid = CASE WHEN invoices.payment_status = 'Uhrazeno' THEN invoices.total_price END
+            FROM invoices
+            WHERE invoices.job_id = jobs.id AND invoices.invoice_number LIKE ?
+        """, (f"S{seed}-%",))
+        conn.executemany("UPDATE jobs SET status = 'Dokončená' WHERE id = ?", done_later)
+        conn.commit()
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+        conn.execute(f"PRAGMA synchronous = {app.config['DB_PRAGMAS']['synchronous']}")
+    conn.execute("ANALYZE")
+    return {"customers": customers, "workers": workers, "jobs": jobs, "tasks": tasks if jobs else 0,
+            "hours_spent": hours if jobs else 0, "additional_services": services if jobs else 0,
+            "invoices": len(issued)}
+
+@app.cli.command("db-seed")
+@click.option("--customers", default=1000, show_default=True)
+@click.option("--workers", default=50, show_default=True)
+@click.option("--jobs", default=10000, show_default=True)
+@click.option("--tasks", default=30000, show_default=True)
+@click.option("--hours", default=100000, show_default=True)
+@click.option("--services", default=10000, show_default=True)
+@click.option("--invoiced", default=0.4, show_default=True, help="Podíl zakázek, které dostanou fakturu.")
+@click.option("--seed", default=1, show_default=True, help="Semínko generátoru (stejné = stejná data).")
+@click.option("--force", is_flag=True, help="Přidat data i do databáze, která už nějaká obsahuje.")
+def db_seed_command(customers, workers, jobs, tasks, hours, services, invoiced, seed, force):
+    """Naplní databázi syntetickými daty (pro měření výkonu, ne pro produkci)."""
+    conn = open_db_connection(app.config["DATABASE"])
+    try:
+        if not force and conn.execute("""
+                SELECT EXISTS (SELECT 1 FROM customers) OR EXISTS (SELECT 1 FROM jobs)
+                    OR EXISTS (SELECT 1 FROM workers) OR EXISTS (SELECT 1 FROM invoices)
+                """).fetchone()[0]:
+            raise click.ClickException(f"Databáze {app.config['DATABASE']} už obsahuje data; "
+                                       "syntetická data se do ní přidají jen s --force.")
+        start = time.perf_counter()
+        counts = seed_database(conn, customers, workers, jobs, tasks, hours, services, invoiced, seed)
+        for table, count in counts.items():
+            click.echo(f"{table}: {count}")
+        click.echo(f"Hotovo za {time.perf_counter() - start:.1f} s.")
+    finally:
+        conn.close()
+
+# Routy měřené benchmarkem: (název, URL, dotaz na hodnoty dosazované do {value})
+BENCH_ROUTES = [
+    ("index", "/", None),
+    ("job_list", "/jobs", None),
+    ("job_list_status", "/jobs?status=Rozpracovaná", None),
+    ("active_jobs_list", "/jobs/active", None),
+    ("upcoming_jobs_list", "/jobs/upcoming", None),
+    ("job_detail", "/jobs/{value}", "SELECT id FROM jobs"),
+    ("customer_list", "/customers", None),
+    ("customer_history", "/customers/{value}/history", "SELECT id FROM customers"),
+    ("worker_list", "/workers", None),
+    ("worker_detail", "/workers/{value}", "SELECT id FROM workers"),
+    ("invoice_list", "/invoices", None),
+    ("unpaid_invoices_list", "/invoices/unpaid", None),
+    ("view_invoice", "/invoices/{value}/view", "SELECT id FROM invoices"),
+    ("search", "/search?q={value}", "SELECT DISTINCT name FROM customers LIMIT 200"),
+]
+
+def percentile(sorted_values, fraction):
+    """Percentil (nejbližší hodnota) ze seřazeného seznamu."""
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+def bench_client(base_url):
+    """Vrátí funkci get(url) -> status pro jedno vlákno, už přihlášenou."""
+    if base_url is None:
+        client = app.test_client()
+        client.post("/login", data={"password": PASSWORD})
+        return lambda url: client.get(url).status_code
+
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+    opener.open(base_url + "/login", urllib.parse.urlencode({"password": PASSWORD}).encode()).read()
+
+    def get(url):
+        try:
+            with opener.open(base_url + url) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+    return get
+
+def run_benchmark(routes, requests_per_route, concurrency, base_url, seed, page_cache_enabled):
+    """Změří routy a vrátí výsledky (latence v ms, propustnost, chyby) podle názvu routy."""
+    rng = random.Random(seed)
+    conn = open_db_connection(app.config["DATABASE"])
+    try:
+        samples = {name: [row[0] for row in conn.execute(sql)] for name, url, sql in routes if sql}
+    finally:
+        conn.close()
+    clients = [bench_client(base_url) for _ in range(concurrency)]
+    cache_size = page_cache.size
+    if not page_cache_enabled:
+        page_cache.size = 0
+        page_cache.clear()
+
+    results = {}
+    try:
+        for name, url, sql in routes:
+            if sql and not samples[name]:
+                continue
+            urls = [url.format(value=urllib.parse.quote(str(rng.choice(samples[name])))) if sql else url
+                    for _ in range(requests_per_route)]
+            clients[0](urls[0])  # zahřátí
+
+            def worker(index):
+                timings, errors = [], 0
+                for target in urls[index::concurrency]:
+                    start = time.perf_counter()
+                    status = clients[index](target)
+                    timings.append(time.perf_counter() - start)
+                    errors += status >= 400
+                return timings, errors
+
+            start = time.perf_counter()
+            with concurrent.futures.ThreadPoolExecutor(concurrency) as executor:
+                outcomes = list(executor.map(worker, range(concurrency)))
+            elapsed = time.perf_counter() - start
+            timings = sorted(t * 1000 for outcome in outcomes for t in outcome[0])
+            results[name] = {
+                "requests": len(timings),
+                "errors": sum(outcome[1] for outcome in outcomes),
+                "p50_ms": round(percentile(timings, 0.50), 3),
+                "p95_ms": round(percentile(timings, 0.95), 3),
+                "p99_ms": round(percentile(timings, 0.99), 3),
+                "max_ms": round(timings[-1], 3),
+                "mean_ms": round(sum(timings) / len(timings), 3),
+                "throughput_rps": round(len(timings) / elapsed, 1),
+            }
+    finally:
+        page_cache.size = cache_size
+    return results
+
+@app.cli.command("bench")
+@click.option("--requests", "requests_per_route", default=200, show_default=True, help="Počet požadavků na routu.")
+@click.option("--concurrency", default=1, show_default=True, help="Počet souběžných klientů.")
+@click.option("--url", "base_url", default=None, help="Adresa běžícího serveru; bez ní se použije test client.")
+@click.option("--route", "only", multiple=True, help="Měřit jen vybrané routy (název, lze opakovat).")
+@click.option("--seed", default=1, show_default=True, help="Semínko pro výběr id v URL.")
+@click.option("--page-cache/--no-page-cache", default=False, show_default=True,
+              help="Povolit LRU cache vykreslených stránek.")
+@click.option("--output", type=click.Path(dir_okay=False, writable=True), default=None, help="Uložit výsledky jako JSON.")
+@click.option("--compare", type=click.Path(exists=True, dir_okay=False), default=None,
+              help="JSON s dřívějšími výsledky pro porovnání.")
+def bench_command(requests_per_route, concurrency, base_url, only, seed, page_cache, output, compare):
+    """Změří latence hlavních rout (p50/p95/p99), propustnost a paměť."""
+    routes = [route for route in BENCH_ROUTES if not only or route[0] in only]
+    results = run_benchmark(routes, requests_per_route, concurrency, base_url and base_url.rstrip("/"),
+                            seed, page_cache)
+
+    conn = open_db_connection(app.config["DATABASE"])
+    try:
+        rows = {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ("customers", "workers", "jobs", "tasks", "hours_spent", "invoices")}
+    finally:
+        conn.close()
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=app.root_path,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    report = {
+        "meta": {
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "commit": commit,
+            "database": app.config["DATABASE"],
+            "rows": rows,
+            "mode": base_url or "test_client",
+            "requests_per_route": requests_per_route,
+            "concurrency": concurrency,
+            "page_cache": page_cache,
+            "sqlite_version": sqlite3.sqlite_version,
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1) if resource else None,
+        },
+        "routes": results,
+    }
+
+    previous = {}
+    if compare:
+        with open(compare, encoding="utf-8") as f:
+            previous = json.load(f).get("routes", {})
+    click.echo(f"{'routa':<24}{'p50':>10}{'p95':>10}{'p99':>10}{'req/s':>10}{'chyby':>7}")
+    for name, result in results.items():
+        line = (f"{name:<24}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}{result['p99_ms']:>10.2f}"
+                f"{result['throughput_rps']:>10.1f}{result['errors']:>7}")
+        if name in previous and previous[name]["p95_ms"]:
+            change = (result["p95_ms"] - previous[name]["p95_ms"]) / previous[name]["p95_ms"] * 100
+            line += f"   p95 {change:+.0f} %"
+        click.echo(line)
+    click.echo(f"Špičková paměť procesu: {report['meta']['peak_rss_mb']} MB")
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        click.echo(f"Výsledky uloženy do {output}")
+
 
+# Při startu se provede pouze kontrola verze schématu
+check_schema_version()
 
 if __name__ == "__main__":
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,169 @@
+# Soubor: archive.py
+"""Archiv uzavřených zakázek v samostatném souboru databáze.
+
+Uhrazené fakturované zakázky se i se všemi závislými řádky přesouvají do
+archivu, který se k připojení živé databáze připojuje jako schema archive.
+"""
+
+import os
+
+from backups import readonly_uri
+
+ARCHIVE_BATCH = 500
+
+# Přesouvané tabulky (v pořadí vkládání) -> řádky zakázek z temp.archive_batch ve schématu {db}
+_BATCH_IDS = "SELECT job_id FROM temp.archive_batch"
+ARCHIVE_TABLES = {
+    "jobs": f"id IN ({_BATCH_IDS})",
+    "job_totals": f"job_id IN ({_BATCH_IDS})",
+    "tasks": f"job_id IN ({_BATCH_IDS})",
+    "hours_spent": f"job_id IN ({_BATCH_IDS})",
+    "additional_services": f"job_id IN ({_BATCH_IDS})",
+    "invoices": f"job_id IN ({_BATCH_IDS})",
+    "invoice_snapshots": f"invoice_id IN (SELECT id FROM {{db}}.invoices WHERE job_id IN ({_BATCH_IDS}))",
+    "invoice_lines": f"invoice_id IN (SELECT id FROM {{db}}.invoices WHERE job_id IN ({_BATCH_IDS}))",
+}
+# Indexy archivu pro historii zákazníka a pracovníka a pro obnovení
+ARCHIVE_INDEXES = {
+    "idx_archive_jobs_customer": "jobs (customer_id, due_date)",
+    "idx_archive_hours_worker": "hours_spent (worker_id, job_id, hours)",
+    "idx_archive_hours_job": "hours_spent (job_id)",
+    "idx_archive_tasks_job": "tasks (job_id)",
+    "idx_archive_services_job": "additional_services (job_id)",
+    "idx_archive_invoices_job": "invoices (job_id)",
+    "idx_archive_lines_invoice": "invoice_lines (invoice_id)",
+}
+
+ARCHIVE_CANDIDATES_SQL = """
+    SELECT jobs.id
+    FROM invoices
+    JOIN jobs ON jobs.id = invoices.job_id
+    WHERE invoices.payment_status = 'Uhrazeno' AND invoices.invoice_date < ? AND jobs.status = 'Fakturovaná'
+    ORDER BY invoices.invoice_date
+    LIMIT ?
+"""
+
+def archive_attached(conn):
+    """Je k připojení připojen archiv (schema archive)?"""
+    return conn.execute("SELECT 1 FROM pragma_database_list WHERE name = 'archive'").fetchone() is not None
+
+def attach_archive(conn, path):
+    """Připojí archiv jen pro čtení, pokud existuje; vrací, zda je k dispozici.
+
+    Připojení musí být otevřené s uri=True (viz readonly_uri).
+    """
+    if archive_attached(conn):
+        return True
+    if not os.path.exists(path):
+        return False
+    conn.execute("ATTACH DATABASE ? AS archive", (readonly_uri(path),))
+    return True
+
+def archive_columns(conn, table):
+    """Definice sloupců tabulky archivu podle PRAGMA table_xinfo živé tabulky.
+
+    Jen jméno, deklarovaný typ a PRIMARY KEY: integritu hlídá živá databáze
+    (zákazníci v archivu nejsou, čísla zakázek se mohou opakovat). Generované
+    sloupce jsou v archivu obyčejné a kopírují se s hodnotou.
+    """
+    # Řádek table_xinfo: cid, name, type, notnull, dflt_value, pk, hidden (1 = skrytý sloupec virtuální tabulky)
+    return [(row[1], f"{row[1]} {row[2]}" + (" PRIMARY KEY" if row[5] else ""))
+            for row in conn.execute(f"PRAGMA main.table_xinfo({table})") if row[6] != 1]
+
+def open_archive(conn, path):
+    """Připojí archiv pro zápis (soubor případně založí) a doplní chybějící tabulky, sloupce a indexy.
+
+    Archiv používá rollback journal, aby šel připojit jen pro čtení.
+    """
+    conn.execute("ATTACH DATABASE ? AS archive", (path,))
+    conn.execute("PRAGMA archive.journal_mode = DELETE")
+    conn.execute("PRAGMA archive.synchronous = FULL")
+    for table in ARCHIVE_TABLES:
+        columns = archive_columns(conn, table)
+        existing = {row[1] for row in conn.execute(f"PRAGMA archive.table_info({table})")}
+        if not existing:
+            conn.execute(f"CREATE TABLE archive.{table} ({', '.join(definition for _, definition in columns)})")
+            continue
+        # Sloupce přidané migracemi živé databáze
+        for name, definition in columns:
+            if name not in existing:
+                conn.execute(f"ALTER TABLE archive.{table} ADD COLUMN {definition}")
+    for name, columns in ARCHIVE_INDEXES.items():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS archive.{name} ON {columns}")
+
+def fill_archive_batch(conn, job_ids):
+    """Naplní dočasnou tabulku temp.archive_batch id zakázek dávky."""
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS archive_batch (job_id INTEGER PRIMARY KEY)")
+    conn.execute("DELETE FROM temp.archive_batch")
+    conn.executemany("INSERT INTO temp.archive_batch (job_id) VALUES (?)", [(job_id,) for job_id in job_ids])
+
+def copy_job_rows(conn, tables, source, target, replace=False):
+    """Zkopíruje řádky zakázek z temp.archive_batch ze schématu source do target.
+
+    Kopírují se zapisovatelné sloupce cílové tabulky, takže generované
+    sloupce živé databáze se do archivu uloží, ale zpět se nevkládají.
+    """
+    verb = "INSERT OR REPLACE" if replace else "INSERT"
+    for table in tables:
+        columns = ", ".join(row[1] for row in conn.execute(f"PRAGMA {target}.table_xinfo({table})") if row[6] == 0)
+        conn.execute(f"{verb} INTO {target}.{table} ({columns}) SELECT {columns} FROM {source}.{table} "
+                     f"WHERE {ARCHIVE_TABLES[table].format(db=source)}")
+
+def archive_jobs(conn, cutoff):
+    """Přesune do archivu uhrazené fakturované zakázky s fakturou vystavenou před cutoff.
+
+    Transakce přes dva soubory v režimu WAL není atomická jako celek, proto
+    se každá dávka nejdřív zkopíruje a potvrdí v archivu a teprve druhá
+    transakce ji zkopíruje znovu (aktuální stav) a smaže z živé databáze;
+    závislé řádky smažou cizí klíče kaskádou. Opakované spuštění po
+    přerušení je bezpečné. Vrací počet přesunutých zakázek.
+    """
+    moved = 0
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            job_ids = [row[0] for row in conn.execute(ARCHIVE_CANDIDATES_SQL, (cutoff, ARCHIVE_BATCH))]
+            if not job_ids:
+                conn.rollback()
+                return moved
+            fill_archive_batch(conn, job_ids)
+            copy_job_rows(conn, ARCHIVE_TABLES, "main", "archive", replace=True)
+            conn.commit()
+            conn.execute("BEGIN IMMEDIATE")
+            copy_job_rows(conn, ARCHIVE_TABLES, "main", "archive", replace=True)
+            conn.execute(f"DELETE FROM main.jobs WHERE {ARCHIVE_TABLES['jobs']}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        moved += len(job_ids)
+
+def restore_jobs(conn, job_ids):
+    """Vrátí zakázky z archivu do živé databáze; vrací počet obnovených zakázek.
+
+    Součty v job_totals dopočítají triggery živé databáze. Zakázky, které
+    v živé databázi už jsou (přerušené obnovení), se jen odstraní z archivu.
+    Chybějící zákazník nebo obsazené číslo zakázky dávku vrátí zpět
+    (sqlite3.IntegrityError).
+    """
+    restored = 0
+    for start in range(0, len(job_ids), ARCHIVE_BATCH):
+        batch = job_ids[start:start + ARCHIVE_BATCH]
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            fill_archive_batch(conn, batch)
+            conn.execute("DELETE FROM temp.archive_batch WHERE job_id IN (SELECT id FROM main.jobs)")
+            restored += conn.execute("SELECT COUNT(*) FROM temp.archive_batch").fetchone()[0]
+            copy_job_rows(conn, [table for table in ARCHIVE_TABLES if table != "job_totals"], "archive", "main")
+            conn.commit()
+            conn.execute("BEGIN IMMEDIATE")
+            fill_archive_batch(conn, batch)
+            conn.execute("DELETE FROM temp.archive_batch WHERE job_id NOT IN (SELECT id FROM main.jobs)")
+            # Pozpátku, aby snímky a řádky faktur ještě našly své faktury
+            for table in reversed(ARCHIVE_TABLES):
+                conn.execute(f"DELETE FROM archive.{table} WHERE {ARCHIVE_TABLES[table].format(db='archive')}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return restored
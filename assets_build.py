@@ -0,0 +1,323 @@
+# Soubor: assets_build.py
+"""Sestavení statických souborů do static/dist.
+
+Z tříd použitých v šablonách se vygeneruje minifikované CSS jen s
+potřebnými utilitami Tailwindu a připojí se k nim static/src/base.css.
+Výsledek se uloží s otiskem obsahu v názvu a s předkomprimovanými
+variantami .gz (a .br, pokud je nainstalovaný modul brotli);
+manifest.json mapuje zdrojové názvy na sestavené. Aplikace jen čte
+manifest, sestavuje `flask assets-build` nebo `python assets_build.py`.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import re
+
+try:
+    import brotli  # volitelné: předkomprimované .br varianty statických souborů
+except ImportError:
+    brotli = None
+
+# Třídy, podle kterých skripty v šablonách hledají prvky; styly nemají
+SCRIPT_CLASSES = {"customer-search", "load-more", "printable", "toggle-task-status"}
+
+TW_SHADES = ("50", "100", "200", "300", "400", "500", "600", "700", "800", "900")
+TW_COLORS = {
+    "gray": ("f9fafb", "f3f4f6", "e5e7eb", "d1d5db", "9ca3af", "6b7280", "4b5563", "374151", "1f2937", "111827"),
+    "red": ("fef2f2", "fee2e2", "fecaca", "fca5a5", "f87171", "ef4444", "dc2626", "b91c1c", "991b1b", "7f1d1d"),
+    "yellow": ("fefce8", "fef9c3", "fef08a", "fde047", "facc15", "eab308", "ca8a04", "a16207", "854d0e", "713f12"),
+    "green": ("f0fdf4", "dcfce7", "bbf7d0", "86efac", "4ade80", "22c55e", "16a34a", "15803d", "166534", "14532d"),
+    "blue": ("eff6ff", "dbeafe", "bfdbfe", "93c5fd", "60a5fa", "3b82f6", "2563eb", "1d4ed8", "1e40af", "1e3a8a"),
+    "indigo": ("eef2ff", "e0e7ff", "c7d2fe", "a5b4fc", "818cf8", "6366f1", "4f46e5", "4338ca", "3730a3", "312e81"),
+}
+TW_BREAKPOINTS = {"sm": "640px", "md": "768px", "lg": "1024px", "xl": "1280px"}
+TW_PSEUDO = {"hover": ":hover", "focus": ":focus", "disabled": ":disabled"}
+TW_FONT_SIZES = {"xs": ".75rem;line-height:1rem", "sm": ".875rem;line-height:1.25rem",
+                 "base": "1rem;line-height:1.5rem", "lg": "1.125rem;line-height:1.75rem",
+                 "xl": "1.25rem;line-height:1.75rem", "2xl": "1.5rem;line-height:2rem",
+                 "3xl": "1.875rem;line-height:2.25rem", "4xl": "2.25rem;line-height:2.5rem",
+                 "5xl": "3rem;line-height:1", "6xl": "3.75rem;line-height:1"}
+TW_FONT_WEIGHTS = {"light": 300, "normal": 400, "medium": 500, "semibold": 600, "bold": 700, "extrabold": 800}
+TW_LEADING = {"none": "1", "tight": "1.25", "snug": "1.375", "normal": "1.5", "relaxed": "1.625", "loose": "2"}
+TW_TRACKING = {"tighter": "-.05em", "tight": "-.025em", "normal": "0em", "wide": ".025em", "wider": ".05em",
+               "widest": ".1em"}
+TW_MAX_WIDTHS = {"xs": "20rem", "sm": "24rem", "md": "28rem", "lg": "32rem", "xl": "36rem", "2xl": "42rem",
+                 "3xl": "48rem", "4xl": "56rem", "5xl": "64rem", "6xl": "72rem", "7xl": "80rem",
+                 "full": "100%", "none": "none"}
+TW_RADII = {"": ".25rem", "none": "0px", "sm": ".125rem", "md": ".375rem", "lg": ".5rem", "xl": ".75rem",
+            "2xl": "1rem", "full": "9999px"}
+TW_SHADOWS = {"sm": "0 1px 2px 0 rgb(0 0 0 / .05)",
+              "": "0 1px 3px 0 rgb(0 0 0 / .1),0 1px 2px -1px rgb(0 0 0 / .1)",
+              "md": "0 4px 6px -1px rgb(0 0 0 / .1),0 2px 4px -2px rgb(0 0 0 / .1)",
+              "lg": "0 10px 15px -3px rgb(0 0 0 / .1),0 4px 6px -4px rgb(0 0 0 / .1)",
+              "xl": "0 20px 25px -5px rgb(0 0 0 / .1),0 8px 10px -6px rgb(0 0 0 / .1)"}
+TW_SIDES = {"": ("",), "x": ("-left", "-right"), "y": ("-top", "-bottom"), "t": ("-top",), "r": ("-right",),
+            "b": ("-bottom",), "l": ("-left",)}
+TW_CHILDREN = " > :not([hidden]) ~ :not([hidden])"
+TW_COLOR = r"(white|black|transparent|current|(?:" + "|".join(TW_COLORS) + r")-(?:50|[1-9]00))"
+TW_SPACING = r"(px|0|0\.5|1\.5|2\.5|3\.5|[1-9]\d?)"
+
+def tw_spacing(value):
+    """Hodnota ze škály odsazení Tailwindu (1 = 0.25rem)."""
+    if value == "px":
+        return "1px"
+    if value == "0":
+        return "0px"
+    return f"{float(value) / 4:g}rem"
+
+def tw_color(name, prop, opacity_var=None):
+    """Deklarace barvy; s opacity_var ji lze ztlumit třídou *-opacity-N."""
+    if name == "transparent":
+        return f"{prop}:transparent"
+    if name == "current":
+        return f"{prop}:currentColor"
+    if name in ("white", "black"):
+        rgb = "255 255 255" if name == "white" else "0 0 0"
+    else:
+        family, shade = name.rsplit("-", 1)
+        code = TW_COLORS[family][TW_SHADES.index(shade)]
+        rgb = " ".join(str(int(code[i:i + 2], 16)) for i in (0, 2, 4))
+    if opacity_var is None:
+        return f"{prop}:rgb({rgb})"
+    return f"{opacity_var}:1;{prop}:rgb({rgb} / var({opacity_var}))"
+
+def _tw_sides(prop, sides, value, suffix=""):
+    return ";".join(f"{prop}{side}{suffix}:{value}" for side in TW_SIDES[sides])
+
+def _tw_size(prop, value, extra):
+    if value in extra:
+        return f"{prop}:{extra[value]}"
+    if "/" in value:
+        numerator, denominator = value.split("/")
+        return f"{prop}:{int(numerator) / int(denominator) * 100:g}%"
+    return f"{prop}:{tw_spacing(value)}"
+
+def _tw_ring(width):
+    return ("--tw-ring-offset-shadow:0 0 0 var(--tw-ring-offset-width) var(--tw-ring-offset-color);"
+            f"--tw-ring-shadow:0 0 0 calc({width}px + var(--tw-ring-offset-width)) var(--tw-ring-color);"
+            "box-shadow:var(--tw-ring-offset-shadow),var(--tw-ring-shadow),var(--tw-shadow,0 0 #0000)")
+
+_TW_SIZES = {"auto": "auto", "full": "100%"}
+_TW_DISPLAY = {"block": "block", "inline-block": "inline-block", "inline": "inline", "flex": "flex",
+               "inline-flex": "inline-flex", "table": "table", "table-row": "table-row",
+               "table-cell": "table-cell", "grid": "grid", "contents": "contents", "hidden": "none"}
+
+# Pravidla utilit v pořadí, v jakém je řadí Tailwind (pozdější přebíjí dřívější):
+# vzor názvu třídy a funkce vracející deklarace, případně i (deklarace, přípona selektoru).
+TW_RULES = [
+    (r"container", lambda m: "width:100%"),
+    (r"(static|fixed|absolute|relative|sticky)", lambda m: f"position:{m[1]}"),
+    (r"inset-" + TW_SPACING, lambda m: ";".join(f"{side}:{tw_spacing(m[1])}"
+                                                 for side in ("top", "right", "bottom", "left"))),
+    (r"(top|right|bottom|left)-" + TW_SPACING, lambda m: f"{m[1]}:{tw_spacing(m[2])}"),
+    (r"z-(0|10|20|30|40|50|auto)", lambda m: f"z-index:{m[1]}"),
+    (r"(-?)m([xytrbl]?)-" + TW_SPACING, lambda m: _tw_sides("margin", m[2], m[1] + tw_spacing(m[3]))),
+    (r"m([xytrbl]?)-auto", lambda m: _tw_sides("margin", m[1], "auto")),
+    ("(" + "|".join(_TW_DISPLAY) + ")", lambda m: f"display:{_TW_DISPLAY[m[1]]}"),
+    (r"h-(" + TW_SPACING[1:-1] + r"|auto|full|screen)",
+     lambda m: _tw_size("height", m[1], dict(_TW_SIZES, screen="100vh"))),
+    (r"min-h-(0|full|screen)", lambda m: _tw_size("min-height", m[1], dict(_TW_SIZES, screen="100vh"))),
+    (r"w-(" + TW_SPACING[1:-1] + r"|auto|full|screen|[1-5]/(?:2|3|4|5|6|12))",
+     lambda m: _tw_size("width", m[1], dict(_TW_SIZES, screen="100vw"))),
+    (r"min-w-(0|full)", lambda m: _tw_size("min-width", m[1], _TW_SIZES)),
+    (r"max-w-(" + "|".join(TW_MAX_WIDTHS) + ")", lambda m: f"max-width:{TW_MAX_WIDTHS[m[1]]}"),
+    (r"flex-(1|auto|none)", lambda m: "flex:" + {"1": "1 1 0%", "auto": "1 1 auto", "none": "none"}[m[1]]),
+    (r"(shrink|grow)(-0)?", lambda m: f"flex-{m[1]}:{0 if m[2] else 1}"),
+    (r"flex-(row|col)(-reverse)?", lambda m: f"flex-direction:{'row' if m[1] == 'row' else 'column'}{m[2] or ''}"),
+    (r"flex-(wrap|nowrap)", lambda m: f"flex-wrap:{m[1]}"),
+    (r"grid-cols-(\d+)", lambda m: f"grid-template-columns:repeat({m[1]},minmax(0,1fr))"),
+    (r"items-(start|end|center|baseline|stretch)",
+     lambda m: f"align-items:{'flex-' + m[1] if m[1] in ('start', 'end') else m[1]}"),
+    (r"justify-(start|end|center|between|around|evenly)",
+     lambda m: "justify-content:" + {"start": "flex-start", "end": "flex-end", "center": "center",
+                                     "between": "space-between", "around": "space-around",
+                                     "evenly": "space-evenly"}[m[1]]),
+    (r"gap-(?:([xy])-)?" + TW_SPACING,
+     lambda m: f"{ {'x': 'column-gap', 'y': 'row-gap'}.get(m[1], 'gap')}:{tw_spacing(m[2])}"),
+    (r"space-([xy])-" + TW_SPACING,
+     lambda m: (f"margin-{'left' if m[1] == 'x' else 'top'}:{tw_spacing(m[2])}", TW_CHILDREN)),
+    (r"divide-([xy])(?:-(0|2|4|8))?",
+     lambda m: (f"border-{'left' if m[1] == 'x' else 'top'}-width:{m[2] or 1}px;"
+                f"border-{'right' if m[1] == 'x' else 'bottom'}-width:0", TW_CHILDREN)),
+    (r"divide-" + TW_COLOR, lambda m: (tw_color(m[1], "border-color", "--tw-divide-opacity"), TW_CHILDREN)),
+    (r"overflow(?:-([xy]))?-(auto|hidden|visible|scroll)",
+     lambda m: f"overflow{'-' + m[1] if m[1] else ''}:{m[2]}"),
+    (r"truncate", lambda m: "overflow:hidden;text-overflow:ellipsis;white-space:nowrap"),
+    (r"whitespace-(normal|nowrap|pre|pre-line|pre-wrap)", lambda m: f"white-space:{m[1]}"),
+    (r"rounded(?:-(" + "|".join(k for k in TW_RADII if k) + "))?",
+     lambda m: f"border-radius:{TW_RADII[m[1] or '']}"),
+    (r"border(?:-([xytrbl]))?(?:-(0|2|4|8))?",
+     lambda m: _tw_sides("border", m[1] or "", f"{m[2] or 1}px", "-width")),
+    (r"border-" + TW_COLOR, lambda m: tw_color(m[1], "border-color", "--tw-border-opacity")),
+    (r"bg-" + TW_COLOR, lambda m: tw_color(m[1], "background-color", "--tw-bg-opacity")),
+    (r"bg-opacity-(\d+)", lambda m: f"--tw-bg-opacity:{int(m[1]) / 100:g}"),
+    (r"p([xytrbl]?)-" + TW_SPACING, lambda m: _tw_sides("padding", m[1], tw_spacing(m[2]))),
+    (r"text-(left|center|right|justify)", lambda m: f"text-align:{m[1]}"),
+    (r"align-(top|middle|bottom|baseline)", lambda m: f"vertical-align:{m[1]}"),
+    (r"font-mono", lambda m: "font-family:ui-monospace,SFMono-Regular,Menlo,Consolas,monospace"),
+    (r"text-(" + "|".join(TW_FONT_SIZES) + ")", lambda m: f"font-size:{TW_FONT_SIZES[m[1]]}"),
+    (r"font-(" + "|".join(TW_FONT_WEIGHTS) + ")", lambda m: f"font-weight:{TW_FONT_WEIGHTS[m[1]]}"),
+    (r"leading-(\d+|" + "|".join(TW_LEADING) + ")",
+     lambda m: f"line-height:{TW_LEADING.get(m[1]) or tw_spacing(m[1])}"),
+    (r"tracking-(" + "|".join(TW_TRACKING) + ")", lambda m: f"letter-spacing:{TW_TRACKING[m[1]]}"),
+    (r"text-" + TW_COLOR, lambda m: tw_color(m[1], "color", "--tw-text-opacity")),
+    (r"text-opacity-(\d+)", lambda m: f"--tw-text-opacity:{int(m[1]) / 100:g}"),
+    (r"(uppercase|lowercase|capitalize)", lambda m: f"text-transform:{m[1]}"),
+    (r"normal-case", lambda m: "text-transform:none"),
+    (r"italic", lambda m: "font-style:italic"),
+    (r"(underline|line-through)", lambda m: f"text-decoration-line:{m[1]}"),
+    (r"no-underline", lambda m: "text-decoration-line:none"),
+    (r"list-(disc|decimal|none)", lambda m: f"list-style-type:{m[1]}"),
+    (r"opacity-(\d+)", lambda m: f"opacity:{int(m[1]) / 100:g}"),
+    (r"shadow(?:-(" + "|".join(k for k in TW_SHADOWS if k) + "|none))?",
+     lambda m: (f"--tw-shadow:{TW_SHADOWS.get(m[1] or '', '0 0 #0000')};"
+                "box-shadow:var(--tw-ring-offset-shadow,0 0 #0000),var(--tw-ring-shadow,0 0 #0000),var(--tw-shadow)")),
+    (r"outline-none", lambda m: "outline:2px solid transparent;outline-offset:2px"),
+    (r"ring(?:-(0|1|2|4|8))?", lambda m: _tw_ring(3 if m[1] is None else m[1])),
+    (r"ring-" + TW_COLOR, lambda m: tw_color(m[1], "--tw-ring-color", "--tw-ring-opacity")),
+    (r"ring-opacity-(\d+)", lambda m: f"--tw-ring-opacity:{int(m[1]) / 100:g}"),
+    (r"cursor-(pointer|default|not-allowed|wait)", lambda m: f"cursor:{m[1]}"),
+    (r"transition", lambda m: "transition-property:color,background-color,border-color,text-decoration-color,"
+                              "fill,stroke,opacity,box-shadow,transform;"
+                              "transition-timing-function:cubic-bezier(.4,0,.2,1);transition-duration:.15s"),
+]
+TW_RULES = [(re.compile(pattern), func) for pattern, func in TW_RULES]
+
+def tw_rule(utility):
+    """Vrátí (pořadí, deklarace, přípona selektoru) pro název utility, nebo None."""
+    for order, (pattern, func) in enumerate(TW_RULES):
+        m = pattern.fullmatch(utility)
+        if m:
+            result = func(m)
+            declarations, suffix = result if isinstance(result, tuple) else (result, "")
+            return order, declarations, suffix
+    return None
+
+def css_escape(name):
+    """Escapuje název třídy pro CSS selektor (md:flex -> md\\:flex)."""
+    return re.sub(r"([^A-Za-z0-9_-])", r"\\\1", name)
+
+def minify_css(text):
+    """Odstraní komentáře a nadbytečné mezery."""
+    text = re.sub(r"/\*.*?\*/", "", text, flags=re.S)
+    text = re.sub(r"\s+", " ", text)
+    text = re.sub(r"\s*([{};,>])\s*", r"\1", text)
+    text = re.sub(r":\s+", ":", text)
+    return text.replace(";}", "}").strip()
+
+def template_class_candidates(templates_folder):
+    """Všechna slova ze šablon, která mohou být názvem třídy (včetně tříd skládaných v JS)."""
+    candidates = set()
+    for name in sorted(os.listdir(templates_folder)):
+        if name.endswith(".html"):
+            with open(os.path.join(templates_folder, name), encoding="utf-8") as f:
+                candidates.update(re.findall(r"[A-Za-z0-9_:/.-]+", f.read()))
+    return candidates
+
+def build_utilities_css(candidates):
+    """Vygeneruje CSS jen pro utility, které se v kandidátech skutečně vyskytují.
+
+    Vrací (css, použité třídy). Varianty hover:/focus:/disabled: a sm:/md:/lg:/xl:
+    lze kombinovat; responzivní pravidla jdou do @media na konec souboru.
+    """
+    groups = {media: [] for media in ("",) + tuple(TW_BREAKPOINTS)}
+    used = set()
+    for name in candidates:
+        *variants, utility = name.split(":")
+        media = [v for v in variants if v in TW_BREAKPOINTS]
+        pseudo = [v for v in variants if v in TW_PSEUDO]
+        if len(media) > 1 or len(pseudo) > 1 or len(media) + len(pseudo) != len(variants):
+            continue
+        rule = tw_rule(utility)
+        if rule is None:
+            continue
+        order, declarations, suffix = rule
+        pseudo_order = list(TW_PSEUDO).index(pseudo[0]) + 1 if pseudo else 0
+        selector = "." + css_escape(name) + (TW_PSEUDO[pseudo[0]] if pseudo else "") + suffix
+        groups[media[0] if media else ""].append((pseudo_order, order, name, selector, declarations))
+        used.add(name)
+    if "container" in used:
+        for media, width in TW_BREAKPOINTS.items():
+            groups[media].insert(0, (-1, -1, "container", ".container", f"max-width:{width}"))
+    parts = []
+    for media, rules in groups.items():
+        css = "".join(f"{selector}{{{declarations}}}" for *_, selector, declarations in sorted(rules))
+        if css and media:
+            css = f"@media (min-width:{TW_BREAKPOINTS[media]}){{{css}}}"
+        parts.append(css)
+    return "".join(parts), used
+
+def write_asset(dist_folder, name, data):
+    """Uloží soubor do dist_folder pod názvem s otiskem obsahu; vrací nový název."""
+    stem, ext = os.path.splitext(os.path.basename(name))
+    filename = f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+    variants = [(filename, data), (filename + ".gz", gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append((filename + ".br", brotli.compress(data, quality=11)))
+    for variant, content in variants:
+        path = os.path.join(dist_folder, variant)
+        if not os.path.exists(path):
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(content)
+            os.replace(tmp, path)
+    return filename
+
+def build_assets(static_folder, templates_folder, dist_folder):
+    """Sestaví CSS do dist_folder a zapíše manifest.json; vrací (manifest, použité třídy)."""
+    os.makedirs(dist_folder, exist_ok=True)
+    with open(os.path.join(static_folder, "src", "base.css"), encoding="utf-8") as f:
+        base = f.read()
+    utilities, used = build_utilities_css(template_class_candidates(templates_folder))
+    manifest = {"app.css": write_asset(dist_folder, "app.css", minify_css(base + utilities).encode())}
+
+    manifest_path = os.path.join(dist_folder, "manifest.json")
+    try:
+        with open(manifest_path, encoding="utf-8") as f:
+            previous = json.load(f)
+    except FileNotFoundError:
+        previous = {}
+    tmp = f"{manifest_path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, manifest_path)
+    # Soubory předchozího sestavení zůstávají pro stránky, které na ně ještě odkazují
+    keep = set(manifest.values()) | set(previous.values())
+    for name in os.listdir(dist_folder):
+        if name != "manifest.json" and re.sub(r"\.(gz|br)$", "", name) not in keep:
+            os.remove(os.path.join(dist_folder, name))
+    return manifest, used
+
+def unknown_classes(static_folder, templates_folder, used):
+    """Třídy z atributů class, pro které generátor nemá pravidlo (kromě vlastních z base.css a SCRIPT_CLASSES)."""
+    with open(os.path.join(static_folder, "src", "base.css"), encoding="utf-8") as f:
+        custom = set(re.findall(r"\.([A-Za-z][\w-]*)", f.read())) | SCRIPT_CLASSES
+    unknown = set()
+    for name in os.listdir(templates_folder):
+        with open(os.path.join(templates_folder, name), encoding="utf-8") as f:
+            for attr in re.findall(r'class="([^"]*)"', f.read()):
+                attr = re.sub(r"{[{%].*?[%}]}", " ", attr)
+                unknown.update(c for c in attr.split() if c not in used and c not in custom)
+    return unknown
+
+def build(static_folder, templates_folder, dist_folder, echo=print):
+    """Sestaví soubory a vypíše přehled přes echo; vrací manifest."""
+    manifest, used = build_assets(static_folder, templates_folder, dist_folder)
+    for name, filename in sorted(manifest.items()):
+        size = os.path.getsize(os.path.join(dist_folder, filename))
+        gz = os.path.join(dist_folder, filename + ".gz")
+        extra = f", gzip {os.path.getsize(gz)} B" if os.path.exists(gz) else ""
+        echo(f"{name} -> {filename} ({size} B{extra})")
+    if brotli is None:
+        echo("Modul brotli není nainstalovaný, varianty .br se nevytvořily.")
+    unknown = unknown_classes(static_folder, templates_folder, used)
+    if unknown:
+        echo("Třídy bez pravidla: " + ", ".join(sorted(unknown)))
+    return manifest
+
+
+if __name__ == "__main__":
+    root = os.path.dirname(os.path.abspath(__file__))
+    build(os.path.join(root, "static"), os.path.join(root, "templates"), os.path.join(root, "static", "dist"))
@@ -0,0 +1,115 @@
+# Soubor: backups.py
+"""Ověřené snímky databází SQLite za běhu aplikace a obnova z nich.
+
+Snímek se kopíruje backup API po krocích z jedné čtecí transakce (nebo
+VACUUM INTO), před zařazením se ověří a ve složce se drží posledních N.
+"""
+
+import datetime
+import os
+import sqlite3
+import time
+import urllib.parse
+
+
+def readonly_uri(path):
+    """URI souboru databáze pro otevření jen pro čtení (sqlite3.connect(..., uri=True))."""
+    return "file:" + urllib.parse.quote(os.path.abspath(path)) + "?mode=ro"
+
+def list_snapshots(folder):
+    """Snímky ve složce od nejstaršího (název obsahuje datum a čas)."""
+    if not os.path.isdir(folder):
+        return []
+    return sorted(os.path.join(folder, name) for name in os.listdir(folder) if name.endswith(".db"))
+
+def verify_snapshot(path, check="integrity"):
+    """Ověří snímek; vrací seznam nalezených problémů (prázdný = v pořádku).
+
+    check "integrity" spustí integrity_check a foreign_key_check, "quick" jen quick_check.
+    """
+    conn = sqlite3.connect(readonly_uri(path), uri=True)
+    try:
+        if check == "quick":
+            problems = [row[0] for row in conn.execute("PRAGMA quick_check")]
+        else:
+            problems = [row[0] for row in conn.execute("PRAGMA integrity_check")]
+            problems += [f"{table}#{rowid}: neplatný odkaz do {parent}"
+                         for table, rowid, parent, _ in conn.execute("PRAGMA foreign_key_check")]
+    finally:
+        conn.close()
+    return [problem for problem in problems if problem != "ok"]
+
+def snapshot_database(path, folder, method="backup", timeout=5.0, step_pages=1024, step_sleep=0.005,
+                      check="integrity"):
+    """Vytvoří ověřený snímek databáze ve složce folder a vrátí jeho cestu.
+
+    Zdrojové připojení drží po celou dobu čtecí transakci, takže snímek
+    odpovídá jednomu okamžiku a zápisy aplikace (WAL) nenutí backup API
+    kopírovat znovu od začátku; mezi kroky po step_pages stránkách se čeká
+    step_sleep sekund. method "vacuum" použije VACUUM INTO v jednom kroku.
+    """
+    os.makedirs(folder, exist_ok=True)
+    target = os.path.join(folder, f"{os.path.basename(folder)}-{datetime.datetime.now():%Y%m%d-%H%M%S}.db")
+    partial = target + ".partial"
+    if os.path.exists(partial):
+        os.remove(partial)
+    source = sqlite3.connect(readonly_uri(path), uri=True, timeout=timeout)
+    try:
+        if method == "vacuum":
+            source.execute("VACUUM INTO ?", (partial,))
+        else:
+            copy = sqlite3.connect(partial)
+            try:
+                source.execute("BEGIN")
+                source.execute("SELECT count(*) FROM sqlite_schema").fetchone()
+                source.backup(copy, pages=step_pages,
+                              progress=lambda status, remaining, total: time.sleep(step_sleep))
+            finally:
+                copy.close()
+        # Snímek je samostatný soubor bez -wal
+        copy = sqlite3.connect(partial)
+        try:
+            copy.execute("PRAGMA journal_mode = DELETE")
+        finally:
+            copy.close()
+        problems = verify_snapshot(partial, check)
+        if problems:
+            raise sqlite3.DatabaseError(f"Snímek {target} je poškozený: {'; '.join(problems[:5])}")
+        os.replace(partial, target)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    finally:
+        source.close()
+    return target
+
+def rotate_snapshots(folder, keep):
+    """Smaže snímky kromě posledních keep; vrací smazané."""
+    snapshots = list_snapshots(folder)
+    removed = snapshots[:-keep] if keep > 0 else []
+    for path in removed:
+        os.remove(path)
+    return removed
+
+def restore_snapshot(snapshot, path, timeout=5.0):
+    """Obnoví databázi ze snímku přes backup API, takže otevřená připojení rovnou vidí nový obsah.
+
+    Verze v table_versions se posunou nad stav před obnovou, aby ETagy
+    a cache v běžících procesech nepovažovaly starý obsah za aktuální.
+    """
+    source = sqlite3.connect(readonly_uri(snapshot), uri=True)
+    target = sqlite3.connect(path, timeout=timeout)
+    try:
+        tracked = target.execute("SELECT 1 FROM sqlite_schema WHERE name = 'table_versions'").fetchone()
+        versions = target.execute("SELECT name, version FROM table_versions").fetchall() if tracked else []
+        source.backup(target)
+        if versions and target.execute("SELECT 1 FROM sqlite_schema WHERE name = 'table_versions'").fetchone():
+            target.executemany("UPDATE table_versions SET version = max(version, ?) + 1 WHERE name = ?",
+                               [(version, name) for name, version in versions])
+            target.execute("UPDATE table_versions SET version = version + 1 WHERE name NOT IN (%s)"
+                           % ", ".join("?" * len(versions)), [name for name, _ in versions])
+            target.commit()
+    finally:
+        target.close()
+        source.close()
@@ -0,0 +1,80 @@
+# Soubor: lookup_cache.py
+"""Cache číselníků (zákazníci, pracovníci) v paměti procesu.
+
+Číselník se drží jako pole seřazená podle jména bez diakritiky a jeho
+platnost se ověřuje proti verzi tabulky v table_versions.
+"""
+
+import array
+import bisect
+import unicodedata
+
+LOOKUP_SOURCES = {
+    "customers": "SELECT id, name FROM customers",
+    "workers": "SELECT id, name FROM workers",
+}
+
+def fold_name(text):
+    """Klíč pro řazení a hledání: malá písmena bez diakritiky."""
+    return "".join(c for c in unicodedata.normalize("NFKD", text.casefold()) if not unicodedata.combining(c))
+
+
+class LookupEntry:
+    """Jedna verze číselníku: pole seřazená podle klíče jména a index podle id."""
+
+    def __init__(self, version, rows):
+        rows = sorted((fold_name(name or ""), name or "", row_id) for row_id, name in rows)
+        self.version = version
+        self.keys = [row[0] for row in rows]
+        self.names = [row[1] for row in rows]
+        self.ids = array.array("q", (row[2] for row in rows))
+        order = sorted(range(len(rows)), key=self.ids.__getitem__)
+        self.sorted_ids = array.array("q", (self.ids[i] for i in order))
+        self.positions = array.array("q", order)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def items(self):
+        """Všechny položky seřazené podle jména."""
+        return [{"id": row_id, "name": name} for row_id, name in zip(self.ids, self.names)]
+
+    def name(self, row_id):
+        """Jméno položky podle id, nebo None."""
+        i = bisect.bisect_left(self.sorted_ids, row_id)
+        if i < len(self.sorted_ids) and self.sorted_ids[i] == row_id:
+            return self.names[self.positions[i]]
+        return None
+
+    def prefix(self, text, limit):
+        """Položky, jejichž jméno začíná textem (bez ohledu na velikost a diakritiku)."""
+        key = fold_name(text.strip())
+        matches = []
+        i = bisect.bisect_left(self.keys, key)
+        while i < len(self.keys) and len(matches) < limit and self.keys[i].startswith(key):
+            matches.append({"id": self.ids[i], "label": self.names[i]})
+            i += 1
+        return matches
+
+
+class LookupCache:
+    """Číselníky podle databáze (conn.path) a druhu, znovu načtené při změně verze tabulky."""
+
+    def __init__(self):
+        self._entries = {}
+
+    def get(self, conn, kind):
+        version = conn.execute("SELECT version FROM table_versions WHERE name = ?", (kind,)).fetchone()[0]
+        entry = self._entries.get((conn.path, kind))
+        if entry is None or entry.version != version:
+            entry = LookupEntry(version, conn.execute(LOOKUP_SOURCES[kind]).fetchall())
+            self._entries[(conn.path, kind)] = entry
+        return entry
+
+    def discard(self, path):
+        """Zapomene číselníky databáze (např. tenanta, jehož fond byl zavřen)."""
+        for key in [key for key in self._entries if key[0] == path]:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
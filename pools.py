@@ -0,0 +1,113 @@
+# Soubor: pools.py
+"""Fondy připojení k SQLite, jeden na soubor databáze (tenanta).
+
+Proces drží fondy jen omezeného počtu naposledy použitých databází;
+nejdéle nepoužité a dlouho nečinné fondy se zavírají.
+"""
+
+import collections
+import os
+import queue
+import threading
+import time
+
+
+class ConnectionPool:
+    """Fond znovupoužitelných připojení k jednomu souboru databáze.
+
+    Připojení se půjčují na dobu jednoho požadavku a po jeho skončení se vrací
+    zpět. Fond je vázaný na proces - po forku (např. gunicorn) se začne znovu.
+    Zavřený fond (vyřazený z LRU) vrácená připojení už jen zavírá.
+    """
+
+    def __init__(self, path, size, connect):
+        self.path = path
+        self.size = size
+        self.closed = False
+        self.last_used = time.monotonic()
+        self._connect = connect
+        self._pid = os.getpid()
+        self._idle = queue.LifoQueue(maxsize=size)
+
+    def acquire(self):
+        """Vrátí nečinné připojení z fondu, případně otevře nové."""
+        if self._pid != os.getpid():
+            # Připojení zděděná přes fork nesmí být sdílena mezi procesy
+            self._pid = os.getpid()
+            self._idle = queue.LifoQueue(maxsize=self.size)
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect(self.path)
+
+    def release(self, conn):
+        """Vrátí připojení do fondu, nebo ho zavře, pokud je fond plný."""
+        if conn.in_transaction:
+            conn.rollback()
+        if self.closed or self._pid != os.getpid():
+            conn.close()
+            return
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def close_all(self):
+        """Zavře všechna nečinná připojení a fond."""
+        self.closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+class PoolRegistry:
+    """Fondy podle cesty k databázi, seřazené od nejdéle nepoužitého (LRU).
+
+    open_pool(path) vytvoří fond pro databázi použitou poprvé v procesu.
+    Volitelné on_evict(path) se zavolá po zavření vyřazeného fondu.
+    """
+
+    def __init__(self, open_pool, on_evict=None):
+        self._open_pool = open_pool
+        self._on_evict = on_evict
+        self._pools = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._pools)
+
+    def get(self, path, max_pools, idle):
+        """Vrátí fond databáze a zavře fondy nad max_pools a fondy nečinné déle než idle sekund.
+
+        Právě vrácený fond se nevyřazuje nikdy.
+        """
+        with self._lock:
+            pool = self._pools.get(path)
+            if pool is None:
+                pool = self._pools[path] = self._open_pool(path)
+            pool.last_used = now = time.monotonic()
+            self._pools.move_to_end(path)
+            evicted = []
+            while len(self._pools) > 1:
+                oldest_path, oldest = next(iter(self._pools.items()))
+                if len(self._pools) <= max_pools and now - oldest.last_used < idle:
+                    break
+                del self._pools[oldest_path]
+                evicted.append(oldest)
+        self._close(evicted)
+        return pool
+
+    def close_all(self):
+        """Zavře všechny fondy."""
+        with self._lock:
+            pools = list(self._pools.values())
+            self._pools.clear()
+        self._close(pools)
+
+    def _close(self, pools):
+        for pool in pools:
+            pool.close_all()
+            if self._on_evict is not None:
+                self._on_evict(pool.path)
@@ -0,0 +1,176 @@
+# Soubor: scheduler.py
+"""Plánovač periodických úloh nad databázemi SQLite.
+
+Úlohy nad jednou databází provádí ze všech procesů jen vedoucí s platnou
+lhůtou v tabulce scheduler_leader; běhy se zapisují do scheduler_runs,
+takže intervaly platí i přes restart aplikace.
+"""
+
+import collections
+import logging
+import os
+import socket
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+ScheduledTask = collections.namedtuple("ScheduledTask", "interval func")
+
+
+def process_owner():
+    """Identita procesu pro vedení plánovače."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def acquire_leadership(conn, owner, lease):
+    """Získá nebo o lease sekund prodlouží vedení nad databází; vrací, zda je owner vedoucí."""
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("INSERT OR IGNORE INTO scheduler_leader (id, owner, expires_at) VALUES (1, ?, 0)", (owner,))
+        leader = conn.execute("""
+            UPDATE scheduler_leader SET owner = ?, expires_at = ?
+            WHERE id = 1 AND (owner = ? OR expires_at < ?)
+        """, (owner, now + lease, owner, now)).rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return leader == 1
+
+def release_leadership(conn, owner=None):
+    """Uvolní vedení (owner None = kohokoli), aby ho jiný proces mohl převzít hned."""
+    if owner is None:
+        conn.execute("UPDATE scheduler_leader SET expires_at = 0 WHERE id = 1")
+    else:
+        conn.execute("UPDATE scheduler_leader SET expires_at = 0 WHERE id = 1 AND owner = ?", (owner,))
+    conn.commit()
+
+def last_starts(conn):
+    """Začátky posledních běhů úloh podle scheduler_runs."""
+    return {task: start or 0 for task, start in conn.execute("SELECT task, last_start FROM scheduler_runs")}
+
+
+class Scheduler:
+    """Registr úloh a jejich spouštění nad databázemi.
+
+    Úloha dostane připojení k databázi a vrátí popis výsledku. Volitelné
+    on_run(cesta, úloha, stav, začátek, doba) dostává každý běh pro metriky.
+    """
+
+    def __init__(self, on_run=None):
+        self.tasks = {}
+        self._on_run = on_run
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def task(self, name, interval):
+        """Dekorátor pro registraci úlohy.
+
+        interval je v sekundách, případně funkce, která ho vrátí z konfigurace;
+        úloha s intervalem <= 0 se spouští jen ručně.
+        """
+        def decorator(f):
+            self.tasks[name] = ScheduledTask(interval, f)
+            return f
+        return decorator
+
+    def interval(self, name):
+        interval = self.tasks[name].interval
+        return interval() if callable(interval) else interval
+
+    def run_task(self, conn, name):
+        """Provede úlohu a zapíše její běh do scheduler_runs; vrací (stav, výsledek)."""
+        start = time.time()
+        conn.execute("""
+            INSERT INTO scheduler_runs (task, last_start) VALUES (?, ?)
+            ON CONFLICT (task) DO UPDATE SET last_start = excluded.last_start
+        """, (name, start))
+        conn.commit()
+        timer = time.perf_counter()
+        try:
+            status, result = "ok", self.tasks[name].func(conn)
+        except Exception as e:
+            if conn.in_transaction:
+                conn.rollback()
+            logger.exception("Úloha plánovače %s nad %s selhala", name, conn.path)
+            status, result = "error", str(e)
+        elapsed = time.perf_counter() - timer
+        conn.execute("""
+            UPDATE scheduler_runs
+            SET last_end = ?, last_status = ?, last_result = ?, duration = ?, runs = runs + 1
+            WHERE task = ?
+        """, (time.time(), status, result, elapsed, name))
+        conn.commit()
+        if self._on_run is not None:
+            self._on_run(conn.path, name, status, start, elapsed)
+        return status, result
+
+    def run_round(self, conn, owner, lease, names=None, release=False):
+        """Jedno kolo nad databází: jako vedoucí spustí úlohy s prošlým intervalem.
+
+        names spustí vyjmenované úlohy hned bez ohledu na interval; release
+        po kole vedení uvolní. Vrací [(úloha, stav, výsledek)], nebo None,
+        když databázi vede jiný proces.
+        """
+        if names is None:
+            started = last_starts(conn)
+            names = [name for name in self.tasks if 0 < self.interval(name) <= time.time() - started.get(name, 0)]
+        results = []
+        try:
+            for name in names:
+                # Lhůta se prodlužuje před každou úlohou; ztracené vedení kolo ukončí
+                if not acquire_leadership(conn, owner, lease):
+                    return results or None
+                results.append((name, *self.run_task(conn, name)))
+        finally:
+            if release:
+                release_leadership(conn, owner)
+        return results
+
+    def next_visit(self, conn, owner):
+        """Čas, do kdy databázi není třeba znovu otevírat.
+
+        Je to nejbližší prošlý interval některé úlohy; dokud vedení drží jiný
+        proces, nejdříve až vypršení jeho lhůty.
+        """
+        started = last_starts(conn)
+        visit = min((started.get(name, 0) + self.interval(name) for name in self.tasks if self.interval(name) > 0),
+                    default=float("inf"))
+        leader = conn.execute("SELECT owner, expires_at FROM scheduler_leader WHERE id = 1").fetchone()
+        if leader is not None and leader[0] != owner:
+            visit = max(visit, leader[1])
+        return visit
+
+    def start(self, databases, visit, tick):
+        """Spustí vlákno plánovače v tomto procesu (po forku znovu).
+
+        databases() vrací cesty obsluhovaných databází, visit(cesta, owner)
+        provede kolo a vrátí čas příští návštěvy; tick je pauza mezi průchody.
+        """
+        if self._thread is not None and self._thread[0] == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or self._thread[0] != os.getpid():
+                thread = threading.Thread(target=self._loop, args=(databases, visit, tick),
+                                          name="zakazky-scheduler", daemon=True)
+                thread.start()
+                self._thread = (os.getpid(), thread)
+
+    def _loop(self, databases, visit, tick):
+        owner = process_owner()
+        next_visit = {}
+        while True:
+            now = time.time()
+            paths = databases()
+            for path in paths:
+                if next_visit.get(path, 0) > now:
+                    continue
+                try:
+                    next_visit[path] = visit(path, owner)
+                except Exception:
+                    next_visit.pop(path, None)
+                    logger.exception("Plánovač nad %s selhal", path)
+            for path in set(next_visit) - set(paths):
+                del next_visit[path]
+            time.sleep(tick)
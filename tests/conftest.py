@@ -0,0 +1,57 @@
+"""Společné nastavení testů: aplikace nad dočasnou databází, bez plánovače."""
+
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+# Aplikace při importu kontroluje verzi schématu DATABASE, proto se nastaví předem
+_directory = tempfile.mkdtemp(prefix="zakazky-tests-")
+atexit.register(shutil.rmtree, _directory, ignore_errors=True)
+os.environ["ZAKAZKY_DB"] = os.path.join(_directory, "zakazky.db")
+os.environ["ZAKAZKY_ASSETS_DIR"] = os.path.join(_directory, "dist")
+os.environ["ZAKAZKY_SCHEDULER"] = "0"
+os.environ.pop("ZAKAZKY_TENANTS_DIR", None)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as zakazky  # noqa: E402
+import assets_build  # noqa: E402
+
+
+def quiet(*args):
+    """Log migrací, který nic nevypisuje."""
+
+
+@pytest.fixture(scope="session", autouse=True)
+def assets():
+    """Sestavené styly v dočasném ASSETS_DIR (jako flask assets-build); vrací (manifest, použité třídy)."""
+    return assets_build.build_assets(zakazky.app.static_folder, zakazky.TEMPLATES_DIR,
+                                     zakazky.app.config["ASSETS_DIR"])
+
+
+@pytest.fixture
+def conn(tmp_path):
+    """Připojení k nové, plně zmigrované databázi."""
+    conn = zakazky.open_db_connection(str(tmp_path / "zakazky.db"))
+    zakazky.migrate_db(conn, log=quiet)
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """Přihlášený testovací klient nad novou, zmigrovanou databází (app.config["DATABASE"])."""
+    path = str(tmp_path / "zakazky.db")
+    conn = zakazky.open_db_connection(path)
+    zakazky.migrate_db(conn, log=quiet)
+    conn.close()
+    monkeypatch.setitem(zakazky.app.config, "DATABASE", path)
+    client = zakazky.app.test_client()
+    with client.session_transaction() as session:
+        session["logged_in"] = True
+        session["tenant"] = None
+    yield client
+    zakazky.pools.close_all()
@@ -0,0 +1,155 @@
+"""Souhrny a indexy udržované triggery musí odpovídat přepočtu ze zdrojových dat."""
+
+import datetime
+import itertools
+import random
+
+import pytest
+
+import app as zakazky
+
+STATS_TABLES = ("stats_monthly_jobs", "stats_monthly_revenue", "stats_counters")
+STATUSES = ("Nová", "Probíhá", "Dokončená", "Fakturovaná")
+# Čísla zakázek, faktur a jména zákazníků jsou unikátní napříč voláními random_writes
+unique_numbers = itertools.count(1)
+
+
+def table_rows(conn, table):
+    """Obsah tabulky jako seřazený seznam n-tic (desetinná čísla zaokrouhlená)."""
+    return sorted(tuple(round(value, 6) if isinstance(value, float) else value for value in row)
+                  for row in conn.execute(f"SELECT * FROM {table}"))
+
+
+def assert_matches_rebuild(conn, tables, rebuild):
+    """Porovná udržované tabulky s výsledkem rebuild; přepočet se vrátí zpět."""
+    maintained = {table: table_rows(conn, table) for table in tables}
+    conn.execute("SAVEPOINT rebuild")
+    try:
+        rebuild(conn.cursor())
+        rebuilt = {table: table_rows(conn, table) for table in tables}
+    finally:
+        conn.execute("ROLLBACK TO rebuild")
+        conn.execute("RELEASE rebuild")
+    assert maintained == rebuilt
+
+
+def assert_due_flags_current(conn):
+    assert conn.execute(f"SELECT COUNT(*) FROM jobs WHERE due_state IS NOT {zakazky.job_due_state_sql('jobs')}"
+                        ).fetchone()[0] == 0
+    assert conn.execute(f"SELECT COUNT(*) FROM invoices WHERE overdue IS NOT {zakazky.invoice_overdue_sql('invoices')}"
+                        ).fetchone()[0] == 0
+
+
+def assert_all_aggregates_current(conn):
+    assert_matches_rebuild(conn, STATS_TABLES, zakazky.rebuild_dashboard_stats)
+    assert_matches_rebuild(conn, ("job_totals",), zakazky.rebuild_job_totals)
+    assert_due_flags_current(conn)
+
+
+def random_day(rng):
+    return (datetime.date.today() + datetime.timedelta(days=rng.randint(-60, 60))).isoformat()
+
+
+def random_writes(conn, rng, count):
+    """Náhodné vkládání, úpravy a mazání ve všech tabulkách, ze kterých se souhrny počítají."""
+    def pick(sql):
+        ids = [row[0] for row in conn.execute(sql)]
+        return rng.choice(ids) if ids else None
+
+    for number in itertools.islice(unique_numbers, count):
+        op = rng.randrange(12)
+        job_id = pick("SELECT id FROM jobs")
+        if op == 0 or job_id is None:
+            paid = rng.random() < 0.3
+            conn.execute("""
+                INSERT INTO jobs (job_number, job_name, customer_id, status, due_date, price, hourly_rate,
+                                  payment_status, total_paid, invoice_date)
+                VALUES (?, 'Zakázka', ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (f"R-{number}", pick("SELECT id FROM customers"), rng.choice(STATUSES),
+                  rng.choice([None, random_day(rng)]), rng.choice([None, 1000]), rng.choice([None, 450]),
+                  "Uhrazeno" if paid else "Nezaplaceno", rng.randint(1, 9000) if paid else None,
+                  random_day(rng) if paid else None))
+        elif op == 1:
+            conn.execute("UPDATE jobs SET status = ?, due_date = ? WHERE id = ?",
+                         (rng.choice(STATUSES), rng.choice([None, random_day(rng)]), job_id))
+        elif op == 2:
+            conn.execute("UPDATE jobs SET payment_status = 'Uhrazeno', total_paid = ?, invoice_date = ? WHERE id = ?",
+                         (rng.randint(1, 9000) + 0.1, random_day(rng), job_id))
+        elif op == 3:
+            conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+        elif op == 4:
+            conn.execute("INSERT INTO hours_spent (job_id, date_spent, hours) VALUES (?, ?, ?)",
+                         (job_id, random_day(rng), rng.choice([0.5, 1.25, 2.1, 8])))
+        elif op == 5:
+            hours_id = pick("SELECT id FROM hours_spent")
+            if hours_id is not None:
+                conn.execute("UPDATE hours_spent SET job_id = ?, hours = ? WHERE id = ?",
+                             (job_id, rng.choice([0.1, 3, 7.3]), hours_id))
+        elif op == 6:
+            conn.execute("DELETE FROM hours_spent WHERE id = ?", (pick("SELECT id FROM hours_spent"),))
+        elif op == 7:
+            conn.execute("INSERT INTO additional_services (job_id, service_name, cost) VALUES (?, 'Služba', ?)",
+                         (job_id, rng.choice([99.9, 250, 1200])))
+        elif op == 8:
+            service_id = pick("SELECT id FROM additional_services")
+            if service_id is not None:
+                conn.execute("UPDATE additional_services SET job_id = ?, cost = ? WHERE id = ?",
+                             (job_id, rng.choice([10, 333.3]), service_id))
+            conn.execute("DELETE FROM additional_services WHERE id = ?", (pick("SELECT id FROM additional_services"),))
+        elif op == 9:
+            free_job = pick("SELECT id FROM jobs WHERE id NOT IN (SELECT job_id FROM invoices)")
+            if free_job is not None:
+                invoice_date = random_day(rng)
+                conn.execute("""
+                    INSERT INTO invoices (job_id, invoice_number, invoice_date, due_date, payment_type, total_price)
+                    VALUES (?, ?, ?, date(?, '+14 days'), 'příkazem', 1000)
+                """, (free_job, f"F-{number}", invoice_date, invoice_date))
+        elif op == 10:
+            conn.execute("UPDATE invoices SET payment_status = ? WHERE id = ?",
+                         (rng.choice(["Uhrazeno", "Nezaplaceno"]), pick("SELECT id FROM invoices")))
+        else:
+            if rng.random() < 0.5:
+                conn.execute("INSERT INTO customers (name) VALUES (?)", (f"Zákazník {number}",))
+            else:
+                conn.execute("DELETE FROM customers WHERE id = ?", (pick("SELECT id FROM customers"),))
+
+
+@pytest.fixture
+def seeded(conn):
+    zakazky.seed_database(conn, customers=30, workers=5, jobs=200, tasks=300, hours=600, services=100,
+                          invoiced=0.4, seed=7)
+    return conn
+
+
+def test_seeding_keeps_triggers_and_aggregates(conn):
+    triggers = {row[0] for row in conn.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger'")}
+    zakazky.seed_database(conn, customers=30, workers=5, jobs=200, tasks=300, hours=600, services=100,
+                          invoiced=0.4, seed=7)
+    assert {row[0] for row in conn.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger'")} == triggers
+    assert_all_aggregates_current(conn)
+    conn.execute("INSERT INTO fts_jobs (fts_jobs) VALUES ('integrity-check')")
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_aggregates_follow_random_writes(seeded, seed):
+    rng = random.Random(seed)
+    for _ in range(5):
+        random_writes(seeded, rng, 100)
+        seeded.commit()
+        assert_all_aggregates_current(seeded)
+
+
+def test_rolled_back_writes_leave_aggregates_unchanged(seeded):
+    before = {table: table_rows(seeded, table) for table in (*STATS_TABLES, "job_totals")}
+    random_writes(seeded, random.Random(42), 200)
+    seeded.rollback()
+    assert {table: table_rows(seeded, table) for table in (*STATS_TABLES, "job_totals")} == before
+
+
+def test_fts_follows_writes(seeded):
+    job_id = seeded.execute("SELECT MIN(id) FROM jobs").fetchone()[0]
+    seeded.execute("UPDATE jobs SET job_name = 'Rekonstrukce podkroví' WHERE id = ?", (job_id,))
+    assert [row[0] for row in seeded.execute("SELECT rowid FROM fts_jobs WHERE fts_jobs MATCH 'podkrovi'")] == [job_id]
+    seeded.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+    assert seeded.execute("SELECT COUNT(*) FROM fts_jobs WHERE fts_jobs MATCH 'podkroví'").fetchone()[0] == 0
+    seeded.execute("INSERT INTO fts_jobs (fts_jobs) VALUES ('integrity-check')")
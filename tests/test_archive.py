@@ -0,0 +1,52 @@
+"""Archiv uzavřených zakázek: přesun, čtení historie přes archiv a obnovení zpět."""
+
+import archive
+import app as zakazky
+
+
+def add_paid_job(conn, number, invoice_date):
+    job_id = conn.execute("""
+        INSERT INTO jobs (job_number, job_name, customer_id, status, due_date, price)
+        VALUES (?, ?, 1, 'Dokončená', '2023-01-31', 1000) RETURNING id
+    """, (number, f"Zakázka {number}")).fetchone()[0]
+    conn.execute("INSERT INTO hours_spent (job_id, date_spent, hours) VALUES (?, '2023-01-10', 2)", (job_id,))
+    invoice_id = zakazky.issue_invoice(conn, job_id, f"F-{number}", "příkazem")
+    conn.execute("UPDATE invoices SET invoice_date = ?, payment_status = 'Uhrazeno' WHERE id = ?",
+                 (invoice_date, invoice_id))
+    return job_id
+
+
+def contents(conn, schema):
+    return {table: conn.execute(f"SELECT COUNT(*) FROM {schema}.{table}").fetchone()[0]
+            for table in archive.ARCHIVE_TABLES}
+
+
+def test_archive_and_restore_round_trip(conn, tmp_path):
+    conn.execute("INSERT INTO customers (name) VALUES ('Novák')")
+    old = add_paid_job(conn, "A-1", "2023-02-01")
+    add_paid_job(conn, "A-2", "2099-01-01")
+    conn.commit()
+    before = contents(conn, "main")
+
+    archive.open_archive(conn, str(tmp_path / "archive.db"))
+    assert archive.archive_jobs(conn, "2024-01-01") == 1
+    moved = contents(conn, "archive")
+    assert moved["jobs"] == 1 and moved["invoice_lines"] > 0
+    assert {table: contents(conn, "main")[table] + moved[table] for table in before} == before
+    # Generovaný sloupec živé databáze je v archivu uložený s hodnotou
+    assert conn.execute("SELECT due_month FROM archive.jobs").fetchone()[0] == "2023-01"
+
+    assert archive.restore_jobs(conn, [old]) == 1
+    assert contents(conn, "main") == before
+    assert set(contents(conn, "archive").values()) == {0}
+
+
+def test_customer_history_reads_the_archive(client):
+    conn = zakazky.open_db_connection(zakazky.app.config["DATABASE"])
+    conn.execute("INSERT INTO customers (name) VALUES ('Novák')")
+    add_paid_job(conn, "A-1", "2023-02-01")
+    conn.commit()
+    archive.open_archive(conn, zakazky.archive_path())
+    archive.archive_jobs(conn, "2024-01-01")
+    conn.close()
+    assert "A-1" in client.get("/customers/1/history").get_data(as_text=True)
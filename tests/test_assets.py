@@ -0,0 +1,23 @@
+"""Sestavené styly: pravidla pro všechny třídy ze šablon a servírování s otiskem a kompresí."""
+
+import re
+
+import assets_build
+import app as zakazky
+
+
+def test_every_template_class_has_a_rule(assets):
+    _, used = assets
+    assert assets_build.unknown_classes(zakazky.app.static_folder, zakazky.TEMPLATES_DIR, used) == set()
+
+
+def test_pages_link_the_fingerprinted_stylesheet(client, assets):
+    manifest, _ = assets
+    html = client.get("/jobs").get_data(as_text=True)
+    url = re.search(r'<link rel="stylesheet" href="([^"]+)"', html).group(1)
+    assert url == "/assets/" + manifest["app.css"]
+
+    response = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "immutable" in response.headers["Cache-Control"]
+    assert client.get("/assets/manifest.json").status_code == 404
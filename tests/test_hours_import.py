@@ -0,0 +1,65 @@
+"""Hromadný import výkazu hodin: chybné řádky se hlásí po řádcích, nic se nevloží."""
+
+import io
+
+import pytest
+
+import app as zakazky
+
+
+@pytest.fixture
+def job_id(client):
+    conn = zakazky.open_db_connection(zakazky.app.config["DATABASE"])
+    job_id = conn.execute("INSERT INTO jobs (job_number, job_name, status) VALUES ('Z-1', 'Zakázka', 'Nová') RETURNING id").fetchone()[0]
+    conn.execute("INSERT INTO workers (name) VALUES ('Novák')")
+    conn.commit()
+    conn.close()
+    return job_id
+
+
+def hours_count():
+    conn = zakazky.open_db_connection(zakazky.app.config["DATABASE"])
+    try:
+        return conn.execute("SELECT COUNT(*) FROM hours_spent").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_batch_inserts_valid_rows(client, job_id):
+    response = client.post("/api/hours/batch", json={"rows": [
+        {"job_number": "Z-1", "worker": "Novák", "date_spent": "2024-01-02", "hours": 2.5},
+        {"job_id": job_id, "date_spent": "3.1.2024", "hours": "1,5", "description": "Montáž"},
+    ]})
+    assert response.status_code == 200
+    assert response.get_json() == {"success": True, "inserted": 2, "errors": []}
+    assert hours_count() == 2
+
+
+@pytest.mark.parametrize("row, error", [
+    ({"job_number": "Z-1", "date_spent": 20240101, "hours": 1}, "date_spent"),
+    ({"job_number": "Z-1", "date_spent": "2024-01-01", "hours": 1, "description": 5}, "description"),
+    ({"job_number": "Z-1", "date_spent": "2024-01-01", "hours": 1, "worker": ["Novák"]}, "worker"),
+    ({"job_number": {"id": 1}, "date_spent": "2024-01-01", "hours": 1}, "job_number"),
+    ({"job_number": "Z-1", "date_spent": "2024-01-01", "hours": True}, "hours"),
+    ({"job_number": "Z-1", "date_spent": "2024-01-01", "hours": [1]}, "hours"),
+    ({"job_id": "1", "date_spent": "2024-01-01", "hours": 1}, "job_id"),
+])
+def test_batch_reports_wrong_types_per_row(client, job_id, row, error):
+    valid = {"job_number": "Z-1", "date_spent": "2024-01-01", "hours": 1}
+    response = client.post("/api/hours/batch", json=[valid, row])
+    assert response.status_code == 400
+    body = response.get_json()
+    assert body["inserted"] == 0
+    assert [e["row"] for e in body["errors"]] == [2]
+    assert error in body["errors"][0]["error"]
+    assert hours_count() == 0
+
+
+def test_csv_reports_every_invalid_row(client, job_id):
+    csv = "zakázka;datum;hodiny\nZ-1;2024-01-01;2\nZ-9;2024-01-01;2\nZ-1;31.2.2024;2\nZ-1;2024-01-01;30\n"
+    response = client.post("/hours/import", data={"file": (io.BytesIO(csv.encode()), "vykaz.csv")})
+    assert response.status_code == 400
+    page = response.get_data(as_text=True)
+    for message in ("Z-9", "31.2.2024", "mezi 0 a 24"):
+        assert message in page
+    assert hours_count() == 0
@@ -0,0 +1,91 @@
+"""Vystavení faktur: hromadně stejné faktury jako jednotlivě, zobrazení ze snímku bez zápisu."""
+
+import pytest
+
+import app as zakazky
+
+
+def add_finished_job(conn, number, price, hourly_rate, hours, services):
+    job_id = conn.execute("""
+        INSERT INTO jobs (job_number, job_name, status, price, hourly_rate)
+        VALUES (?, ?, 'Dokončená', ?, ?) RETURNING id
+    """, (number, f"Zakázka {number}", price, hourly_rate)).fetchone()[0]
+    conn.executemany("INSERT INTO hours_spent (job_id, date_spent, hours) VALUES (?, '2025-03-01', ?)",
+                     [(job_id, h) for h in hours])
+    conn.executemany("INSERT INTO additional_services (job_id, service_name, cost) VALUES (?, ?, ?)",
+                     [(job_id, name, cost) for name, cost in services])
+    return job_id
+
+
+def invoice_contents(conn, invoice_id):
+    invoice = conn.execute("SELECT job_id, total_price, payment_status FROM invoices WHERE id = ?",
+                           (invoice_id,)).fetchone()
+    snapshot = conn.execute("SELECT * FROM invoice_snapshots WHERE invoice_id = ?", (invoice_id,)).fetchone()
+    lines = conn.execute("""
+        SELECT position, description, quantity, unit_price, amount FROM invoice_lines
+        WHERE invoice_id = ? ORDER BY position
+    """, (invoice_id,)).fetchall()
+    return tuple(invoice), tuple(snapshot)[1:], [tuple(line) for line in lines]
+
+
+JOBS = [
+    ("B-1", 1000, 450, [1.5, 2.25], [("Materiál", 250), ("Doprava", 80.5)]),
+    ("B-2", None, 300, [4], []),
+    ("B-3", 5000, None, [3], [("Licence", 1200)]),
+    ("B-4", None, None, [], []),
+]
+
+
+def test_batch_matches_single_invoices(conn):
+    job_ids = [add_finished_job(conn, *job) for job in JOBS]
+    conn.commit()
+
+    conn.execute("SAVEPOINT single")
+    single = {}
+    for number, job_id in enumerate(job_ids, start=1):
+        invoice_id = zakazky.issue_invoice(conn, job_id, f"J{number:04d}", "příkazem")
+        single[job_id] = invoice_contents(conn, invoice_id)
+    conn.execute("ROLLBACK TO single")
+    conn.execute("RELEASE single")
+    conn.commit()
+
+    created = zakazky.run_batch_invoicing(conn, "J", "příkazem")
+    assert [invoice["invoice_number"] for invoice in created] == ["J0001", "J0002", "J0003", "J0004"]
+    assert {invoice["job_id"]: invoice_contents(conn, invoice["id"]) for invoice in created} == single
+    assert [line[1] for line in single[job_ids[0]][2]] == [
+        'Pevná cena za zakázku "Zakázka B-1"', "Hodinová práce (3.75h x 450.00 Kč/h)", "Materiál", "Doprava"]
+    assert conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'Fakturovaná'").fetchone()[0] == len(JOBS)
+
+
+def test_dry_run_previews_without_writing(conn):
+    add_finished_job(conn, *JOBS[0])
+    conn.commit()
+    preview = zakazky.run_batch_invoicing(conn, "P", "příkazem", dry_run=True)
+    assert [(row["invoice_number"], row["total_price"]) for row in preview] == [("P0001", 1000 + 3.75 * 450 + 330.5)]
+    assert conn.execute("SELECT COUNT(*) FROM invoices").fetchone()[0] == 0
+
+
+def test_missing_job_is_a_lookup_error(conn):
+    with pytest.raises(LookupError):
+        zakazky.issue_invoice(conn, 404, "X0001", "příkazem")
+    assert conn.execute("SELECT COUNT(*) FROM invoices").fetchone()[0] == 0
+
+
+def test_viewing_an_invoice_does_not_write(client):
+    conn = zakazky.open_db_connection(zakazky.app.config["DATABASE"])
+    job_id = add_finished_job(conn, *JOBS[0])
+    conn.commit()
+    response = client.post(f"/jobs/{job_id}/create-invoice", data={"invoice_number": "V0001", "payment_type": "hotově"})
+    invoice_id = int(response.headers["Location"].split("/")[-2])
+    data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+
+    first = client.get(f"/invoices/{invoice_id}/view")
+    assert first.status_code == 200 and "V0001" in first.get_data(as_text=True)
+    assert client.get(f"/invoices/{invoice_id}/view").get_data() == first.get_data()
+    # data_version se změní, jakmile jiné připojení potvrdí zápis
+    assert conn.execute("PRAGMA data_version").fetchone()[0] == data_version
+
+    # Úhrada zvýší verzi snímku, faktura se vykreslí znovu
+    client.post(f"/invoices/{invoice_id}/set_paid")
+    assert client.get(f"/invoices/{invoice_id}/view").get_data() != first.get_data()
+    conn.close()
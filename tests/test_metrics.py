@@ -0,0 +1,20 @@
+"""/metrics je dostupný jen s nakonfigurovaným tokenem, bez ohledu na adresu klienta."""
+
+import app as zakazky
+
+LOCALHOST = {"REMOTE_ADDR": "127.0.0.1"}
+
+
+def test_metrics_do_not_exist_without_token(client, monkeypatch):
+    monkeypatch.setitem(zakazky.app.config, "METRICS_TOKEN", None)
+    assert client.get("/metrics", environ_base=LOCALHOST).status_code == 404
+
+
+def test_metrics_require_the_token(client, monkeypatch):
+    monkeypatch.setitem(zakazky.app.config, "METRICS_TOKEN", "tajne")
+    assert client.get("/metrics", environ_base=LOCALHOST).status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer jine"}).status_code == 401
+
+    response = client.get("/metrics", headers={"Authorization": "Bearer tajne"})
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
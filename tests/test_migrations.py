@@ -0,0 +1,136 @@
+"""Migrace schématu: nová databáze i databáze s daty ze starší verze."""
+
+import sqlite3
+
+import pytest
+
+import app as zakazky
+from conftest import quiet
+
+
+def test_new_database_gets_all_migrations(tmp_path):
+    conn = zakazky.open_db_connection(str(tmp_path / "new.db"))
+    try:
+        applied = zakazky.migrate_db(conn, log=quiet)
+        assert applied == [version for version, _, _ in zakazky.MIGRATIONS]
+        assert zakazky.get_schema_version(conn) == zakazky.latest_schema_version()
+        assert zakazky.migrate_db(conn, log=quiet) == []
+        assert conn.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+        assert conn.execute("PRAGMA foreign_key_check").fetchall() == []
+    finally:
+        conn.close()
+
+
+def test_migrate_to_target_stops_there(tmp_path):
+    conn = zakazky.open_db_connection(str(tmp_path / "old.db"))
+    try:
+        assert zakazky.migrate_db(conn, target=1, log=quiet) == [1]
+        assert zakazky.get_schema_version(conn) == 1
+        assert zakazky.migrate_db(conn, target=1, log=quiet) == []
+    finally:
+        conn.close()
+
+
+def test_startup_check_does_not_migrate_by_default(tmp_path, monkeypatch):
+    path = str(tmp_path / "old.db")
+    monkeypatch.setitem(zakazky.app.config, "DATABASE", path)
+    assert zakazky.app.config["AUTO_MIGRATE"] is False
+    zakazky.check_schema_version()
+    conn = zakazky.open_db_connection(path)
+    try:
+        assert zakazky.get_schema_version(conn) == 0
+    finally:
+        conn.close()
+
+    monkeypatch.setitem(zakazky.app.config, "AUTO_MIGRATE", True)
+    zakazky.check_schema_version()
+    conn = zakazky.open_db_connection(path)
+    try:
+        assert zakazky.get_schema_version(conn) == zakazky.latest_schema_version()
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def old_conn(tmp_path):
+    """Databáze ve verzi 5 s daty, jaká zapisovala aplikace před migracemi 6+."""
+    conn = zakazky.open_db_connection(str(tmp_path / "old.db"))
+    zakazky.migrate_db(conn, target=5, log=quiet)
+    conn.executescript("""
+        INSERT INTO supplier_info (company_name, ico, bank_account, bank_code)
+        VALUES ('Dodavatel s.r.o.', '12345678', '123456789', '0100');
+        INSERT INTO customers (id, name, company) VALUES (1, 'Jan Novák', 'Novák a syn');
+        INSERT INTO workers (id, name) VALUES (1, 'Petr');
+        INSERT INTO jobs (id, job_number, job_name, customer_id, status, due_date, price, hourly_rate,
+                          payment_status, total_paid, invoice_date)
+        VALUES (1, 'Z-1', 'Střecha', 1, 'Fakturovaná', '14.8.2025', 1000, 500, 'Uhrazeno', 3250, '2025-08-20 10:00'),
+               (2, 'Z-2', 'Okap', 1, 'Nová', 'do konce měsíce', NULL, NULL, 'Nezaplaceno', NULL, NULL),
+               (3, 'Z-3', 'Komín', 1, 'Probíhá', '2999-01-01', NULL, 400, 'Nezaplaceno', NULL, NULL);
+        INSERT INTO tasks (job_id, task_name, due_date) VALUES (1, 'Zaměřit', '1.8.2025');
+        INSERT INTO hours_spent (job_id, worker_id, date_spent, hours)
+        VALUES (1, 1, '2025-08-01', 2.5), (1, 1, '2.8.2025', 1.5), (3, 1, '2025-08-03', 4);
+        INSERT INTO additional_services (job_id, service_name, cost) VALUES (1, 'Doprava', 250);
+        INSERT INTO invoices (id, job_id, invoice_number, invoice_date, due_date, payment_type, total_price, payment_status)
+        VALUES (1, 1, '20250001', '20.8.2025', '2025-09-03', 'příkazem', 3250, 'Uhrazeno');
+    """)
+    yield conn
+    conn.close()
+
+
+def test_old_database_migrates_with_data(old_conn):
+    applied = zakazky.migrate_db(old_conn, log=quiet)
+    assert applied == [version for version, _, _ in zakazky.MIGRATIONS if version > 5]
+    assert old_conn.execute("PRAGMA foreign_key_check").fetchall() == []
+    assert old_conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0] == 3
+    assert old_conn.execute("SELECT COUNT(*) FROM hours_spent").fetchone()[0] == 3
+
+
+def test_dates_are_normalized_and_originals_kept(old_conn):
+    zakazky.migrate_db(old_conn, log=quiet)
+    dates = dict(old_conn.execute("SELECT job_number, due_date FROM jobs"))
+    assert dates == {"Z-1": "2025-08-14", "Z-2": None, "Z-3": "2999-01-01"}
+    assert old_conn.execute("SELECT invoice_date FROM jobs WHERE id = 1").fetchone()[0] == "2025-08-20"
+    assert old_conn.execute("SELECT invoice_date FROM invoices WHERE id = 1").fetchone()[0] == "2025-08-20"
+    assert old_conn.execute("SELECT date_spent FROM hours_spent ORDER BY id").fetchall()[1][0] == "2025-08-02"
+
+    originals = {(row["table_name"], row["row_id"], row["column_name"]): row["original"]
+                 for row in old_conn.execute("SELECT * FROM date_migration_originals")}
+    assert originals[("jobs", 1, "due_date")] == "14.8.2025"
+    assert originals[("jobs", 2, "due_date")] == "do konce měsíce"
+    assert originals[("jobs", 1, "invoice_date")] == "2025-08-20 10:00"
+    assert originals[("invoices", 1, "invoice_date")] == "20.8.2025"
+    assert ("jobs", 3, "due_date") not in originals
+    # Měsíční statistiky se přepočítají z převedených dat
+    assert dict(old_conn.execute("SELECT month, count FROM stats_monthly_jobs")) == {"2025-08": 1, "": 1, "2999-01": 1}
+
+
+def test_invalid_dates_are_rejected_after_migration(old_conn):
+    zakazky.migrate_db(old_conn, log=quiet)
+    with pytest.raises(sqlite3.IntegrityError):
+        old_conn.execute("UPDATE jobs SET due_date = '14.8.2025' WHERE id = 3")
+
+
+def test_existing_invoice_gets_snapshot(old_conn):
+    zakazky.migrate_db(old_conn, log=quiet)
+    snapshot = old_conn.execute("SELECT * FROM invoice_snapshots WHERE invoice_id = 1").fetchone()
+    assert (snapshot["job_number"], snapshot["customer_name"], snapshot["supplier_company_name"]) == \
+        ("Z-1", "Jan Novák", "Dodavatel s.r.o.")
+    lines = old_conn.execute("""
+        SELECT description, quantity, unit_price, amount FROM invoice_lines WHERE invoice_id = 1 ORDER BY position
+    """).fetchall()
+    assert [tuple(line) for line in lines] == zakazky.invoice_lines_for_job(old_conn, 1)
+    assert sum(line["amount"] for line in lines) == 3250
+
+
+def test_aggregates_are_filled_from_existing_data(old_conn):
+    zakazky.migrate_db(old_conn, log=quiet)
+    totals = {row["job_id"]: (row["hours"], row["services_cost"]) for row in old_conn.execute("SELECT * FROM job_totals")}
+    assert totals == {1: (4.0, 250.0), 2: (0, 0), 3: (4.0, 0)}
+    counters = dict(old_conn.execute("SELECT name, value FROM stats_counters"))
+    assert counters == {"open_jobs": 2, "unpaid_invoices": 0, "customers": 1}
+    assert dict(old_conn.execute("SELECT month, total FROM stats_monthly_revenue")) == {"2025-08": 3250}
+
+    # Uzavřená zakázka a zakázka bez termínu příznak nemají, uhrazená faktura není po splatnosti
+    states = dict(old_conn.execute("SELECT job_number, due_state FROM jobs"))
+    assert states == {"Z-1": None, "Z-2": None, "Z-3": "later"}
+    assert old_conn.execute("SELECT overdue FROM invoices WHERE id = 1").fetchone()[0] == 0
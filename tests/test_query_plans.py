@@ -0,0 +1,39 @@
+"""Plány registrovaných dotazů nad vygenerovanými daty (jako flask db-check-plans)."""
+
+import pytest
+
+import app as zakazky
+
+
+@pytest.fixture(scope="module")
+def plans_conn(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("plans")
+    conn = zakazky.open_db_connection(str(directory / "plans.db"))
+    zakazky.seed_plan_check_database(conn, str(directory / "plans_archive.db"))
+    yield conn
+    conn.close()
+
+
+def test_registered_queries_have_no_plan_problems(plans_conn):
+    results = zakazky.check_query_plans(plans_conn)
+    problems = {name: (plan, found) for name, (plan, found) in results.items() if found}
+    assert problems == {}
+
+
+def test_all_registered_queries_are_checked(plans_conn):
+    # S připojeným archivem se kontrolují i dotazy historie nad ním
+    assert set(zakazky.check_query_plans(plans_conn)) == set(zakazky.QUERIES)
+
+
+def test_full_scan_of_large_table_is_reported(plans_conn):
+    query = zakazky.Query("SELECT * FROM jobs WHERE job_name = ?", ("x",), frozenset(), False)
+    assert zakazky.plan_problems(query, zakazky.explain_query(plans_conn, query))
+
+    allowed = query._replace(allow_scan=frozenset({"jobs"}))
+    assert zakazky.plan_problems(allowed, zakazky.explain_query(plans_conn, allowed)) == []
+
+
+def test_temp_btree_sort_is_reported(plans_conn):
+    query = zakazky.Query("SELECT * FROM jobs WHERE status = ? ORDER BY job_name", ("Nová",), frozenset(), False)
+    problems = zakazky.plan_problems(query, zakazky.explain_query(plans_conn, query))
+    assert any(problem.startswith("USE TEMP B-TREE") for problem in problems)
@@ -0,0 +1,162 @@
+"""Chování rout přes testovacího klienta: stránkování seznamů, ETagy, číselníky, dávky úkolů a hromadná fakturace."""
+
+import base64
+import re
+
+import pytest
+
+import app as zakazky
+
+
+@pytest.fixture
+def db(client):
+    """Přímé připojení k databázi testovacího klienta."""
+    conn = zakazky.open_db_connection(zakazky.app.config["DATABASE"])
+    yield conn
+    conn.close()
+
+
+def add_jobs(db, count, status="Nová"):
+    # Část zakázek bez termínu, aby stránkování prošlo i přes NULL hodnoty
+    db.executemany("""
+        INSERT INTO jobs (job_number, job_name, status, due_date, price, hourly_rate) VALUES (?, ?, ?, ?, ?, ?)
+    """, [(f"Z-{i:03d}", f"Zakázka {i}", status, None if i % 7 == 0 else f"2025-03-{i % 28 + 1:02d}", 1000 + i, 400)
+          for i in range(count)])
+    db.commit()
+
+
+def walk_pages(client, url, link):
+    """Projde seznam po stránkách přes odkazy link=... a vrátí čísla zakázek v pořadí."""
+    numbers, pages = [], 0
+    while url:
+        html = client.get(url).get_data(as_text=True)
+        numbers += re.findall(r">(Z-\d{3})<", html)
+        found = re.search(rf"[?&;]{link}=([\w-]+)", html)
+        url = found and re.sub(r"[?&](after|before)=[\w-]+", "", url) + f"&{link}={found.group(1)}"
+        pages += 1
+    return numbers, pages
+
+
+@pytest.mark.parametrize("sort, direction", [("due_date", "asc"), ("due_date", "desc"), ("job_number", "asc")])
+def test_keyset_pages_cover_the_list_once_in_order(client, db, sort, direction):
+    add_jobs(db, 45)
+    expected = [row[0] for row in db.execute(f"""
+        SELECT job_number FROM jobs ORDER BY {sort} {direction}, id {direction}
+    """)]
+
+    numbers, pages = walk_pages(client, f"/jobs?sort={sort}&dir={direction}&size=10", "after")
+    assert numbers == expected
+    assert pages == 5
+
+
+def test_previous_page_returns_the_same_rows(client, db):
+    add_jobs(db, 25)
+    first = client.get("/jobs?size=10").get_data(as_text=True)
+    after = re.search(r"after=([\w-]+)", first).group(1)
+    second = client.get(f"/jobs?size=10&after={after}").get_data(as_text=True)
+    before = re.search(r"before=([\w-]+)", second).group(1)
+    back = client.get(f"/jobs?size=10&before={before}").get_data(as_text=True)
+    assert re.findall(r">(Z-\d{3})<", back) == re.findall(r">(Z-\d{3})<", first)
+
+
+def cursor(payload):
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+@pytest.mark.parametrize("url", ["/jobs", "/customers", "/workers", "/invoices", "/jobs/active"])
+@pytest.mark.parametrize("value", ["!!!", cursor("[1]"), cursor('[[1], 1]'), cursor('["2025-01-01", "1"]')])
+def test_invalid_cursor_is_rejected(client, url, value):
+    assert client.get(f"{url}?after={value}").status_code == 400
+    assert client.get(f"{url}?before={value}").status_code == 400
+
+
+def test_job_section_pages_and_rejects_invalid_cursor(client, db):
+    add_jobs(db, 1)
+    db.executemany("INSERT INTO tasks (job_id, task_name) VALUES (1, ?)", [(f"Úkol {i}",) for i in range(25)])
+    db.commit()
+    first = client.get("/jobs/1/sections/tasks").get_data(as_text=True)
+    after = re.search(r'data-next-cursor="([\w-]+)"', first).group(1)
+    rest = client.get(f"/jobs/1/sections/tasks?after={after}").get_data(as_text=True)
+    assert len(re.findall(r"Úkol \d+", first + rest)) == 25
+    assert client.get("/jobs/1/sections/tasks?after=xyz").status_code == 400
+
+
+def test_unchanged_page_answers_304_until_a_write(client, db):
+    add_jobs(db, 3)
+    response = client.get("/jobs")
+    etag = response.headers["ETag"]
+    assert response.status_code == 200
+
+    cached = client.get("/jobs", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.get_data() == b""
+
+    # Zápis přes routu zvýší verzi tabulky jobs a ETag se změní
+    client.post("/jobs/1/status-done")
+    changed = client.get("/jobs", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+
+
+def test_etag_depends_on_query_string_and_encoding(client, db):
+    add_jobs(db, 3)
+    response = client.get("/jobs")
+    etag = response.headers["ETag"]
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert client.get("/jobs?sort=job_number", headers={"If-None-Match": etag}).status_code == 200
+    assert client.get("/jobs", headers={"If-None-Match": etag, "Accept-Encoding": "gzip"}).status_code == 200
+
+
+def test_lookup_matches_prefix_and_sees_new_rows(client, db):
+    db.executemany("INSERT INTO customers (name) VALUES (?)", [("Šťastný",), ("Svoboda",), ("Štěpánek",)])
+    db.commit()
+    assert [row["label"] for row in client.get("/api/lookup/customers?q=st").get_json()] == ["Šťastný", "Štěpánek"]
+
+    # Zápis zvýší verzi tabulky, cache se při dalším čtení načte znovu
+    db.execute("INSERT INTO customers (name) VALUES ('Stará')")
+    db.commit()
+    assert [row["label"] for row in client.get("/api/lookup/customers?q=st").get_json()] == [
+        "Stará", "Šťastný", "Štěpánek"]
+    assert client.get("/api/lookup/jobs?q=st").status_code == 404
+
+
+def test_task_batch_rolls_back_on_a_bad_operation(client, db):
+    add_jobs(db, 1)
+    response = client.post("/api/jobs/1/tasks", json={"operations": [
+        {"op": "add", "task_name": "Zaměřit"}, {"op": "add", "task_name": "Objednat"}]})
+    tasks = response.get_json()["tasks"]
+    assert response.status_code == 200 and [task["task_name"] for task in tasks] == ["Zaměřit", "Objednat"]
+
+    for bad in ({"op": "add", "task_name": "X", "notes": ["a"]}, {"op": "toggle", "id": str(tasks[0]["id"])},
+                {"op": "delete", "id": 999}):
+        response = client.post("/api/jobs/1/tasks", json={"operations": [{"op": "toggle", "id": tasks[1]["id"]}, bad]})
+        assert response.status_code == 400
+        assert response.get_json()["errors"][0]["operation"] == 2
+        assert db.execute("SELECT COUNT(*), SUM(is_completed) FROM tasks").fetchone()[:] == (2, 0)
+
+
+def test_batch_invoicing_route_matches_single_invoice(client, db):
+    add_jobs(db, 3, status="Dokončená")
+    db.execute("INSERT INTO hours_spent (job_id, date_spent, hours) VALUES (1, '2025-03-01', 2.5)")
+    db.execute("INSERT INTO additional_services (job_id, service_name, cost) VALUES (1, 'Materiál', 120)")
+    db.commit()
+
+    client.post("/jobs/1/create-invoice", data={"invoice_number": "S-1", "payment_type": "příkazem"})
+    single = db.execute("SELECT description, quantity, unit_price, amount FROM invoice_lines ORDER BY position").fetchall()
+    total = db.execute("SELECT total_price FROM invoices").fetchone()[0]
+    db.execute("DELETE FROM invoices")
+    db.execute("UPDATE jobs SET status = 'Dokončená'")
+    db.commit()
+
+    preview = client.get("/invoices/batch?prefix=B")
+    assert preview.status_code == 200 and "B0003" in preview.get_data(as_text=True)
+    assert db.execute("SELECT COUNT(*) FROM invoices").fetchone()[0] == 0
+
+    assert client.post("/invoices/batch", data={"prefix": "B", "payment_type": "příkazem"}).status_code == 200
+    invoice = db.execute("SELECT id, invoice_number, total_price FROM invoices WHERE job_id = 1").fetchone()
+    assert (invoice["invoice_number"], invoice["total_price"]) == ("B0001", total)
+    lines = db.execute("""
+        SELECT description, quantity, unit_price, amount FROM invoice_lines WHERE invoice_id = ? ORDER BY position
+    """, (invoice["id"],)).fetchall()
+    assert [tuple(line) for line in lines] == [tuple(line) for line in single]
+    assert db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'Fakturovaná'").fetchone()[0] == 3
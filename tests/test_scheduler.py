@@ -0,0 +1,46 @@
+"""Plánovač: vedení nad databází a návštěvy, které nezasahují do fondů připojení požadavků."""
+
+import sqlite3
+import time
+
+import scheduler
+import app as zakazky
+
+from conftest import quiet
+
+
+def test_only_the_leader_runs_tasks(conn):
+    assert zakazky.scheduler.run_round(conn, "a:1", 60, ["overdue_invoices"]) == [
+        ("overdue_invoices", "ok", "nově po splatnosti: 0")]
+    assert zakazky.scheduler.run_round(conn, "b:2", 60, ["overdue_invoices"]) is None
+    scheduler.release_leadership(conn, "a:1")
+    assert zakazky.scheduler.run_round(conn, "b:2", 60, ["overdue_invoices"])[0][1] == "ok"
+
+
+def test_visit_runs_due_tasks_without_opening_a_pool(tmp_path):
+    path = str(tmp_path / "firma.db")
+    conn = zakazky.open_db_connection(path)
+    zakazky.migrate_db(conn, log=quiet)
+    conn.close()
+    pools = len(zakazky.pools)
+
+    next_visit = zakazky.scheduler_visit(path, "test:1")
+
+    assert len(zakazky.pools) == pools
+    conn = sqlite3.connect(path)
+    tasks = {row[0] for row in conn.execute("SELECT task FROM scheduler_runs WHERE last_status = 'ok'")}
+    conn.close()
+    assert tasks == {"overdue_invoices", "job_due_flags", "optimize", "analyze", "wal_checkpoint"}
+    # Další návštěva až po nejkratším intervalu (SCHEDULER_DUE_INTERVAL)
+    assert next_visit > time.time() + zakazky.app.config["SCHEDULER_DUE_INTERVAL"] - 60
+
+
+def test_outdated_database_is_skipped_not_migrated(tmp_path):
+    path = str(tmp_path / "stara.db")
+    sqlite3.connect(path).close()
+
+    assert zakazky.scheduler_visit(path, "test:1") == 0
+
+    conn = sqlite3.connect(path)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == 0
+    conn.close()
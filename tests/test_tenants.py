@@ -0,0 +1,50 @@
+"""Víc firem: databáze podle tenanta, přihlášení do zvolené firmy a vyřazování fondů."""
+
+import pytest
+
+import app as zakazky
+
+
+@pytest.fixture
+def tenants(tmp_path, monkeypatch):
+    monkeypatch.setitem(zakazky.app.config, "TENANTS_DIR", str(tmp_path / "tenants"))
+    runner = zakazky.app.test_cli_runner()
+    for name in ("alfa", "beta"):
+        result = runner.invoke(args=["tenant-create", name, "--password", f"heslo-{name}"])
+        assert result.exit_code == 0, result.output
+    yield
+    zakazky.pools.close_all()
+
+
+def login(tenant):
+    client = zakazky.app.test_client()
+    assert client.post("/login", data={"tenant": tenant, "password": f"heslo-{tenant}"}).status_code == 302
+    return client
+
+
+def test_login_checks_the_tenant_from_the_form(tenants):
+    client = login("alfa")
+    # Heslo se ověřuje u firmy z formuláře, ne u firmy z dřívějšího přihlášení
+    assert client.post("/login", data={"tenant": "beta", "password": "heslo-alfa"}).status_code == 200
+    assert client.post("/login", data={"tenant": "beta", "password": "heslo-beta"}).status_code == 302
+    with client.session_transaction() as session:
+        assert session["tenant"] == "beta"
+    assert client.post("/login", data={"tenant": "gama", "password": "heslo-alfa"}).status_code == 200
+
+
+def test_tenants_see_only_their_own_data(tenants):
+    conn = zakazky.open_db_connection(zakazky.tenant_path("alfa"))
+    conn.execute("INSERT INTO customers (name) VALUES ('Alfa s.r.o.')")
+    conn.commit()
+    conn.close()
+    assert [row["label"] for row in login("alfa").get("/api/lookup/customers?q=a").get_json()] == ["Alfa s.r.o."]
+    assert login("beta").get("/api/lookup/customers?q=a").get_json() == []
+
+
+def test_least_recently_used_pool_is_closed(tenants, monkeypatch):
+    monkeypatch.setitem(zakazky.app.config, "TENANT_POOLS_MAX", 1)
+    alfa = login("alfa")
+    assert alfa.get("/jobs").status_code == 200
+    assert login("beta").get("/jobs").status_code == 200
+    assert len(zakazky.pools) == 1
+    assert alfa.get("/jobs").status_code == 200
@@ -0,0 +1,74 @@
+"""Fronta zápisů: skupinový commit, izolace chyb a stejné chování rout jako bez fronty."""
+
+import threading
+
+import pytest
+
+import app as zakazky
+from write_queue import WriteQueue
+
+
+def add_customer(conn, name):
+    return conn.execute("INSERT INTO customers (name) VALUES (?) RETURNING id", (name,)).fetchone()[0]
+
+
+def fail(conn):
+    conn.execute("INSERT INTO customers (name) VALUES ('Zrušený')")
+    raise ValueError("chyba zápisu")
+
+
+def test_failing_write_rolls_back_alone(conn, tmp_path):
+    batches = []
+    writer = WriteQueue(str(tmp_path / "zakazky.db"), zakazky.open_db_connection, window=0.05, max_batch=10,
+                        on_batch=lambda size, waits: batches.append((size, len(waits))))
+    try:
+        futures = [writer.submit(add_customer, ("První",)), writer.submit(fail, ()),
+                   writer.submit(add_customer, ("Druhý",))]
+        assert futures[0].result(timeout=5) != futures[2].result(timeout=5)
+        with pytest.raises(ValueError):
+            futures[1].result(timeout=5)
+    finally:
+        writer.close()
+    assert [row[0] for row in conn.execute("SELECT name FROM customers ORDER BY id")] == ["První", "Druhý"]
+    assert sum(size for size, _ in batches) == 3 and all(size == waits for size, waits in batches)
+
+
+def test_concurrent_writes_are_grouped(conn, tmp_path):
+    batches = []
+    writer = WriteQueue(str(tmp_path / "zakazky.db"), zakazky.open_db_connection, window=0.05, max_batch=64,
+                        on_batch=lambda size, waits: batches.append(size))
+    try:
+        threads = [threading.Thread(target=lambda i=i: writer.submit(add_customer, (f"Z {i}",)).result(timeout=5))
+                   for i in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        writer.close()
+    assert conn.execute("SELECT COUNT(*) FROM customers").fetchone()[0] == 20
+    assert len(batches) < 20
+
+
+@pytest.mark.parametrize("write_queue", [False, True])
+def test_routes_behave_the_same_with_the_queue(client, monkeypatch, write_queue):
+    monkeypatch.setitem(zakazky.app.config, "WRITE_QUEUE", write_queue)
+    conn = zakazky.open_db_connection(zakazky.app.config["DATABASE"])
+    job_id = conn.execute("""
+        INSERT INTO jobs (job_number, job_name, status, price) VALUES ('Q-1', 'Fronta', 'Dokončená', 500) RETURNING id
+    """).fetchone()[0]
+    conn.commit()
+    data = {"invoice_number": "Q0001", "payment_type": "příkazem"}
+    assert client.post(f"/jobs/{job_id}/create-invoice", data=data).status_code == 302
+    assert client.post(f"/jobs/{job_id}/create-invoice", data=data).status_code == 400
+    assert conn.execute("SELECT total_price FROM invoices WHERE job_id = ?", (job_id,)).fetchone()[0] == 500
+    conn.close()
+
+
+def test_lookup_error_reaches_the_caller(conn, tmp_path):
+    writer = WriteQueue(str(tmp_path / "zakazky.db"), zakazky.open_db_connection, window=0, max_batch=1)
+    try:
+        with pytest.raises(LookupError):
+            writer.submit(zakazky.issue_invoice, (404, "X0001", "příkazem")).result(timeout=5)
+    finally:
+        writer.close()
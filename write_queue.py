@@ -0,0 +1,124 @@
+# Soubor: write_queue.py
+"""Fronta zápisů se skupinovým commitem.
+
+Zápisy došlé během krátkého okna provede jedno vlákno zapisovače v jedné
+transakci; každý zápis běží ve vlastním SAVEPOINT, takže chyba jednoho
+nezruší ostatní, a volající dostane výsledek až po commitu.
+"""
+
+import concurrent.futures
+import logging
+import os
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class WriteQueueClosed(Exception):
+    """Zápis přišel do zapisovače, který se už ukončuje."""
+
+
+class WriteQueue:
+    """Vlákno zapisovače s vlastním připojením a skupinovým commitem.
+
+    connect(path) otevře připojení zapisovače. Volitelné on_depth(délka)
+    a on_batch(velikost, čekání) dostávají hodnoty pro metriky.
+    """
+
+    def __init__(self, path, connect, window, max_batch, on_depth=None, on_batch=None):
+        self.path = path
+        self.window = window
+        self.max_batch = max_batch
+        self.pid = os.getpid()
+        self.closed = False
+        self._connect = connect
+        self._on_depth = on_depth
+        self._on_batch = on_batch
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="zakazky-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, func, args):
+        """Zařadí zápis func(conn, *args) do fronty a vrátí Future s jeho výsledkem."""
+        future = concurrent.futures.Future()
+        with self._lock:
+            if self.closed:
+                raise WriteQueueClosed(self.path)
+            self._queue.put((func, args, future, time.perf_counter()))
+        self._set_depth()
+        return future
+
+    def close(self):
+        """Zpracuje zbytek fronty a ukončí vlákno zapisovače (opakované volání nic nedělá)."""
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            self._queue.put(None)
+        self._thread.join()
+
+    def _set_depth(self):
+        if self._on_depth is not None:
+            self._on_depth(self._queue.qsize())
+
+    def _collect(self):
+        """Počká na první zápis a přibere další, které dorazí během okna."""
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.window
+        while batch[-1] is not None and len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        conn = self._connect(self.path)
+        try:
+            while True:
+                batch = self._collect()
+                stop = batch[-1] is None
+                if stop:
+                    batch.pop()
+                if batch:
+                    self._set_depth()
+                    self._commit(conn, batch)
+                if stop:
+                    return
+        finally:
+            conn.close()
+
+    def _commit(self, conn, batch):
+        """Provede dávku v jedné transakci a výsledky předá čekajícím požadavkům."""
+        results = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for func, args, future, queued in batch:
+                conn.execute("SAVEPOINT write_op")
+                try:
+                    results.append((future, queued, func(conn, *args), None))
+                except Exception as e:
+                    conn.execute("ROLLBACK TO write_op")
+                    results.append((future, queued, None, e))
+                conn.execute("RELEASE write_op")
+            conn.commit()
+        except Exception as e:
+            # Selhal BEGIN nebo COMMIT: nic z dávky se neuložilo
+            if conn.in_transaction:
+                conn.rollback()
+            logger.exception("Dávka zápisů (%d) selhala", len(batch))
+            for _, _, future, _ in batch:
+                future.set_exception(e)
+            return
+        done = time.perf_counter()
+        if self._on_batch is not None:
+            self._on_batch(len(batch), [done - queued for _, queued, _, _ in results])
+        for future, _, result, error in results:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)